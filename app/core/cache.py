@@ -0,0 +1,190 @@
+import asyncio
+import hashlib
+import json
+import logging
+import time
+import uuid
+from collections import Counter
+from functools import wraps
+from typing import Callable
+
+from fastapi.encoders import jsonable_encoder
+from fastapi_cache import FastAPICache
+from sqlalchemy.ext.asyncio import AsyncSession
+
+logger = logging.getLogger(__name__)
+
+# Версия тега должна жить дольше любой закешированной страницы,
+# иначе после её истечения старые ключи снова станут достижимы
+TAG_VERSION_EXPIRE = 24 * 60 * 60
+
+_hits: Counter[str] = Counter()
+_misses: Counter[str] = Counter()
+
+
+def _tag_key(tag: str) -> str:
+    return f"{FastAPICache.get_prefix()}:tag:{tag}"
+
+
+async def _tag_versions(tags: list[str]) -> list[str]:
+    backend = FastAPICache.get_backend()
+    values = await asyncio.gather(*(backend.get(_tag_key(tag)) for tag in tags))
+    return [value.decode() if value else "0" for value in values]
+
+
+async def invalidate_tags(*tags: str) -> None:
+    """
+    Инвалидирует все закешированные ответы, зависящие от любого из тегов.
+    Старые ключи не удаляются, а становятся недостижимыми и истекают по TTL.
+    """
+    try:
+        backend = FastAPICache.get_backend()
+        await asyncio.gather(*(backend.set(_tag_key(tag), uuid.uuid4().hex.encode(), TAG_VERSION_EXPIRE)
+                               for tag in set(tags)))
+    except Exception as e:
+        logger.warning(f"Не удалось инвалидировать теги кеша {tags}: {e}")
+
+
+# Снимает блокировку, только если она всё ещё наша
+_RELEASE_LOCK = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) end return 0"
+
+_inflight: dict[str, asyncio.Future] = {}
+# Результат общего future, если ведущий запрос отменён: ждущие пересчитывают ответ сами
+_RETRY = object()
+
+
+async def _acquire_lock(key: str, timeout: float) -> str | None:
+    """
+    Берёт межворкерную блокировку пересчёта ключа в Redis.
+    Без Redis (или при его ошибке) считаем, что блокировка наша: защищает только локальный single-flight.
+    """
+    redis = getattr(FastAPICache.get_backend(), "redis", None)
+    if redis is None:
+        return ""
+    token = uuid.uuid4().hex
+    try:
+        return token if await redis.set(f"{key}:lock", token, nx=True, px=int(timeout * 1000)) else None
+    except Exception as e:
+        logger.warning(f"Блокировка кеша недоступна: {e}")
+        return ""
+
+
+async def _release_lock(key: str, token: str) -> None:
+    redis = getattr(FastAPICache.get_backend(), "redis", None)
+    if redis is None or not token:
+        return
+    try:
+        await redis.eval(_RELEASE_LOCK, 1, f"{key}:lock", token)
+    except Exception as e:
+        logger.warning(f"Не удалось снять блокировку кеша: {e}")
+
+
+async def _read(key: str) -> dict | None:
+    cached = await FastAPICache.get_backend().get(key)
+    return json.loads(cached) if cached is not None else None
+
+
+async def _wait_for_fill(key: str, timeout: float) -> dict | None:
+    """
+    Ждёт, пока ключ заполнит воркер, который держит блокировку.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while loop.time() < deadline:
+        await asyncio.sleep(0.05)
+        entry = await _read(key)
+        if entry is not None:
+            return entry
+    return None
+
+
+def tagged_cache(expire: int, tags: Callable[..., list[str]], stale: int = 0, lock_timeout: float = 10):
+    """
+    Кеширует ответ эндпоинта в бэкенде fastapi-cache.
+    tags получает параметры запроса и возвращает теги, от которых зависит ответ:
+    версии этих тегов входят в ключ, поэтому invalidate_tags сбрасывает только их.
+
+    Одновременные промахи по одному ключу считаются один раз: внутри воркера через общий future,
+    между воркерами через блокировку в Redis. Ещё stale секунд после expire отдаётся старое
+    значение, пока один запрос его пересчитывает.
+    """
+    def wrapper(func):
+        async def compute(key, deps, entry, future, args, kwargs):
+            _misses.update(deps)
+            token = await _acquire_lock(key, lock_timeout)
+            try:
+                if token is None:
+                    # Ключ уже пересчитывает другой воркер: отдаём старое значение или ждём нового
+                    if entry is None:
+                        entry = await _wait_for_fill(key, lock_timeout)
+                    if entry is not None:
+                        future.set_result(entry["value"])
+                        return entry["value"]
+                result = await func(*args, **kwargs)
+                value = jsonable_encoder(result)
+                entry = {"fresh_until": time.time() + expire, "value": value}
+                try:
+                    await FastAPICache.get_backend().set(key, json.dumps(entry).encode(), expire + stale)
+                except Exception as e:
+                    logger.warning(f"Не удалось сохранить ответ в кеш: {e}")
+                future.set_result(value)
+                return result
+            except Exception as e:
+                future.set_exception(e)
+                future.exception()  # ждущих может не быть, не логируем как потерянное
+                raise
+            finally:
+                _inflight.pop(key, None)
+                try:
+                    if token:
+                        await _release_lock(key, token)
+                finally:
+                    if not future.done():
+                        # Отмена касается только этого запроса: ждущие не получают CancelledError,
+                        # а после снятия блокировки первый из них пересчитывает ключ
+                        future.set_result(_RETRY)
+
+        @wraps(func)
+        async def inner(*args, **kwargs):
+            params = {name: value for name, value in kwargs.items() if not isinstance(value, AsyncSession)}
+            deps = tags(**params)
+            try:
+                versions = await _tag_versions(deps)
+                digest = hashlib.md5(json.dumps([params, deps, versions], sort_keys=True, default=str).encode())
+                key = f"{FastAPICache.get_prefix()}:{func.__module__}.{func.__name__}:{digest.hexdigest()}"
+                entry = await _read(key)
+            except Exception as e:
+                logger.warning(f"Кеш недоступен, ответ считается без него: {e}")
+                return await func(*args, **kwargs)
+
+            if entry is not None and entry["fresh_until"] > time.time():
+                _hits.update(deps)
+                return entry["value"]
+
+            future = _inflight.get(key)
+            if future is not None:
+                # Устаревшее значение отдаём сразу, без него ждём общий пересчёт
+                value = entry["value"] if entry is not None else await asyncio.shield(future)
+                if value is _RETRY:
+                    # Ведущий отменён: начинаем заново, ключ мог уже заполнить другой ждущий
+                    return await inner(*args, **kwargs)
+                _hits.update(deps)
+                return value
+
+            future = _inflight[key] = asyncio.get_running_loop().create_future()
+            return await compute(key, deps, entry, future, args, kwargs)
+
+        return inner
+
+    return wrapper
+
+
+def cache_stats() -> dict:
+    """
+    Счётчики попаданий/промахов по тегам кеша этого воркера.
+    """
+    stats = {}
+    for tag in sorted(_hits.keys() | _misses.keys()):
+        hits, misses = _hits[tag], _misses[tag]
+        stats[tag] = {"hits": hits, "misses": misses, "hit_ratio": round(hits / (hits + misses), 3)}
+    return stats
@@ -0,0 +1,181 @@
+import asyncio
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any
+
+from fastapi_cache.backends import Backend
+from redis.asyncio import Redis
+
+logger = logging.getLogger(__name__)
+
+
+class LRUCache:
+    """
+    Ограниченный кеш в памяти процесса с TTL на запись.
+    Вытесняет давно не использованные записи по числу элементов и, если задан max_bytes, по суммарному размеру.
+    """
+
+    def __init__(self, max_items: int = 10_000, max_bytes: int | None = None):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self._data: OrderedDict[str, tuple[Any, float, int]] = OrderedDict()
+        self._size = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get_with_ttl(self, key: str) -> tuple[float, Any]:
+        item = self._data.get(key)
+        if item is None:
+            return 0, None
+        value, expires_at, _ = item
+        ttl = expires_at - time.monotonic()
+        if ttl <= 0:
+            self.delete(key)
+            return 0, None
+        self._data.move_to_end(key)
+        return ttl, value
+
+    def get(self, key: str) -> Any:
+        return self.get_with_ttl(key)[1]
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        self.delete(key)
+        size = len(value) if self.max_bytes is not None else 0
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+        self._data[key] = (value, time.monotonic() + ttl, size)
+        self._size += size
+        while len(self._data) > self.max_items or (self.max_bytes is not None and self._size > self.max_bytes):
+            _, (_, _, evicted) = self._data.popitem(last=False)
+            self._size -= evicted
+
+    def delete(self, key: str) -> None:
+        item = self._data.pop(key, None)
+        if item is not None:
+            self._size -= item[2]
+
+    def clear(self, prefix: str | None = None) -> int:
+        if prefix is None:
+            count = len(self._data)
+            self._data.clear()
+            self._size = 0
+            return count
+        keys = [key for key in self._data if key.startswith(prefix)]
+        for key in keys:
+            self.delete(key)
+        return len(keys)
+
+
+class LayeredBackend(Backend):
+    """
+    Бэкенд fastapi-cache из двух уровней: LRU в памяти воркера (L1) перед Redis (L2).
+
+    Записи в L1 живут не дольше l1_ttl, а изменения ключей рассылаются остальным воркерам
+    через pub/sub, чтобы они выкинули свои копии. Если Redis недоступен, бэкенд на retry_after
+    секунд переходит на один L1 вместо того, чтобы ронять запросы.
+    """
+
+    channel = "blog-cache:invalidate"
+
+    def __init__(self, redis: Redis, l1: LRUCache, l1_ttl: float = 30, retry_after: float = 5):
+        self._redis = redis
+        self.l1 = l1
+        self.l1_ttl = l1_ttl
+        self.retry_after = retry_after
+        self.node_id = uuid.uuid4().hex
+        self._down_until = 0.0
+
+    @property
+    def redis(self) -> Redis | None:
+        """
+        Клиент Redis или None, пока L2 считается недоступным.
+        """
+        return self._redis if time.monotonic() >= self._down_until else None
+
+    def mark_down(self, error: Exception | None = None) -> None:
+        if self.redis is not None:
+            logger.warning(f"Redis недоступен, кеш работает только в памяти: {error}")
+        self._down_until = time.monotonic() + self.retry_after
+
+    async def get_with_ttl(self, key: str) -> tuple[int, bytes | None]:
+        ttl, value = self.l1.get_with_ttl(key)
+        if value is not None:
+            return int(ttl), value
+        if self.redis is None:
+            return 0, None
+        try:
+            async with self.redis.pipeline(transaction=True) as pipe:
+                ttl, value = await pipe.ttl(key).get(key).execute()
+        except Exception as e:
+            self.mark_down(e)
+            return 0, None
+        if value is not None:
+            self.l1.set(key, value, min(ttl, self.l1_ttl) if ttl > 0 else self.l1_ttl)
+        return ttl, value
+
+    async def get(self, key: str) -> bytes | None:
+        return (await self.get_with_ttl(key))[1]
+
+    async def set(self, key: str, value: bytes, expire: int | None = None) -> None:
+        self.l1.set(key, value, min(expire, self.l1_ttl) if expire else self.l1_ttl)
+        if self.redis is None:
+            return
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                await pipe.set(key, value, ex=expire).publish(self.channel, f"{self.node_id} {key}").execute()
+        except Exception as e:
+            self.mark_down(e)
+
+    async def clear(self, namespace: str | None = None, key: str | None = None) -> int:
+        if namespace:
+            count = self.l1.clear(f"{namespace}:")
+            pattern = f"{namespace}:*"
+        elif key:
+            self.l1.delete(key)
+            count = 1
+            pattern = key
+        else:
+            return 0
+        if self.redis is None:
+            return count
+        try:
+            if namespace:
+                lua = f"for i, name in ipairs(redis.call('KEYS', '{pattern}')) do redis.call('DEL', name); end"
+                await self.redis.eval(lua, 0)
+            else:
+                await self.redis.delete(key)
+            await self.redis.publish(self.channel, f"{self.node_id} {pattern}")
+        except Exception as e:
+            self.mark_down(e)
+        return count
+
+    async def listen(self) -> None:
+        """
+        Слушает инвалидации других воркеров и выкидывает их ключи из L1. Переподключается сам.
+        """
+        while True:
+            try:
+                async with self._redis.pubsub() as pubsub:
+                    await pubsub.subscribe(self.channel)
+                    # Пока подписки не было, сообщения могли потеряться
+                    self.l1.clear()
+                    while True:
+                        # Ждём с таймаутом: блокирующее чтение упрётся в socket_timeout клиента
+                        message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=5.0)
+                        if message is None:
+                            continue
+                        origin, _, key = message["data"].decode().partition(" ")
+                        if origin == self.node_id:
+                            continue
+                        if key.endswith("*"):
+                            self.l1.clear(key[:-1])
+                        else:
+                            self.l1.delete(key)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.mark_down(e)
+                await asyncio.sleep(self.retry_after)
@@ -11,6 +11,21 @@ class Settings(BaseSettings):
     SECRET_KEY: str
     ALGORITHM: str
     ACCESS_TOKEN_EXPIRE_MINUTES: int
+    VIEWS_FLUSH_INTERVAL: float = 5.0
+    REDIS_URL: str = "redis://redis:6379/0"
+    CACHE_L1_MAX_BYTES: int = 64 * 1024 * 1024
+    CACHE_L1_TTL: float = 30.0
+    COMMENTS_STREAM_HEARTBEAT: float = 15.0
+    SUGGEST_CACHE_TTL: float = 10.0
+    SEARCH_FACETS_TTL: float = 60.0
+    SENTIMENT_MAX_BATCH: int = 32
+    SENTIMENT_MAX_WAIT_MS: float = 5.0
+    SENTIMENT_MAX_QUEUE: int = 256
+    SENTIMENT_BATCH_JOBS: int = 2
+    SENTIMENT_CACHE_ITEMS: int = 100_000
+    SENTIMENT_CACHE_TTL: float = 30 * 24 * 3600
+    SENTIMENT_SCORE_INTERVAL: float = 1.0
+    SENTIMENT_SCORE_MAX_PENDING: int = 10_000
     
     model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8")
     
@@ -0,0 +1,102 @@
+import asyncio
+import json
+import logging
+from collections import defaultdict
+
+from redis.asyncio import Redis
+
+from app.core.redis import redis
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    """
+    Очередь событий одного SSE-клиента. Если клиент не успевает читать, подписка закрывается,
+    и он переподключается с Last-Event-ID.
+    """
+
+    def __init__(self, post_id: int, max_size: int):
+        self.post_id = post_id
+        self.queue: asyncio.Queue[tuple[int, str]] = asyncio.Queue(max_size)
+        self.overflowed = False
+
+    def push(self, event_id: int, data: str) -> None:
+        try:
+            self.queue.put_nowait((event_id, data))
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+
+class CommentBroker:
+    """
+    Рассылает новые комментарии SSE-клиентам.
+
+    Воркер держит одну подписку на канал Redis и раздаёт сообщения локальным очередям по post_id,
+    поэтому комментарий, созданный в любом воркере, доходит до всех читателей статьи.
+    Пока своей подписки нет (Redis недоступен), события доставляются хотя бы локальным клиентам.
+    """
+
+    channel = "blog-comments"
+
+    def __init__(self, redis: Redis, queue_size: int = 100, retry_after: float = 5):
+        self._redis = redis
+        self.queue_size = queue_size
+        self.retry_after = retry_after
+        self._subscriptions: defaultdict[int, set[Subscription]] = defaultdict(set)
+        self._subscribed = False
+
+    def subscribe(self, post_id: int) -> Subscription:
+        subscription = Subscription(post_id, self.queue_size)
+        self._subscriptions[post_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        listeners = self._subscriptions.get(subscription.post_id)
+        if listeners is None:
+            return
+        listeners.discard(subscription)
+        if not listeners:
+            del self._subscriptions[subscription.post_id]
+
+    def dispatch(self, post_id: int, event_id: int, data: str) -> None:
+        for subscription in self._subscriptions.get(post_id, ()):
+            subscription.push(event_id, data)
+
+    async def publish(self, post_id: int, event_id: int, data: str) -> None:
+        """
+        Публикует событие статьи. Ошибки Redis не пробрасываются: комментарий уже сохранён.
+        """
+        if not self._subscribed:
+            self.dispatch(post_id, event_id, data)
+        try:
+            await self._redis.publish(self.channel, json.dumps({"post_id": post_id, "id": event_id, "data": data}))
+        except Exception as e:
+            logger.warning(f"Не удалось опубликовать комментарий в Redis: {e}")
+
+    async def listen(self) -> None:
+        """
+        Единственная подписка воркера на канал комментариев. Переподключается сама.
+        """
+        while True:
+            try:
+                async with self._redis.pubsub() as pubsub:
+                    await pubsub.subscribe(self.channel)
+                    self._subscribed = True
+                    while True:
+                        # Ждём с таймаутом: блокирующее чтение упрётся в socket_timeout клиента
+                        message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=5.0)
+                        if message is None:
+                            continue
+                        event = json.loads(message["data"])
+                        self.dispatch(event["post_id"], event["id"], event["data"])
+            except asyncio.CancelledError:
+                self._subscribed = False
+                raise
+            except Exception as e:
+                self._subscribed = False
+                logger.warning(f"Подписка на комментарии потеряна: {e}")
+                await asyncio.sleep(self.retry_after)
+
+
+comment_broker = CommentBroker(redis)
@@ -0,0 +1,81 @@
+import base64
+import json
+from datetime import datetime
+from typing import Any
+
+from fastapi import HTTPException, status
+from sqlalchemy import Select, tuple_
+
+
+def encode_cursor(created_at: datetime, id: int, direction: str) -> str:
+    """
+    Кодирует позицию (created_at, id) и направление в непрозрачный курсор.
+    """
+    raw = json.dumps([created_at.isoformat(), id, direction], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int, str]:
+    """
+    Раскодирует курсор, выданный encode_cursor.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, id, direction = json.loads(raw)
+        if direction not in ("next", "prev"):
+            raise ValueError(direction)
+        return datetime.fromisoformat(created_at), int(id), direction
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Некорректный курсор")
+
+
+def keyset_query(stmt: Select, created_col, id_col, cursor: str, page_size: int,
+                 descending: bool = True) -> Select:
+    """
+    Добавляет к запросу keyset-условие, ORDER BY (created_at, id) и LIMIT page_size + 1.
+    Пустой курсор означает первую страницу.
+    """
+    direction = "next"
+    if cursor:
+        created_at, id, direction = decode_cursor(cursor)
+
+    # Для prev идём от курсора в обратную сторону, а потом разворачиваем страницу
+    desc = descending if direction == "next" else not descending
+    if cursor:
+        key, bound = tuple_(created_col, id_col), tuple_(created_at, id)
+        stmt = stmt.where(key < bound if desc else key > bound)
+
+    order_by = (created_col.desc(), id_col.desc()) if desc else (created_col.asc(), id_col.asc())
+    return stmt.order_by(*order_by).limit(page_size + 1)
+
+
+def keyset_page(rows: list[Any], cursor: str, page_size: int,
+                created_attr: str = "created_at") -> tuple[list[Any], str | None, str | None]:
+    """
+    Обрезает выборку keyset_query до page_size и считает курсоры соседних страниц.
+    Возвращает (элементы, next_cursor, prev_cursor).
+    """
+    direction = decode_cursor(cursor)[2] if cursor else "next"
+    has_more = len(rows) > page_size
+    items = rows[:page_size]
+    if direction == "prev":
+        items.reverse()
+
+    def position(item, to: str) -> str:
+        return encode_cursor(getattr(item, created_attr), item.id, to)
+
+    if not items:
+        # Пустая страница: даём вернуться туда, откуда пришли
+        if not cursor:
+            return items, None, None
+        created_at, id, _ = decode_cursor(cursor)
+        back = encode_cursor(created_at, id, "prev" if direction == "next" else "next")
+        return (items, None, back) if direction == "next" else (items, back, None)
+
+    if direction == "next":
+        next_cursor = position(items[-1], "next") if has_more else None
+        prev_cursor = position(items[0], "prev") if cursor else None
+    else:
+        next_cursor = position(items[-1], "next")
+        prev_cursor = position(items[0], "prev") if has_more else None
+    return items, next_cursor, prev_cursor
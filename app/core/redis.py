@@ -0,0 +1,6 @@
+from redis import asyncio as aioredis
+
+from app.core.config import settings
+
+# Общий клиент на воркер: соединения берутся из пула лениво, при первом запросе
+redis = aioredis.from_url(settings.REDIS_URL, socket_connect_timeout=1, socket_timeout=1)
@@ -0,0 +1,22 @@
+from typing import Callable
+
+from fastapi.responses import StreamingResponse
+from starlette.types import Receive, Scope, Send
+
+
+class ClosingStreamingResponse(StreamingResponse):
+    """
+    Потоковый ответ, который после отправки всегда вызывает on_close.
+    finally генератора тела не выполняется, если генератор так и не запустили:
+    клиент отключился до первой строки или отправка упала раньше.
+    """
+
+    def __init__(self, content, on_close: Callable[[], None], **kwargs):
+        super().__init__(content, **kwargs)
+        self.on_close = on_close
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.on_close()
@@ -0,0 +1,53 @@
+import random
+
+from sqlalchemy import case, func, literal, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.stats import StatsCounter
+from app.models.tags import Tag
+
+COUNTER_SHARDS = 16
+
+PUBLISHED_POSTS = "published_posts"
+COMMENTS = "comments"
+
+
+def bump_counter(name: str, delta=1, source=None):
+    """
+    UPSERT, добавляющий delta к случайному шарду счётчика.
+    С source (например, CTE с RETURNING) строка вставляется на каждую строку source,
+    поэтому счётчик меняется, только если операция действительно что-то записала.
+    """
+    values = select(literal(name), literal(random.randrange(COUNTER_SHARDS)),
+                    literal(delta) if isinstance(delta, int) else delta)
+    if source is not None:
+        values = values.select_from(source)
+    stmt = pg_insert(StatsCounter).from_select(["name", "shard", "value"], values)
+    return stmt.on_conflict_do_update(index_elements=[StatsCounter.name, StatsCounter.shard],
+                                      set_={"value": StatsCounter.value + stmt.excluded.value})
+
+
+async def read_counters(db: AsyncSession, *names: str) -> dict[str, int]:
+    rows = await db.execute(select(StatsCounter.name, func.sum(StatsCounter.value))
+                            .where(StatsCounter.name.in_(names))
+                            .group_by(StatsCounter.name))
+    return {name: 0 for name in names} | {name: int(value) for name, value in rows}
+
+
+async def apply_post_change(db: AsyncSession, was_published: bool, old_tag_ids: set[int],
+                            is_published: bool, new_tag_ids: set[int]) -> None:
+    """
+    Переносит изменение статьи в счётчики: число опубликованных статей и published_count тегов.
+    Вызывается в транзакции самой записи до commit.
+    """
+    if was_published != is_published:
+        await db.execute(bump_counter(PUBLISHED_POSTS, 1 if is_published else -1))
+
+    before = old_tag_ids if was_published else set()
+    after = new_tag_ids if is_published else set()
+    added, removed = after - before, before - after
+    if added or removed:
+        await db.execute(update(Tag).where(Tag.id.in_(added | removed))
+                         .values(published_count=Tag.published_count + case((Tag.id.in_(added), 1), else_=-1))
+                         .execution_options(synchronize_session=False))
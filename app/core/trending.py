@@ -0,0 +1,184 @@
+import asyncio
+import logging
+import math
+import time
+from collections import Counter
+
+from redis.asyncio import Redis
+
+from app.core.redis import redis
+
+logger = logging.getLogger(__name__)
+
+VIEW_WEIGHT = 1.0
+COMMENT_WEIGHT = 5.0
+
+BUCKET_SECONDS = 300
+# Окно -> время затухания: событие возрастом tau весит в e раз меньше свежего
+WINDOWS = {"1h": 3600, "24h": 24 * 3600, "7d": 7 * 24 * 3600}
+DECAY = {window: seconds / 3 for window, seconds in WINDOWS.items()}
+# Корзина должна дожить до уплотнения самого длинного окна, с запасом на простой фоновой задачи
+BUCKET_TTL = max(WINDOWS.values()) + 24 * 3600
+
+# Счёт хранится в «прямом затухании»: вклад события — weight * exp((t - epoch) / tau).
+# Порядок постов тот же, что у суммы weight * exp(-(now - t) / tau), но старые счёты не надо пересчитывать
+# при каждом событии; уплотнение периодически переносит epoch вперёд, чтобы экспоненты не росли.
+_RECORD = """
+redis.call('ZINCRBY', KEYS[1], ARGV[2], ARGV[1])
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+for i = 1, (#KEYS - 1) / 2 do
+    local epoch = tonumber(redis.call('GET', KEYS[2 * i + 1]))
+    if not epoch then
+        epoch = tonumber(ARGV[3])
+        redis.call('SET', KEYS[2 * i + 1], ARGV[3])
+    end
+    local factor = math.exp((tonumber(ARGV[3]) - epoch) / tonumber(ARGV[4 + i]))
+    redis.call('ZINCRBY', KEYS[2 * i], tonumber(ARGV[2]) * factor, ARGV[1])
+end
+"""
+
+# Вычитает вклад вышедших из окна корзин, переносит epoch на текущую корзину и чистит нули
+_COMPACT = """
+local tau = tonumber(ARGV[1])
+local bucket_seconds = tonumber(ARGV[2])
+local first = tonumber(ARGV[3])
+local new_epoch = tonumber(ARGV[4])
+local epoch = tonumber(redis.call('GET', KEYS[2]) or ARGV[4])
+local marker = tonumber(redis.call('GET', KEYS[3]) or (first - 1))
+for i = 4, #KEYS do
+    local index = first + i - 4
+    if index > marker then
+        local factor = math.exp((index * bucket_seconds - epoch) / tau)
+        local members = redis.call('ZRANGE', KEYS[i], 0, -1, 'WITHSCORES')
+        for j = 1, #members, 2 do
+            redis.call('ZINCRBY', KEYS[1], -tonumber(members[j + 1]) * factor, members[j])
+        end
+        marker = index
+    end
+end
+redis.call('SET', KEYS[3], marker)
+if new_epoch > epoch then
+    redis.call('ZUNIONSTORE', KEYS[1], 1, KEYS[1], 'WEIGHTS', math.exp((epoch - new_epoch) / tau))
+    redis.call('SET', KEYS[2], new_epoch)
+end
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', ARGV[5])
+"""
+
+
+class TrendingScores:
+    """
+    Затухающие счёты популярности статей в Redis.
+
+    События (просмотры, комментарии) копятся в памяти воркера и раз в interval секунд пишутся одним
+    pipeline: в корзину BUCKET_SECONDS с сырыми весами и в отсортированное множество каждого окна.
+    Чтение топа — один ZREVRANGE. Фоновое уплотнение под блокировкой вычитает корзины, вышедшие из окна.
+    """
+
+    prefix = "trending"
+
+    def __init__(self, redis: Redis, interval: float = 5.0):
+        self._redis = redis
+        self.interval = interval
+        self._pending: Counter[int] = Counter()
+        self._task: asyncio.Task | None = None
+        self._record = redis.register_script(_RECORD)
+        self._compact = redis.register_script(_COMPACT)
+        self._last_compaction = float("-inf")
+
+    def _bucket_key(self, index: int) -> str:
+        return f"{self.prefix}:bucket:{index}"
+
+    def _window_key(self, window: str, name: str = "scores") -> str:
+        return f"{self.prefix}:{window}:{name}"
+
+    def incr(self, post_id: int, weight: float = VIEW_WEIGHT) -> None:
+        self._pending[post_id] += weight
+
+    def clear(self) -> None:
+        self._pending.clear()
+
+    async def top(self, window: str, limit: int) -> list[tuple[int, float]]:
+        """
+        Топ статей окна: [(post_id, счёт)], счёт приведён к текущему моменту.
+        """
+        async with self._redis.pipeline(transaction=False) as pipe:
+            members, epoch = await (pipe.zrevrange(self._window_key(window), 0, limit - 1, withscores=True)
+                                    .get(self._window_key(window, "epoch")).execute())
+        scale = math.exp((float(epoch) - time.time()) / DECAY[window]) if epoch is not None else 1.0
+        return [(int(member), score * scale) for member, score in members]
+
+    async def flush(self) -> int:
+        """
+        Записывает накопленные события в Redis. Возвращает число статей.
+        """
+        if not self._pending:
+            return 0
+        batch, self._pending = self._pending, Counter()
+        index = int(time.time() // BUCKET_SECONDS)
+        keys = [self._bucket_key(index)]
+        taus = []
+        for window in WINDOWS:
+            keys += [self._window_key(window), self._window_key(window, "epoch")]
+            taus.append(DECAY[window])
+        try:
+            async with self._redis.pipeline(transaction=False) as pipe:
+                for post_id, weight in batch.items():
+                    await self._record(keys=keys, args=[post_id, weight, index * BUCKET_SECONDS, BUCKET_TTL, *taus],
+                                       client=pipe)
+                await pipe.execute()
+        except BaseException:
+            # Не теряем события: вернём их в очередь до следующей попытки
+            self._pending.update(batch)
+            raise
+        return len(batch)
+
+    async def compact(self) -> None:
+        """
+        Вычитает из окон корзины, целиком вышедшие за их границу. Выполняет один воркер за раз.
+        """
+        if not await self._redis.set(f"{self.prefix}:compaction:lock", 1, nx=True, ex=BUCKET_SECONDS):
+            return
+        now_index = int(time.time() // BUCKET_SECONDS)
+        for window, seconds in WINDOWS.items():
+            last = now_index - seconds // BUCKET_SECONDS - 1
+            marker = await self._redis.get(self._window_key(window, "expired"))
+            first = int(marker) + 1 if marker is not None else last
+            # старше BUCKET_TTL корзин уже нет, их вклад потерян вместе с ними
+            first = max(first, last - BUCKET_TTL // BUCKET_SECONDS)
+            if first > last:
+                continue
+            keys = [self._window_key(window), self._window_key(window, "epoch"), self._window_key(window, "expired")]
+            keys += [self._bucket_key(index) for index in range(first, last + 1)]
+            await self._compact(keys=keys, args=[DECAY[window], BUCKET_SECONDS, first, now_index * BUCKET_SECONDS,
+                                                 1e-9])
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.flush()
+                if time.monotonic() - self._last_compaction >= BUCKET_SECONDS:
+                    self._last_compaction = time.monotonic()
+                    await self.compact()
+            except Exception as e:
+                logger.warning(f"Не удалось обновить тренды: {e}")
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error(f"События трендов не записаны при остановке: {e}")
+
+
+trending = TrendingScores(redis)
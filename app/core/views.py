@@ -0,0 +1,85 @@
+import asyncio
+import logging
+from collections import Counter
+
+from sqlalchemy import bindparam, update
+
+from app.core.config import settings
+from app.core.database import async_session_maker
+from app.models.posts import Post as PostModel
+
+logger = logging.getLogger(__name__)
+
+
+class ViewCounter:
+    """
+    Копит просмотры статей в памяти воркера и периодически сбрасывает их
+    в posts.view_count одним пакетным UPDATE вместо UPDATE + COMMIT на каждое чтение.
+    """
+
+    def __init__(self, interval: float = 5.0):
+        self.interval = interval
+        self._pending: Counter[int] = Counter()
+        self._task: asyncio.Task | None = None
+
+    def incr(self, post_id: int) -> None:
+        self._pending[post_id] += 1
+
+    def pending(self, post_id: int) -> int:
+        return self._pending.get(post_id, 0)
+
+    def clear(self) -> None:
+        self._pending.clear()
+
+    async def flush(self) -> int:
+        """
+        Записывает накопленные просмотры в БД. Возвращает число обновлённых статей.
+        """
+        if not self._pending:
+            return 0
+        batch, self._pending = self._pending, Counter()
+        table = PostModel.__table__
+        # updated_at оставляем как есть: просмотр не является правкой статьи
+        stmt = (update(table).where(table.c.id == bindparam("post_id"))
+                .values(view_count=table.c.view_count + bindparam("delta"), updated_at=table.c.updated_at))
+        try:
+            async with async_session_maker() as session:
+                await session.execute(stmt, [{"post_id": post_id, "delta": delta}
+                                             for post_id, delta in batch.items()])
+                await session.commit()
+        except BaseException:
+            # Не теряем просмотры: вернём их в очередь до следующей попытки
+            self._pending.update(batch)
+            raise
+        return len(batch)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.warning(f"Не удалось сбросить просмотры: {e}")
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """
+        Останавливает фоновую задачу и сбрасывает всё, что ещё не записано.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error(f"Просмотры не записаны при остановке: {e}")
+
+
+view_counter = ViewCounter(interval=settings.VIEWS_FLUSH_INTERVAL)
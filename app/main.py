@@ -1,30 +1,50 @@
-import time
-from typing import Dict
-from fastapi import FastAPI, HTTPException
+import asyncio
+import logging
+from fastapi import FastAPI
 from fastapi_cache import FastAPICache
-from fastapi_cache.backends.redis import RedisBackend
-from pydantic import BaseModel
-from redis import asyncio as aioredis
 from contextlib import asynccontextmanager
-from fastapi_cache.decorator import cache
-from starlette.requests import Request
 from fastapi.staticfiles import StaticFiles
 
 
 from app.routers import auth, users, posts, comments, stats, search, sentiment
+from app.core.config import settings
+from app.core.views import view_counter
+from app.core.events import comment_broker
+from app.core.trending import trending
+from app.core.redis import redis
+from app.core.cache_backend import LayeredBackend, LRUCache
+from app.routers.sentiment import sentiment_batcher, sentiment_executor, comment_scorer
+
+logger = logging.getLogger(__name__)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    redis = aioredis.from_url("redis://redis:6379/0")
-    
+    backend = LayeredBackend(redis, LRUCache(max_bytes=settings.CACHE_L1_MAX_BYTES), l1_ttl=settings.CACHE_L1_TTL)
     try:
         await redis.ping()
-        FastAPICache.init(RedisBackend(redis), prefix="blog-cache")
-        yield
     except Exception as e:
-        print(f"Ошьбка подключения к редису:(: {e}")
+        # Без Redis живём на L1 и БД, бэкенд сам попробует переподключиться
+        backend.mark_down(e)
+    FastAPICache.init(backend, prefix="blog-cache")
+    invalidations = asyncio.create_task(backend.listen())
+    comment_events = asyncio.create_task(comment_broker.listen())
+    view_counter.start()
+    trending.start()
+    sentiment_batcher.start()
+    comment_scorer.start()
+    
+    try:
+        yield
     finally:
-        await redis.close()
+        invalidations.cancel()
+        comment_events.cancel()
+        await view_counter.stop()
+        await trending.stop()
+        # Сначала оценки комментариев: им ещё нужна модель
+        await comment_scorer.stop()
+        await sentiment_batcher.stop()
+        sentiment_executor.shutdown(wait=False, cancel_futures=True)
+        await redis.aclose()
 
 app = FastAPI(title="Blog API", lifespan=lifespan)
 
@@ -0,0 +1,36 @@
+"""post search vector
+
+Revision ID: 0d6b4a91c58e
+Revises: f19c3d6a8e27
+Create Date: 2026-10-18 18:05:36.724158
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0d6b4a91c58e'
+down_revision: Union[str, Sequence[str], None] = 'f19c3d6a8e27'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Генерируемая колонка заполняется сразу для всех строк (перезапись таблицы)
+    op.add_column('posts', sa.Column('search_vector', postgresql.TSVECTOR(), sa.Computed(
+        "setweight(to_tsvector('russian', coalesce(title, '')), 'A') || "
+        "setweight(to_tsvector('russian', coalesce(content, '')), 'B')", persisted=True), nullable=False))
+    with op.get_context().autocommit_block():
+        op.create_index('ix_posts_search_vector', 'posts', ['search_vector'], unique=False,
+                        postgresql_using='gin', postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_posts_search_vector', table_name='posts', postgresql_using='gin')
+    op.drop_column('posts', 'search_vector')
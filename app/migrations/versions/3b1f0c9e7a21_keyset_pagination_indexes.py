@@ -0,0 +1,40 @@
+"""keyset pagination indexes
+
+Revision ID: 3b1f0c9e7a21
+Revises: d344aaacb9b8
+Create Date: 2026-10-18 10:12:43.118204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3b1f0c9e7a21'
+down_revision: Union[str, Sequence[str], None] = 'd344aaacb9b8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # CONCURRENTLY нельзя внутри транзакции, а блокировать posts на время построения не хочется
+    with op.get_context().autocommit_block():
+        op.create_index('ix_posts_status_created_at_id', 'posts', ['status', 'created_at', 'id'],
+                        unique=False, postgresql_concurrently=True)
+        op.create_index('ix_posts_author_id_created_at_id', 'posts', ['author_id', 'created_at', 'id'],
+                        unique=False, postgresql_concurrently=True)
+        op.create_index('ix_comments_post_id_created_at_id', 'comments', ['post_id', 'created_at', 'id'],
+                        unique=False, postgresql_concurrently=True)
+        op.create_index('ix_users_date_joined_id', 'users', ['date_joined', 'id'],
+                        unique=False, postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_users_date_joined_id', table_name='users')
+    op.drop_index('ix_comments_post_id_created_at_id', table_name='comments')
+    op.drop_index('ix_posts_author_id_created_at_id', table_name='posts')
+    op.drop_index('ix_posts_status_created_at_id', table_name='posts')
@@ -0,0 +1,33 @@
+"""post title trigram index
+
+Revision ID: 5a2e7c08d4b3
+Revises: 0d6b4a91c58e
+Create Date: 2026-10-18 19:32:14.880631
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5a2e7c08d4b3'
+down_revision: Union[str, Sequence[str], None] = '0d6b4a91c58e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    with op.get_context().autocommit_block():
+        op.create_index('ix_posts_title_trgm', 'posts', ['title'], unique=False, postgresql_using='gin',
+                        postgresql_ops={'title': 'gin_trgm_ops'}, postgresql_where=sa.text("status = 'published'"),
+                        postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_posts_title_trgm', table_name='posts', postgresql_using='gin',
+                  postgresql_where=sa.text("status = 'published'"))
@@ -0,0 +1,30 @@
+"""slug pattern index
+
+Revision ID: 8c4e2d7b5f10
+Revises: 3b1f0c9e7a21
+Create Date: 2026-10-18 12:41:05.402917
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8c4e2d7b5f10'
+down_revision: Union[str, Sequence[str], None] = '3b1f0c9e7a21'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.get_context().autocommit_block():
+        op.create_index('ix_posts_slug_pattern', 'posts', ['slug'], unique=False,
+                        postgresql_ops={'slug': 'varchar_pattern_ops'}, postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_posts_slug_pattern', table_name='posts')
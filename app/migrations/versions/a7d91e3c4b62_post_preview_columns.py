@@ -0,0 +1,56 @@
+"""post preview columns
+
+Revision ID: a7d91e3c4b62
+Revises: 8c4e2d7b5f10
+Create Date: 2026-10-18 14:03:27.551930
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7d91e3c4b62'
+down_revision: Union[str, Sequence[str], None] = '8c4e2d7b5f10'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 5000
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('posts', sa.Column('preview', sa.String(length=200), server_default='', nullable=False))
+    op.add_column('posts', sa.Column('word_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('posts', sa.Column('reading_time', sa.Integer(), server_default='1', nullable=False))
+
+    # Заполняем пачками по id, каждая пачка в своей транзакции, чтобы не держать блокировки на всю таблицу
+    conn = op.get_bind()
+    with op.get_context().autocommit_block():
+        last_id = 0
+        while True:
+            last_id = conn.execute(sa.text("""
+                WITH batch AS (
+                    SELECT id FROM posts WHERE id > :last_id ORDER BY id LIMIT :batch_size
+                ), words AS (
+                    SELECT p.id, (SELECT count(*) FROM regexp_matches(p.content, '\\S+', 'g')) AS word_count
+                    FROM posts p JOIN batch ON batch.id = p.id
+                ), updated AS (
+                    UPDATE posts SET preview = left(posts.content, 200),
+                                     word_count = words.word_count,
+                                     reading_time = greatest(1, ceil(words.word_count / 200.0))::int
+                    FROM words WHERE posts.id = words.id
+                )
+                SELECT max(id) FROM batch
+            """), {"last_id": last_id, "batch_size": BATCH_SIZE}).scalar()
+            if last_id is None:
+                break
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('posts', 'reading_time')
+    op.drop_column('posts', 'word_count')
+    op.drop_column('posts', 'preview')
@@ -0,0 +1,51 @@
+"""stats rollups
+
+Revision ID: b83f1e6d2a54
+Revises: 5a2e7c08d4b3
+Create Date: 2026-10-18 20:48:03.617925
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b83f1e6d2a54'
+down_revision: Union[str, Sequence[str], None] = '5a2e7c08d4b3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('stats_counters',
+    sa.Column('name', sa.String(length=50), nullable=False),
+    sa.Column('shard', sa.Integer(), nullable=False),
+    sa.Column('value', sa.BigInteger(), server_default='0', nullable=False),
+    sa.PrimaryKeyConstraint('name', 'shard')
+    )
+    op.add_column('tags', sa.Column('published_count', sa.Integer(), server_default='0', nullable=False))
+    op.create_index('ix_tags_published_count', 'tags', ['published_count'], unique=False)
+
+    # Начальные значения — в шард 0, дальше счётчики ведут записи статей и комментариев
+    op.execute(
+        "INSERT INTO stats_counters (name, shard, value) VALUES "
+        "('published_posts', 0, (SELECT count(*) FROM posts WHERE status = 'published')), "
+        "('comments', 0, (SELECT count(*) FROM comments))"
+    )
+    op.execute(
+        "UPDATE tags SET published_count = c.cnt "
+        "FROM (SELECT post_tags.tag_id, count(*) AS cnt FROM post_tags "
+        "JOIN posts ON posts.id = post_tags.post_id WHERE posts.status = 'published' "
+        "GROUP BY post_tags.tag_id) AS c "
+        "WHERE tags.id = c.tag_id"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_tags_published_count', table_name='tags')
+    op.drop_column('tags', 'published_count')
+    op.drop_table('stats_counters')
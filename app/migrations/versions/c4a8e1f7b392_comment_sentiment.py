@@ -0,0 +1,40 @@
+"""comment sentiment
+
+Revision ID: c4a8e1f7b392
+Revises: b83f1e6d2a54
+Create Date: 2026-10-18 23:37:52.184306
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4a8e1f7b392'
+down_revision: Union[str, Sequence[str], None] = 'b83f1e6d2a54'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('comments', sa.Column('sentiment_score', sa.Float(), nullable=True))
+    op.add_column('posts', sa.Column('sentiment_scored', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('posts', sa.Column('sentiment_positive', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('posts', sa.Column('sentiment_sum', sa.Float(), server_default='0', nullable=False))
+    # Существующие комментарии оценивает python -m app.ml.backfill, сводки пополняются по мере оценки
+    with op.get_context().autocommit_block():
+        op.create_index('ix_comments_sentiment_missing', 'comments', ['id'], unique=False,
+                        postgresql_where=sa.text('sentiment_score IS NULL'), postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_comments_sentiment_missing', table_name='comments',
+                  postgresql_where=sa.text('sentiment_score IS NULL'))
+    op.drop_column('posts', 'sentiment_sum')
+    op.drop_column('posts', 'sentiment_positive')
+    op.drop_column('posts', 'sentiment_scored')
+    op.drop_column('comments', 'sentiment_score')
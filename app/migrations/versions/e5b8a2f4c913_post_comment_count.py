@@ -0,0 +1,54 @@
+"""post comment count
+
+Revision ID: e5b8a2f4c913
+Revises: a7d91e3c4b62
+Create Date: 2026-10-18 15:21:09.402617
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5b8a2f4c913'
+down_revision: Union[str, Sequence[str], None] = 'a7d91e3c4b62'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 5000
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('posts', sa.Column('comment_count', sa.Integer(), server_default='0', nullable=False))
+
+    # Считаем пачками постов по id, каждая пачка в своей транзакции, чтобы не держать блокировки на всю таблицу
+    conn = op.get_bind()
+    with op.get_context().autocommit_block():
+        last_id = 0
+        while True:
+            last_id = conn.execute(sa.text("""
+                WITH batch AS (
+                    SELECT id FROM posts WHERE id > :last_id ORDER BY id LIMIT :batch_size
+                ), counts AS (
+                    SELECT batch.id, (SELECT count(*) FROM comments c WHERE c.post_id = batch.id) AS cnt
+                    FROM batch
+                ), updated AS (
+                    UPDATE posts SET comment_count = counts.cnt
+                    FROM counts WHERE posts.id = counts.id AND counts.cnt > 0
+                )
+                SELECT max(id) FROM batch
+            """), {"last_id": last_id, "batch_size": BATCH_SIZE}).scalar()
+            if last_id is None:
+                break
+
+        op.create_index('ix_comments_top_level', 'comments', ['post_id', 'created_at', 'id'], unique=False,
+                        postgresql_where=sa.text('parent_id IS NULL'), postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_comments_top_level', table_name='comments', postgresql_where=sa.text('parent_id IS NULL'))
+    op.drop_column('posts', 'comment_count')
@@ -0,0 +1,74 @@
+"""comment materialized path
+
+Revision ID: f19c3d6a8e27
+Revises: e5b8a2f4c913
+Create Date: 2026-10-18 16:47:52.190384
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f19c3d6a8e27'
+down_revision: Union[str, Sequence[str], None] = 'e5b8a2f4c913'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 1000
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('comments', sa.Column('path', sa.Text(collation='C'), nullable=True))
+    op.add_column('comments', sa.Column('depth', sa.Integer(), server_default='0', nullable=False))
+
+    conn = op.get_bind()
+    with op.get_context().autocommit_block():
+        op.create_index('ix_comments_post_id_path', 'comments', ['post_id', 'path'], unique=False,
+                        postgresql_concurrently=True)
+        op.create_index('ix_comments_path_missing', 'comments', ['post_id'], unique=False,
+                        postgresql_where=sa.text('path IS NULL'), postgresql_concurrently=True)
+
+        # Заполняем пачками статей: ветка целиком лежит в одной статье. Пока заполнение идёт,
+        # эндпоинт ветки строит дерево рекурсивным CTE
+        last_id = 0
+        while True:
+            last_id = conn.execute(sa.text("""
+                WITH RECURSIVE batch AS (
+                    SELECT id FROM posts WHERE id > :last_id ORDER BY id LIMIT :batch_size
+                ), tree AS (
+                    SELECT c.id, lpad(c.id::text, 10, '0') AS path, 0 AS depth
+                    FROM comments c JOIN batch ON batch.id = c.post_id
+                    WHERE c.parent_id IS NULL
+                    UNION ALL
+                    SELECT c.id, tree.path || '.' || lpad(c.id::text, 10, '0'), tree.depth + 1
+                    FROM comments c JOIN tree ON c.parent_id = tree.id
+                ), updated AS (
+                    UPDATE comments SET path = tree.path, depth = tree.depth
+                    FROM tree WHERE comments.id = tree.id AND comments.path IS NULL
+                )
+                SELECT max(id) FROM batch
+            """), {"last_id": last_id, "batch_size": BATCH_SIZE}).scalar()
+            if last_id is None:
+                break
+
+        # Верхний уровень — по глубине: ответы удалённого комментария получают parent_id NULL,
+        # но остаются на своей глубине в ветке
+        op.create_index('ix_comments_top_level_depth', 'comments', ['post_id', 'created_at', 'id'], unique=False,
+                        postgresql_where=sa.text('depth = 0'), postgresql_concurrently=True)
+        op.drop_index('ix_comments_top_level', table_name='comments', postgresql_where=sa.text('parent_id IS NULL'),
+                      postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.create_index('ix_comments_top_level', 'comments', ['post_id', 'created_at', 'id'], unique=False,
+                    postgresql_where=sa.text('parent_id IS NULL'))
+    op.drop_index('ix_comments_top_level_depth', table_name='comments', postgresql_where=sa.text('depth = 0'))
+    op.drop_index('ix_comments_path_missing', table_name='comments', postgresql_where=sa.text('path IS NULL'))
+    op.drop_index('ix_comments_post_id_path', table_name='comments')
+    op.drop_column('comments', 'depth')
+    op.drop_column('comments', 'path')
@@ -0,0 +1,57 @@
+"""
+Офлайн-оценка тональности комментариев без sentiment_score: созданных до появления оценки, пропущенных фоновой
+задачей (воркер упал, модель не была загружена) или после замены модели, если оценки сброшены.
+Идёт по id пакетами размера модели, каждый пакет — своя транзакция, поэтому прерванный запуск можно повторить.
+
+Запуск (БД из .env, нужен экспорт модели в model/sentiment_numpy):
+    python -m app.ml.backfill --batch 256
+"""
+import argparse
+import asyncio
+import html
+import time
+
+from sqlalchemy import select
+
+from app.core.database import async_engine, async_session_maker
+from app.ml.scoring import store_scores
+from app.models.comments import Comment as CommentModel
+from app.routers.sentiment import BATCH_CHUNK_SIZE, model, predict_batch
+
+
+async def backfill(batch_size: int) -> int:
+    if model is None:
+        raise SystemExit("Модель не загружена: сначала python -m app.ml.export")
+    last_id, total = 0, 0
+    started = time.perf_counter()
+    while True:
+        async with async_session_maker() as db:
+            rows = (await db.execute(select(CommentModel.id, CommentModel.text)
+                                     .where(CommentModel.sentiment_score.is_(None), CommentModel.id > last_id)
+                                     .order_by(CommentModel.id)
+                                     .limit(batch_size))).all()
+            if not rows:
+                break
+            # В БД хранится экранированный текст, модель видела исходный
+            scores = predict_batch([html.unescape(row.text) for row in rows])
+            await db.execute(store_scores(dict(zip((row.id for row in rows), scores))))
+            await db.commit()
+        last_id = rows[-1].id
+        total += len(rows)
+        print(f"scored {total} comments, last id {last_id}, {total / (time.perf_counter() - started):.0f}/s")
+    return total
+
+
+async def main(batch_size: int) -> None:
+    try:
+        total = await backfill(batch_size)
+        print(f"done: {total} comments")
+    finally:
+        await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--batch", type=int, default=BATCH_CHUNK_SIZE)
+    args = parser.parse_args()
+    asyncio.run(main(args.batch))
@@ -0,0 +1,136 @@
+import asyncio
+import statistics
+import time
+from collections import Counter, deque
+from concurrent.futures import Executor
+from typing import Any, Callable, Sequence
+
+
+class MicroBatcher:
+    """
+    Собирает одновременные запросы к модели в пакеты.
+
+    Пакет уходит в predict, как только набралось max_batch_size элементов или первый из них прождал
+    max_wait секунд; каждый вызывающий получает свой результат через future. Для метрик копятся
+    распределение размеров пакетов и задержка в очереди до начала обработки.
+
+    predict выполняется в executor, чтобы не блокировать цикл событий. Очередь ограничена max_queue:
+    когда модель не успевает, submit сразу бросает asyncio.QueueFull вместо того, чтобы копить запросы.
+    """
+
+    def __init__(self, predict: Callable[[list], Sequence], max_batch_size: int = 32, max_wait: float = 0.005,
+                 max_queue: int = 0, executor: Executor | None = None, delay_samples: int = 10_000):
+        self._predict = predict
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.max_queue = max_queue
+        self._executor = executor
+        self.rejected = 0
+        self._queue: asyncio.Queue[tuple[Any, asyncio.Future, float]] | None = None
+        self._task: asyncio.Task | None = None
+        self.batch_sizes: Counter[int] = Counter()
+        self._delays: deque[float] = deque(maxlen=delay_samples)
+
+    async def submit(self, item: Any) -> Any:
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((item, future, time.monotonic()))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            raise
+        return await future
+
+    async def _collect(self) -> list[tuple[Any, asyncio.Future, float]]:
+        batch = [await self._queue.get()]
+        deadline = batch[0][2] + self.max_wait
+        try:
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except TimeoutError:
+                    break
+        except asyncio.CancelledError:
+            for _, future, _ in batch:
+                future.cancel()
+            raise
+        # Забираем то, что уже лежит в очереди, без ожидания
+        while len(batch) < self.max_batch_size and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        return batch
+
+    async def _process(self, batch: list[tuple[Any, asyncio.Future, float]]) -> None:
+        started = time.monotonic()
+        # Клиент мог отключиться, пока запрос ждал в очереди
+        batch = [(item, future, queued_at) for item, future, queued_at in batch if not future.done()]
+        if not batch:
+            return
+        self.batch_sizes[len(batch)] += 1
+        self._delays.extend(started - queued_at for _, _, queued_at in batch)
+        loop = asyncio.get_running_loop()
+        try:
+            results = await loop.run_in_executor(self._executor, self._predict, [item for item, _, _ in batch])
+        except asyncio.CancelledError:
+            for _, future, _ in batch:
+                future.cancel()
+            raise
+        except Exception as e:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future, _), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    async def _run(self) -> None:
+        while True:
+            batch = await self._collect()
+            await self._process(batch)
+
+    def metrics(self) -> dict:
+        """
+        Распределение размеров пакетов и задержка в очереди (мс) по последним запросам.
+        """
+        delays = sorted(delay * 1000 for delay in self._delays)
+        if len(delays) >= 2:
+            q = statistics.quantiles(delays, n=100)
+            queue_delay = {"p50": round(q[49], 3), "p99": round(q[98], 3), "max": round(delays[-1], 3)}
+        else:
+            queue_delay = {"p50": None, "p99": None, "max": round(delays[-1], 3) if delays else None}
+        return {
+            "batches": sum(self.batch_sizes.values()),
+            "items": sum(size * count for size, count in self.batch_sizes.items()),
+            "batch_sizes": dict(sorted(self.batch_sizes.items())),
+            "queue_delay_ms": queue_delay,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "rejected": self.rejected,
+        }
+
+    def start(self) -> None:
+        if self._task is None:
+            self._queue = asyncio.Queue(self.max_queue)
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        # Запросы, не попавшие в пакет, не должны висеть вечно
+        while not self._queue.empty():
+            _, future, _ = self._queue.get_nowait()
+            future.cancel()
+        self._queue = None
+
+    def clear(self) -> None:
+        self.batch_sizes.clear()
+        self._delays.clear()
+        self.rejected = 0
@@ -0,0 +1,97 @@
+import hashlib
+import logging
+import time
+from collections import Counter
+
+from redis.asyncio import Redis
+
+from app.core.cache_backend import LRUCache
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_text(text: str) -> str:
+    """
+    Приводит текст к виду, от которого не зависит результат модели: регистр и повторные пробелы
+    токенизатор всё равно отбрасывает. Остальные пробельные символы не трогаем — \\xa0 не разделяет слова.
+    """
+    return " ".join(filter(None, text.lower().split(" ")))
+
+
+class SentimentCache:
+    """
+    Кеш вероятностей модели по sha256 нормализованного текста: LRU в памяти воркера перед Redis.
+
+    В ключ входит версия модели (хеши экспортированных весов и словаря), поэтому после замены модели
+    и повторного экспорта старые записи просто перестают находиться и истекают по TTL.
+    Ошибки Redis не пробрасываются: кеш на retry_after секунд переходит на один L1.
+    """
+
+    prefix = "sentiment"
+
+    def __init__(self, redis: Redis | None, l1: LRUCache, version: str, ttl: float, retry_after: float = 5):
+        self._redis = redis
+        self.l1 = l1
+        self.version = version
+        self.ttl = ttl
+        self.retry_after = retry_after
+        self.stats: Counter[str] = Counter()
+        self._down_until = 0.0
+
+    @property
+    def redis(self) -> Redis | None:
+        return self._redis if time.monotonic() >= self._down_until else None
+
+    def mark_down(self, error: Exception) -> None:
+        if self.redis is not None:
+            logger.warning(f"Redis недоступен, кеш тональности работает только в памяти: {error}")
+        self._down_until = time.monotonic() + self.retry_after
+
+    def key(self, text: str) -> str:
+        digest = hashlib.sha256(normalize_text(text).encode()).hexdigest()
+        return f"{self.prefix}:{self.version}:{digest}"
+
+    async def get_many(self, keys: list[str]) -> list[float | None]:
+        """
+        Вероятности по ключам, None для промахов. В Redis уходит один MGET на ключи, которых нет в L1.
+        """
+        values = [self.l1.get(key) for key in keys]
+        missing = [i for i, value in enumerate(values) if value is None]
+        self.stats["l1_hits"] += len(keys) - len(missing)
+        if missing and self.redis is not None:
+            try:
+                found = await self.redis.mget([keys[i] for i in missing])
+            except Exception as e:
+                self.mark_down(e)
+                found = [None] * len(missing)
+            for i, value in zip(missing, found):
+                if value is not None:
+                    values[i] = float(value)
+                    self.l1.set(keys[i], values[i], self.ttl)
+                    self.stats["l2_hits"] += 1
+        self.stats["misses"] += sum(value is None for value in values)
+        return values
+
+    async def set_many(self, items: dict[str, float]) -> None:
+        items = {key: float(value) for key, value in items.items()}
+        for key, value in items.items():
+            self.l1.set(key, value, self.ttl)
+        if not items or self.redis is None:
+            return
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for key, value in items.items():
+                    pipe.set(key, repr(value), ex=int(self.ttl))
+                await pipe.execute()
+        except Exception as e:
+            self.mark_down(e)
+
+    def metrics(self) -> dict:
+        total = sum(self.stats.values())
+        hits = self.stats["l1_hits"] + self.stats["l2_hits"]
+        return {**{name: self.stats[name] for name in ("l1_hits", "l2_hits", "misses")},
+                "hit_ratio": round(hits / total, 4) if total else None, "version": self.version}
+
+    def clear(self) -> None:
+        self.l1.clear()
+        self.stats.clear()
@@ -0,0 +1,294 @@
+import json
+from abc import ABC, abstractmethod
+from pathlib import Path
+
+import numpy as np
+
+MANIFEST = "manifest.json"
+
+
+def _sigmoid(x):
+    # Через tanh: то же значение, что 1 / (1 + exp(-x)), но без переполнения exp на больших отрицательных x
+    return 0.5 * (1.0 + np.tanh(0.5 * x))
+
+
+def _softmax(x):
+    e = np.exp(x - x.max(axis=-1, keepdims=True))
+    return e / e.sum(axis=-1, keepdims=True)
+
+
+ACTIVATIONS = {
+    "linear": lambda x: x,
+    "sigmoid": _sigmoid,
+    "hard_sigmoid": lambda x: np.clip((x + 3.0) / 6.0, 0.0, 1.0),
+    "tanh": np.tanh,
+    "relu": lambda x: np.maximum(x, 0.0),
+    "softmax": _softmax,
+}
+
+
+def pad_sequences(sequences: list[list[int]], maxlen: int) -> np.ndarray:
+    """
+    То же, что keras pad_sequences с настройками по умолчанию: нули и обрезка слева, int32.
+    """
+    x = np.zeros((len(sequences), maxlen), dtype=np.int32)
+    for i, seq in enumerate(sequences):
+        if len(seq):
+            tail = seq[-maxlen:]
+            x[i, maxlen - len(tail):] = tail
+    return x
+
+
+class Embedding:
+    def __init__(self, config: dict, weights: list[np.ndarray]):
+        self.embeddings, = weights
+        self.mask_zero = config.get("mask_zero", False)
+
+    def __call__(self, x, mask):
+        return self.embeddings[x], (x != 0) if self.mask_zero else mask
+
+
+class Masking:
+    def __init__(self, config: dict, weights: list[np.ndarray]):
+        self.mask_value = config.get("mask_value", 0.0)
+
+    def __call__(self, x, mask):
+        mask = np.any(x != self.mask_value, axis=-1)
+        return x * mask[..., None], mask
+
+
+class Dense:
+    def __init__(self, config: dict, weights: list[np.ndarray]):
+        self.kernel = weights[0]
+        self.bias = weights[1] if config.get("use_bias", True) else None
+        self.activation = ACTIVATIONS[config.get("activation", "linear")]
+
+    def __call__(self, x, mask):
+        y = x @ self.kernel
+        if self.bias is not None:
+            y = y + self.bias
+        return self.activation(y), mask
+
+
+class Activation:
+    def __init__(self, config: dict, weights: list[np.ndarray]):
+        self.activation = ACTIVATIONS[config["activation"]]
+
+    def __call__(self, x, mask):
+        return self.activation(x), mask
+
+
+class Identity:
+    """
+    Слои, которые при инференсе ничего не делают (Dropout, InputLayer и т.п.)
+    """
+
+    def __init__(self, config: dict, weights: list[np.ndarray]):
+        pass
+
+    def __call__(self, x, mask):
+        return x, mask
+
+
+class GlobalAveragePooling1D:
+    def __init__(self, config: dict, weights: list[np.ndarray]):
+        pass
+
+    def __call__(self, x, mask):
+        if mask is None:
+            return x.mean(axis=1), None
+        m = mask[..., None].astype(x.dtype)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return (x * m).sum(axis=1) / m.sum(axis=1), None
+
+
+class GlobalMaxPooling1D:
+    def __init__(self, config: dict, weights: list[np.ndarray]):
+        pass
+
+    def __call__(self, x, mask):
+        return x.max(axis=1), None
+
+
+class Flatten:
+    def __init__(self, config: dict, weights: list[np.ndarray]):
+        pass
+
+    def __call__(self, x, mask):
+        return x.reshape(len(x), -1), None
+
+
+class _Recurrent(ABC):
+    """
+    Общий проход рекуррентного слоя по времени. Входная проекция x @ kernel считается сразу для всех шагов,
+    в цикле остаётся только рекуррентная часть. Маска, как в Keras: на замаскированном шаге состояние
+    не меняется, а выход повторяет предыдущий (или нулевой при zero_output_for_mask).
+    """
+
+    n_states = 1
+
+    def __init__(self, config: dict, weights: list[np.ndarray]):
+        self.units = config["units"]
+        self.return_sequences = config.get("return_sequences", False)
+        self.go_backwards = config.get("go_backwards", False)
+        self.zero_output_for_mask = config.get("zero_output_for_mask", False)
+        self.activation = ACTIVATIONS[config.get("activation", "tanh")]
+        self.recurrent_activation = ACTIVATIONS[config.get("recurrent_activation", "sigmoid")]
+        self.kernel, self.recurrent_kernel = weights[0], weights[1]
+        self.bias = weights[2] if config.get("use_bias", True) else None
+
+    def project(self, x):
+        y = x @ self.kernel
+        return y + self.bias if self.bias is not None else y
+
+    @abstractmethod
+    def step(self, xt, states):
+        """
+        Один шаг по уже спроецированному входу xt: возвращает выход и новые состояния.
+        """
+
+    def __call__(self, x, mask):
+        n, steps = x.shape[:2]
+        projected = self.project(x)
+        states = [np.zeros((n, self.units), dtype=projected.dtype) for _ in range(self.n_states)]
+        output = np.zeros((n, self.units), dtype=projected.dtype)
+        outputs = []
+        for t in (range(steps - 1, -1, -1) if self.go_backwards else range(steps)):
+            out, new_states = self.step(projected[:, t], states)
+            if mask is not None:
+                m = mask[:, t, None]
+                new_states = [np.where(m, new, old) for new, old in zip(new_states, states)]
+                out = np.where(m, out, 0.0 if self.zero_output_for_mask else output)
+            states, output = new_states, out
+            if self.return_sequences:
+                outputs.append(out)
+        if self.return_sequences:
+            return np.stack(outputs, axis=1), mask
+        return output, None
+
+
+class SimpleRNN(_Recurrent):
+    def step(self, xt, states):
+        h = self.activation(xt + states[0] @ self.recurrent_kernel)
+        return h, [h]
+
+
+class LSTM(_Recurrent):
+    n_states = 2
+
+    def step(self, xt, states):
+        h, c = states
+        i, f, g, o = np.split(xt + h @ self.recurrent_kernel, 4, axis=-1)
+        c = self.recurrent_activation(f) * c + self.recurrent_activation(i) * self.activation(g)
+        h = self.recurrent_activation(o) * self.activation(c)
+        return h, [h, c]
+
+
+class GRU(_Recurrent):
+    def __init__(self, config: dict, weights: list[np.ndarray]):
+        super().__init__(config, weights)
+        self.reset_after = config.get("reset_after", True)
+        self.input_bias = self.recurrent_bias = None
+        if self.bias is not None and self.reset_after:
+            self.input_bias, self.recurrent_bias = self.bias[0], self.bias[1]
+        else:
+            self.input_bias = self.bias
+
+    def project(self, x):
+        y = x @ self.kernel
+        return y + self.input_bias if self.input_bias is not None else y
+
+    def step(self, xt, states):
+        h, = states
+        x_z, x_r, x_h = np.split(xt, 3, axis=-1)
+        if self.reset_after:
+            inner = h @ self.recurrent_kernel
+            if self.recurrent_bias is not None:
+                inner = inner + self.recurrent_bias
+            h_z, h_r, h_h = np.split(inner, 3, axis=-1)
+            z = self.recurrent_activation(x_z + h_z)
+            r = self.recurrent_activation(x_r + h_r)
+            candidate = self.activation(x_h + r * h_h)
+        else:
+            h_z, h_r = np.split(h @ self.recurrent_kernel[:, :2 * self.units], 2, axis=-1)
+            z = self.recurrent_activation(x_z + h_z)
+            r = self.recurrent_activation(x_r + h_r)
+            candidate = self.activation(x_h + (r * h) @ self.recurrent_kernel[:, 2 * self.units:])
+        h = z * h + (1.0 - z) * candidate
+        return h, [h]
+
+
+RECURRENT = {"SimpleRNN": SimpleRNN, "LSTM": LSTM, "GRU": GRU}
+
+
+class Bidirectional:
+    def __init__(self, config: dict, weights: list[np.ndarray]):
+        forward, backward = config["forward"], config["backward"]
+        split = len(weights) // 2
+        self.forward = RECURRENT[forward["class"]](forward["config"], weights[:split])
+        self.backward = RECURRENT[backward["class"]](backward["config"], weights[split:])
+        self.merge_mode = config.get("merge_mode", "concat")
+
+    def __call__(self, x, mask):
+        y, out_mask = self.forward(x, mask)
+        y_rev, _ = self.backward(x, mask)
+        if self.forward.return_sequences:
+            y_rev = y_rev[:, ::-1]
+        if self.merge_mode == "concat":
+            return np.concatenate([y, y_rev], axis=-1), out_mask
+        if self.merge_mode == "sum":
+            return y + y_rev, out_mask
+        if self.merge_mode == "mul":
+            return y * y_rev, out_mask
+        return (y + y_rev) / 2, out_mask
+
+
+LAYERS = {
+    "Embedding": Embedding,
+    "Masking": Masking,
+    "Dense": Dense,
+    "Activation": Activation,
+    "InputLayer": Identity,
+    "Dropout": Identity,
+    "SpatialDropout1D": Identity,
+    "GaussianNoise": Identity,
+    "GlobalAveragePooling1D": GlobalAveragePooling1D,
+    "GlobalMaxPooling1D": GlobalMaxPooling1D,
+    "Flatten": Flatten,
+    "Bidirectional": Bidirectional,
+    **RECURRENT,
+}
+
+
+class NumpyModel:
+    """
+    Прямой проход экспортированной Keras-модели на NumPy, без TensorFlow.
+
+    Веса читаются из .npy через mmap: страницы весов общие в page cache для всех воркеров на машине
+    и загружаются с диска по мере обращения, а не копируются в память каждого процесса при старте.
+    Экспорт — python -m app.ml.export.
+    """
+
+    def __init__(self, layers: list, manifest: dict):
+        self.layers = layers
+        self.manifest = manifest
+
+    @property
+    def version(self) -> str:
+        return self.manifest["source_sha256"]
+
+    @classmethod
+    def load(cls, path: str | Path) -> "NumpyModel":
+        path = Path(path)
+        manifest = json.loads((path / MANIFEST).read_text())
+        layers = []
+        for layer in manifest["layers"]:
+            weights = [np.load(path / name, mmap_mode="r") for name in layer["weights"]]
+            layers.append(LAYERS[layer["class"]](layer["config"], weights))
+        return cls(layers, manifest)
+
+    def predict(self, x: np.ndarray) -> np.ndarray:
+        mask = None
+        for layer in self.layers:
+            x, mask = layer(x, mask)
+        return np.asarray(x)
@@ -0,0 +1,146 @@
+"""
+Офлайн-экспорт модели тональности для рантайма без TensorFlow:
+- model: Keras-модель в формат NumpyModel — manifest.json со слоями и их настройками и по .npy-файлу на каждый
+  массив весов. TensorFlow нужен только здесь (pip install -r requirements-export.txt);
+- tokenizer: pickled keras Tokenizer в формат app.ml.tokenizer — отсортированный словарь в .npy и tokenizer.json.
+
+Запуск (после каждой замены model/sentiment_model.keras или model/tokenizer.pkl):
+    python -m app.ml.export model --model model/sentiment_model.keras --out model/sentiment_numpy
+    python -m app.ml.export tokenizer --tokenizer model/tokenizer.pkl --out model/sentiment_tokenizer
+"""
+import argparse
+import hashlib
+import json
+import pickle
+from collections import OrderedDict, defaultdict
+from pathlib import Path
+
+import numpy as np
+
+from app.ml import tokenizer as tokenizer_format
+from app.ml.engine import LAYERS, MANIFEST, RECURRENT
+
+FORMAT_VERSION = 1
+
+# Настройки слоёв, которые нужны прямому проходу; остальное (инициализаторы, регуляризаторы) не экспортируется
+LAYER_CONFIG = ("units", "activation", "recurrent_activation", "use_bias", "return_sequences", "go_backwards",
+                "reset_after", "mask_zero", "mask_value", "merge_mode")
+
+
+def file_sha256(path: str | Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def layer_config(layer) -> dict:
+    config = {key: value for key, value in layer.get_config().items() if key in LAYER_CONFIG}
+    if hasattr(layer, "zero_output_for_mask"):
+        config["zero_output_for_mask"] = bool(layer.zero_output_for_mask)
+    return config
+
+
+def export_layer(layer) -> tuple[dict, list[np.ndarray]]:
+    name = type(layer).__name__
+    if name not in LAYERS:
+        raise ValueError(f"Слой {layer.name} ({name}) не поддерживается NumpyModel")
+    config = layer_config(layer)
+    weights = [np.asarray(w, dtype=np.float32) for w in layer.get_weights()]
+    if name == "Bidirectional":
+        for direction, sublayer in (("forward", layer.forward_layer), ("backward", layer.backward_layer)):
+            if type(sublayer).__name__ not in RECURRENT:
+                raise ValueError(f"Слой {sublayer.name} ({type(sublayer).__name__}) не поддерживается NumpyModel")
+            config[direction] = {"class": type(sublayer).__name__, "config": layer_config(sublayer)}
+        weights = [np.asarray(w, dtype=np.float32)
+                   for sublayer in (layer.forward_layer, layer.backward_layer) for w in sublayer.get_weights()]
+    return {"class": name, "name": layer.name, "config": config}, weights
+
+
+def export(model_path: str | Path, out: str | Path) -> dict:
+    from tensorflow.keras.models import load_model
+
+    model = load_model(model_path)
+    out = Path(out)
+    out.mkdir(parents=True, exist_ok=True)
+    (out / MANIFEST).unlink(missing_ok=True)
+    layers = []
+    for i, layer in enumerate(model.layers):
+        spec, weights = export_layer(layer)
+        spec["weights"] = []
+        for j, w in enumerate(weights):
+            filename = f"{i:02d}_{layer.name}_{j}.npy"
+            np.save(out / filename, w)
+            spec["weights"].append(filename)
+        layers.append(spec)
+    manifest = {"format": FORMAT_VERSION, "source": Path(model_path).name, "source_sha256": file_sha256(model_path),
+                "layers": layers}
+    # Манифест пишется последним: пока его нет, каталог не считается готовой моделью
+    (out / MANIFEST).write_text(json.dumps(manifest, ensure_ascii=False, indent=2))
+    return manifest
+
+
+class TokenizerState:
+    """
+    Состояние keras Tokenizer из pickle без импорта keras: нужен только __dict__
+    """
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+
+
+class TokenizerUnpickler(pickle.Unpickler):
+    # Разрешены только класс токенизатора и контейнеры его словарей
+    allowed = {("collections", "OrderedDict"): OrderedDict, ("collections", "defaultdict"): defaultdict,
+               ("builtins", "int"): int, ("builtins", "list"): list}
+
+    def find_class(self, module: str, name: str):
+        if name == "Tokenizer" and module.startswith(("keras", "tensorflow")):
+            return TokenizerState
+        if (module, name) in self.allowed:
+            return self.allowed[(module, name)]
+        raise pickle.UnpicklingError(f"{module}.{name} не ожидается в pickle токенизатора")
+
+
+def write_tokenizer(state: dict, out: str | Path, source_sha256: str) -> dict:
+    """
+    Пишет словарь токенизатора: только слова, которые texts_to_sequences может вернуть, по возрастанию.
+    """
+    if state.get("char_level") or state.get("analyzer") is not None or len(state["split"]) != 1:
+        raise ValueError("Экспортируется только токенизатор по словам с односимвольным split и без своего analyzer")
+    num_words = state.get("num_words")
+    word_index = state["word_index"]
+    oov_token = state.get("oov_token")
+    oov_index = word_index.get(oov_token) if oov_token is not None else None
+    words = sorted(word for word, index in word_index.items() if not num_words or index < num_words)
+    out = Path(out)
+    out.mkdir(parents=True, exist_ok=True)
+    (out / tokenizer_format.CONFIG).unlink(missing_ok=True)
+    np.save(out / tokenizer_format.VOCAB, np.array(words, dtype=str))
+    np.save(out / tokenizer_format.IDS, np.array([word_index[word] for word in words], dtype=np.int32))
+    config = {"filters": state["filters"], "split": state["split"], "lower": state["lower"],
+              "num_words": num_words, "oov_index": oov_index, "source_sha256": source_sha256}
+    (out / tokenizer_format.CONFIG).write_text(json.dumps(config, ensure_ascii=False, indent=2))
+    return config
+
+
+def export_tokenizer(pickle_path: str | Path, out: str | Path) -> dict:
+    with open(pickle_path, "rb") as f:
+        state = TokenizerUnpickler(f).load().__dict__
+    return write_tokenizer(state, out, file_sha256(pickle_path))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("what", choices=("model", "tokenizer"))
+    parser.add_argument("--model", default="model/sentiment_model.keras")
+    parser.add_argument("--tokenizer", default="model/tokenizer.pkl")
+    parser.add_argument("--out")
+    args = parser.parse_args()
+    if args.what == "model":
+        manifest = export(args.model, args.out or "model/sentiment_numpy")
+        print(f"exported {len(manifest['layers'])} layers, sha256 {manifest['source_sha256'][:12]}")
+    else:
+        config = export_tokenizer(args.tokenizer, args.out or "model/sentiment_tokenizer")
+        print(f"exported tokenizer, num_words {config['num_words']}, sha256 {config['source_sha256'][:12]}")
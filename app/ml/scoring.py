@@ -0,0 +1,131 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable
+
+import numpy as np
+from sqlalchemy import Float, Integer, column, func, select, update, values
+
+from app.core.database import async_session_maker
+from app.models.comments import Comment as CommentModel
+from app.models.posts import Post as PostModel
+
+logger = logging.getLogger(__name__)
+
+POSITIVE_THRESHOLD = 0.5
+
+
+def store_scores(scores: dict[int, float]):
+    """
+    Один UPDATE с CTE: записывает оценки ещё не оценённым комментариям и добавляет их в сводку статей.
+    Комментарий, удалённый или уже оценённый к этому моменту, в сводку не попадает.
+    """
+    data = (values(column("id", Integer), column("score", Float), name="scores")
+            .data([(comment_id, float(score)) for comment_id, score in scores.items()]))
+    scored = (update(CommentModel)
+              .where(CommentModel.id == data.c.id, CommentModel.sentiment_score.is_(None))
+              .values(sentiment_score=data.c.score)
+              .returning(CommentModel.post_id, CommentModel.sentiment_score)
+              .cte("scored"))
+    totals = (select(scored.c.post_id, func.count().label("scored"),
+                     func.count().filter(scored.c.sentiment_score >= POSITIVE_THRESHOLD).label("positive"),
+                     func.sum(scored.c.sentiment_score).label("total"))
+              .group_by(scored.c.post_id)
+              .subquery("totals"))
+    return (update(PostModel).where(PostModel.id == totals.c.post_id)
+            .values(sentiment_scored=PostModel.sentiment_scored + totals.c.scored,
+                    sentiment_positive=PostModel.sentiment_positive + totals.c.positive,
+                    sentiment_sum=PostModel.sentiment_sum + totals.c.total,
+                    updated_at=PostModel.updated_at)
+            .add_cte(scored))
+
+
+class CommentScorer:
+    """
+    Оценивает тональность новых комментариев в фоне, после commit их создания.
+
+    Комментарии копятся в памяти воркера и раз в interval секунд оцениваются одним пакетом
+    и записываются одним UPDATE. Если воркер упадёт раньше, комментарии останутся без оценки
+    до офлайн-дозаполнения (python -m app.ml.backfill). Очередь не больше max_pending:
+    пока модель не справляется, лишние комментарии тоже оставляются дозаполнению.
+    """
+
+    def __init__(self, score: Callable[[list[str]], Awaitable[np.ndarray]], enabled: bool = True,
+                 interval: float = 1.0, max_pending: int = 10_000):
+        self._score = score
+        self.enabled = enabled
+        self.interval = interval
+        self.max_pending = max_pending
+        self._pending: dict[int, str] = {}
+        self._dropped = 0
+        self._task: asyncio.Task | None = None
+
+    def enqueue(self, comment_id: int, text: str) -> None:
+        # Без загруженной модели оценивать нечем: комментарий дождётся дозаполнения
+        if self.enabled:
+            self._pending[comment_id] = text
+            self._trim()
+
+    def _trim(self) -> None:
+        """
+        Отбрасывает самые новые комментарии сверх max_pending и пишет в лог о начале переполнения.
+        """
+        excess = len(self._pending) - self.max_pending
+        if excess <= 0:
+            return
+        if not self._dropped:
+            logger.warning(f"Очередь оценки тональности переполнена ({self.max_pending}): "
+                           f"новые комментарии остаются дозаполнению (python -m app.ml.backfill)")
+        for comment_id in list(self._pending)[-excess:]:
+            del self._pending[comment_id]
+        self._dropped += excess
+
+    def clear(self) -> None:
+        self._pending.clear()
+        self._dropped = 0
+
+    async def flush(self) -> int:
+        """
+        Оценивает накопленные комментарии и пишет оценки в БД. Возвращает число комментариев.
+        """
+        if not self._pending:
+            return 0
+        batch, self._pending = self._pending, {}
+        try:
+            scores = await self._score(list(batch.values()))
+            async with async_session_maker() as session:
+                await session.execute(store_scores(dict(zip(batch, scores))))
+                await session.commit()
+        except BaseException:
+            # Не теряем комментарии: вернём их в очередь до следующей попытки
+            self._pending = batch | self._pending
+            self._trim()
+            raise
+        if self._dropped:
+            logger.warning(f"Оценка тональности догнала очередь, без оценки до дозаполнения: {self._dropped}")
+            self._dropped = 0
+        return len(batch)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.warning(f"Не удалось оценить тональность комментариев: {e}")
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error(f"Тональность комментариев не оценена при остановке: {e}")
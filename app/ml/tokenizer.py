@@ -0,0 +1,99 @@
+import json
+import re
+from itertools import repeat
+from pathlib import Path
+
+import numpy as np
+
+CONFIG = "tokenizer.json"
+VOCAB = "vocab.npy"
+IDS = "ids.npy"
+
+MISSING_ID = -1
+SEPARATOR_ID = -2
+
+
+class Tokenizer:
+    """
+    Замена pickled keras Tokenizer: тот же результат, что texts_to_sequences, без unpickle.
+
+    Словарь хранится отсортированным массивом строк (vocab.npy) с индексами слов (ids.npy). В него попадают
+    только слова, которые texts_to_sequences может вернуть (индекс меньше num_words), поэтому индекс для поиска
+    собирается из массивов при загрузке за миллисекунды. Пакет текстов обрабатывается целиком:
+    один lower и одно регулярное выражение на все тексты и один проход поиска по всем словам.
+    Экспорт — python -m app.ml.export tokenizer.
+    """
+
+    # Разделитель текстов в склеенном пакете: несимвол Unicode, в нормальном тексте его не бывает
+    separator = "\uffff"
+
+    def __init__(self, vocab: np.ndarray, ids: np.ndarray, config: dict):
+        self.config = config
+        self.lower = config["lower"]
+        self.split = config["split"]
+        self.oov_index = config["oov_index"]
+        # keras заменяет символы filters на split и режет по split: слова — максимальные отрезки из прочих символов
+        self._word = re.compile(f"[^{re.escape(config['filters'] + self.split)}]+")
+        self._index = dict(zip(vocab.tolist(), ids.tolist()))
+        self._index[self.separator] = SEPARATOR_ID
+
+    @property
+    def version(self) -> str:
+        return self.config["source_sha256"]
+
+    @classmethod
+    def load(cls, path: str | Path) -> "Tokenizer":
+        path = Path(path)
+        config = json.loads((path / CONFIG).read_text())
+        return cls(np.load(path / VOCAB, mmap_mode="r"), np.load(path / IDS, mmap_mode="r"), config)
+
+    def words(self, text: str) -> list[str]:
+        """
+        Разбиение на слова, как keras text_to_word_sequence
+        """
+        if self.lower:
+            text = text.lower()
+        return self._word.findall(text)
+
+    def lookup(self, texts: list[str]) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Индексы слов всех текстов подряд и число индексов в каждом тексте
+        """
+        if not texts:
+            return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int64)
+        if any(self.separator in text for text in texts):
+            words = [word for text in texts for word in (*self.words(text), self.separator)]
+        else:
+            # lower и разбиение посимвольные, так что на склеенном пакете они дают то же, что на каждом тексте
+            words = self.words(f"{self.split}{self.separator}{self.split}".join(texts) + self.split + self.separator)
+        ids = np.fromiter(map(self._index.get, words, repeat(MISSING_ID)), dtype=np.int32, count=len(words))
+
+        ends = np.flatnonzero(ids == SEPARATOR_ID)
+        known = ids >= 0
+        if self.oov_index is not None:
+            ids[ids == MISSING_ID] = self.oov_index
+            known = ids != SEPARATOR_ID
+        # Число индексов до каждого разделителя включительно
+        counts = np.cumsum(known)[ends]
+        lengths = np.diff(counts, prepend=0)
+        return ids[known], lengths
+
+    def texts_to_sequences(self, texts: list[str]) -> list[list[int]]:
+        ids, lengths = self.lookup(texts)
+        offsets = np.cumsum(lengths)
+        return [ids[end - length:end].tolist() for end, length in zip(offsets.tolist(), lengths.tolist())]
+
+    def encode(self, texts: list[str], maxlen: int) -> np.ndarray:
+        """
+        texts_to_sequences + pad_sequences(maxlen) сразу в матрицу: нули и обрезка слева, как в keras по умолчанию
+        """
+        ids, lengths = self.lookup(texts)
+        x = np.zeros((len(texts), maxlen), dtype=np.int32)
+        if not len(ids):
+            return x
+        owner = np.repeat(np.arange(len(texts)), lengths)
+        # Позиция индекса от конца своего текста: 1 у последнего слова
+        from_end = np.repeat(np.cumsum(lengths), lengths) - np.arange(len(ids))
+        keep = from_end <= maxlen
+        x[owner[keep], maxlen - from_end[keep]] = ids[keep]
+        return x
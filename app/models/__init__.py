@@ -2,5 +2,6 @@ from .users import User
 from .tags import Tag, post_tags
 from .posts import Post
 from .comments import Comment
+from .stats import StatsCounter
 
-__all__ = ["User", "Tag", "post_tags", "Post", "Comment"]
+__all__ = ["User", "Tag", "post_tags", "Post", "Comment", "StatsCounter"]
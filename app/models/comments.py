@@ -1,12 +1,27 @@
 from datetime import datetime
 from typing import Optional
-from sqlalchemy import DateTime, ForeignKey, Integer, Text, func
+from sqlalchemy import DateTime, Float, ForeignKey, Index, Integer, Text, func, text
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.core.database import Base
 
+# Сегмент пути — id фиксированной ширины, чтобы побайтовая сортировка путей давала обход дерева
+PATH_SEGMENT_WIDTH = 10
+PATH_SEPARATOR = "."
+
 
 class Comment(Base):
+    __table_args__ = (
+        Index("ix_comments_post_id_created_at_id", "post_id", "created_at", "id"),
+        # первые комментарии верхнего уровня в детальной статье
+        Index("ix_comments_top_level_depth", "post_id", "created_at", "id", postgresql_where=text("depth = 0")),
+        # ветка обсуждения — один диапазон по (post_id, path)
+        Index("ix_comments_post_id_path", "post_id", "path"),
+        # комментарии без пути, пока не закончилось заполнение
+        Index("ix_comments_path_missing", "post_id", postgresql_where=text("path IS NULL")),
+        # ещё не оценённые моделью тональности — для офлайн-дозаполнения
+        Index("ix_comments_sentiment_missing", "id", postgresql_where=text("sentiment_score IS NULL")),
+    )
     
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     post_id: Mapped[int] = mapped_column(ForeignKey("posts.id", ondelete="CASCADE"), nullable=False, index = True)
@@ -14,6 +29,11 @@ class Comment(Base):
     text: Mapped[str] = mapped_column(Text, nullable = False)
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     parent_id: Mapped[int | None] = mapped_column(ForeignKey("comments.id", ondelete="SET NULL"), nullable = True)    
+    # Заполняются при вставке; после удаления родителя ответы сохраняют его сегмент и остаются на месте в ветке
+    path: Mapped[str | None] = mapped_column(Text(collation="C"), nullable=True)
+    depth: Mapped[int] = mapped_column(Integer, default=0, nullable=False, server_default="0")
+    # Вероятность позитивного тона; считается в фоне после создания комментария
+    sentiment_score: Mapped[float | None] = mapped_column(Float, nullable=True)
     post: Mapped["Post"] = relationship("Post", back_populates="comments")
     author: Mapped["User"] = relationship("User", back_populates="comments")
     parent: Mapped[Optional["Comment"]] = relationship("Comment", back_populates="replies", remote_side="Comment.id")
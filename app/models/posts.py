@@ -1,12 +1,33 @@
+import math
 from datetime import datetime 
-from sqlalchemy import Boolean, Integer, String, func, DateTime, Text, ForeignKey
-from sqlalchemy.orm import Mapped, mapped_column, relationship
+from sqlalchemy import (Boolean, Integer, String, Float, func, DateTime, Text, ForeignKey, Index, Computed, DDL, event,
+                        text)
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.orm import Mapped, mapped_column, relationship, validates
 
 from app.core.database import Base
 from app.models.tags import post_tags
 
+PREVIEW_LENGTH = 200
+WORDS_PER_MINUTE = 200
+# Конфигурация полнотекстового поиска: русский стемминг, латиница идёт через english_stem
+SEARCH_CONFIG = "russian"
+SEARCH_VECTOR = (f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(title, '')), 'A') || "
+                 f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(content, '')), 'B')")
+
 
 class Post(Base):
+    __table_args__ = (
+        # keyset-пагинация списков: (created_at, id) внутри статуса и автора
+        Index("ix_posts_status_created_at_id", "status", "created_at", "id"),
+        Index("ix_posts_author_id_created_at_id", "author_id", "created_at", "id"),
+        # префиксный поиск slug LIKE 'base-%' при подборе уникального slug
+        Index("ix_posts_slug_pattern", "slug", postgresql_ops={"slug": "varchar_pattern_ops"}),
+        Index("ix_posts_search_vector", "search_vector", postgresql_using="gin"),
+        # подсказки по заголовкам: префикс (ILIKE) и word_similarity среди опубликованных
+        Index("ix_posts_title_trgm", "title", postgresql_using="gin", postgresql_ops={"title": "gin_trgm_ops"},
+              postgresql_where=text("status = 'published'")),
+    )
     
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     title: Mapped[str] = mapped_column(String(100), nullable=False)
@@ -16,10 +37,34 @@ class Post(Base):
     updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
     status: Mapped[str] = mapped_column(String, default="draft", nullable=False) 
     view_count: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    # Считаются при записи content, чтобы списки не читали весь текст
+    preview: Mapped[str] = mapped_column(String(PREVIEW_LENGTH), nullable=False, server_default="")
+    word_count: Mapped[int] = mapped_column(Integer, nullable=False, server_default="0")
+    reading_time: Mapped[int] = mapped_column(Integer, nullable=False, server_default="1")
+    # Меняется в той же транзакции, что и вставка/удаление комментария
+    comment_count: Mapped[int] = mapped_column(Integer, default=0, nullable=False, server_default="0")
+    # Сводка тональности оценённых комментариев: пополняется при оценке, уменьшается при удалении комментария
+    sentiment_scored: Mapped[int] = mapped_column(Integer, default=0, nullable=False, server_default="0")
+    sentiment_positive: Mapped[int] = mapped_column(Integer, default=0, nullable=False, server_default="0")
+    sentiment_sum: Mapped[float] = mapped_column(Float, default=0, nullable=False, server_default="0")
+    # Заголовок весит больше текста; колонку считает сама БД, в ORM-загрузки она не попадает
+    search_vector: Mapped[str] = mapped_column(TSVECTOR, Computed(SEARCH_VECTOR, persisted=True), deferred=True)
     
     author_id: Mapped[int] = mapped_column(ForeignKey('users.id', ondelete="CASCADE"), nullable=False, index = True)
     
     author: Mapped["User"] = relationship("User", back_populates="posts")
     comments: Mapped[list["Comment"]] = relationship("Comment", back_populates="post", cascade="all, delete-orphan")
     
-    tags: Mapped[list["Tag"]] = relationship("Tag", back_populates="posts", secondary=post_tags)
\ No newline at end of file
+    tags: Mapped[list["Tag"]] = relationship("Tag", back_populates="posts", secondary=post_tags)
+
+    @validates("content")
+    def fill_content_summary(self, key: str, content: str) -> str:
+        words = len(content.split())
+        self.preview = content[:PREVIEW_LENGTH]
+        self.word_count = words
+        self.reading_time = max(1, math.ceil(words / WORDS_PER_MINUTE))
+        return content
+
+
+# gin_trgm_ops нужен до создания индекса подсказок
+event.listen(Post.__table__, "before_create", DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
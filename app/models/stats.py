@@ -0,0 +1,16 @@
+from sqlalchemy import BigInteger, Integer, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.core.database import Base
+
+
+class StatsCounter(Base):
+    """
+    Шардированный счётчик для /api/stats: запись увеличивает случайный шард,
+    чтобы параллельные транзакции не выстраивались в очередь на одной строке; чтение суммирует шарды.
+    """
+    __tablename__ = "stats_counters"
+
+    name: Mapped[str] = mapped_column(String(50), primary_key=True)
+    shard: Mapped[int] = mapped_column(Integer, primary_key=True)
+    value: Mapped[int] = mapped_column(BigInteger, default=0, nullable=False, server_default="0")
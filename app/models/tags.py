@@ -1,4 +1,4 @@
-from sqlalchemy import Column, ForeignKey, Integer, String, Table
+from sqlalchemy import Column, ForeignKey, Index, Integer, String, Table
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.core.database import Base
@@ -9,10 +9,16 @@ post_tags = Table("post_tags", Base.metadata,
 )
 
 class Tag(Base):
+    __table_args__ = (
+        # облако тегов и популярные теги читаются по индексу, без группировки post_tags
+        Index("ix_tags_published_count", "published_count"),
+    )
     
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     name: Mapped[str] = mapped_column(String(50), unique=True, nullable=False)
     slug: Mapped[str] = mapped_column(String(60), unique=True, nullable=False)
+    # Число опубликованных статей с тегом, меняется в транзакциях записи статей
+    published_count: Mapped[int] = mapped_column(Integer, default=0, nullable=False, server_default="0")
     
     posts: Mapped[list["Post"]] = relationship("Post", secondary=post_tags, back_populates="tags")
     
\ No newline at end of file
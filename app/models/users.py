@@ -1,10 +1,13 @@
 from datetime import datetime 
-from sqlalchemy import Boolean, Integer, String, func, DateTime
+from sqlalchemy import Boolean, Integer, String, func, DateTime, Index
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.core.database import Base
 
 class User(Base):
+    __table_args__ = (
+        Index("ix_users_date_joined_id", "date_joined", "id"),
+    )
     
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     username: Mapped[str] = mapped_column(String, unique=True, nullable=False)
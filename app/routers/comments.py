@@ -1,37 +1,57 @@
+import asyncio
 import html
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from functools import partial
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Header, Request
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from sqlalchemy.orm import selectinload
+from sqlalchemy import (select, insert, update, delete, exists, literal, literal_column, cast, func, case, and_,
+                        or_, true, String, Integer, Text)
+from sqlalchemy.orm import selectinload, aliased
 
 from app.models.users import User as UserModel
 from app.models.posts import Post as PostModel
-from app.models.comments import Comment as CommentModel
+from app.models.comments import Comment as CommentModel, PATH_SEGMENT_WIDTH, PATH_SEPARATOR
+from app.core.database import async_session_maker
 from app.core.db_depends import get_session_db
-from app.schemas import CommentCreate, Comment
+from app.core.config import settings
+from app.core.events import comment_broker, Subscription
+from app.core.responses import ClosingStreamingResponse
+from app.core.stats import bump_counter, COMMENTS
+from app.core.trending import trending, COMMENT_WEIGHT
+from app.ml.scoring import POSITIVE_THRESHOLD
+from app.routers.sentiment import comment_scorer
+from app.schemas import CommentCreate, Comment, CursorPage, ThreadComment
+from app.core.pagination import keyset_query, keyset_page
 from app.auth import get_current_user
 
 router = APIRouter(prefix="/api", tags=["comments"])
 
 
-@router.get("/posts/{slug}/comments", response_model=list[Comment])
+@router.get("/posts/{slug}/comments", response_model=list[Comment] | CursorPage[Comment])
 async def get_comments_by_slug(
     slug: str,  
     page: int = Query(1, ge=1),
     page_size: int = Query(10, ge=1, le=100),
+    cursor: str | None = Query(None, description="Курсор страницы (пустой — первая страница)"),
     db: AsyncSession = Depends(get_session_db)
     ):
     """
-    Возвращает комментарии к статье по её slug
+    Возвращает комментарии к статье по её slug в порядке создания.
+    С параметром cursor включается keyset-пагинация по (created_at, id).
     """
     post = await db.scalar(select(PostModel).where(PostModel.slug == slug, PostModel.status == "published"))
     
     if post is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Пост не найден")
 
+    stmt = select(CommentModel).options(selectinload(CommentModel.author)).where(CommentModel.post_id == post.id)
+    if cursor is not None:
+        stmt = keyset_query(stmt, CommentModel.created_at, CommentModel.id, cursor, page_size, descending=False)
+        comments = (await db.scalars(stmt)).all()
+        items, next_cursor, prev_cursor = keyset_page(comments, cursor, page_size)
+        return CursorPage[Comment](items=items, next_cursor=next_cursor, prev_cursor=prev_cursor)
+
     comments = await db.scalars(
-        select(CommentModel).options(selectinload(CommentModel.author))
-        .where(CommentModel.post_id == post.id)
+        stmt.order_by(CommentModel.created_at, CommentModel.id)
         .offset((page - 1) * page_size)
         .limit(page_size)
         )
@@ -39,46 +59,224 @@ async def get_comments_by_slug(
     return comments.all()
 
 
-@router.post("/posts/{slug}/comments", status_code=status.HTTP_201_CREATED)
-async def create_comment(
+STREAM_RESUME_LIMIT = 100
+STREAM_RETRY_MS = 3000
+
+
+def _sse(event_id: int, data: str) -> str:
+    return f"id: {event_id}\nevent: comment\ndata: {data}\n\n"
+
+
+async def _missed_comments(post_id: int, last_id: int):
+    """
+    Комментарии статьи после last_id страницами по STREAM_RESUME_LIMIT, пока не кончатся.
+    На каждую страницу — своя короткая сессия: поток не держит соединение пула между страницами.
+    """
+    while True:
+        async with async_session_maker() as db:
+            missed = await db.scalars(
+                select(CommentModel).options(selectinload(CommentModel.author))
+                .where(CommentModel.post_id == post_id, CommentModel.id > last_id)
+                .order_by(CommentModel.id)
+                .limit(STREAM_RESUME_LIMIT)
+            )
+            page = [(comment.id, Comment.model_validate(comment).model_dump_json()) for comment in missed]
+        for event_id, data in page:
+            yield event_id, data
+        if len(page) < STREAM_RESUME_LIMIT:
+            return
+        last_id = page[-1][0]
+
+
+async def _comment_events(request: Request, subscription: Subscription, last_id: int | None):
+    yield f"retry: {STREAM_RETRY_MS}\n\n"
+    # Подписка уже открыта: всё, что закоммитится во время чтения пропущенных, придёт и живым событием
+    sent = set()
+    if last_id is not None:
+        async for event_id, data in _missed_comments(subscription.post_id, last_id):
+            sent.add(event_id)
+            yield _sse(event_id, data)
+    # Переполненную очередь не догоняем: клиент переподключится с Last-Event-ID и доберёт из БД
+    while not subscription.overflowed:
+        try:
+            event_id, data = await asyncio.wait_for(subscription.queue.get(), settings.COMMENTS_STREAM_HEARTBEAT)
+        except asyncio.TimeoutError:
+            if await request.is_disconnected():
+                break
+            yield ": ping\n\n"
+            continue
+        # Отсекаем только уже отданные из БД: события публикуются после коммита и могут прийти не по порядку id
+        if event_id in sent:
+            continue
+        yield _sse(event_id, data)
+
+
+@router.get("/posts/{slug}/comments/stream")
+async def stream_comments(
     slug: str,
-    comment: CommentCreate,
-    current_user: UserModel = Depends(get_current_user),
+    request: Request,
+    last_event_id: int | None = Header(None, description="id последнего полученного комментария"),
+    # Сессия закрывается до начала потока: иначе каждый подписчик держал бы соединение пула до отключения
+    db: AsyncSession = Depends(get_session_db, scope="function")
+    ):
+    """
+    Поток новых комментариев статьи (Server-Sent Events) вместо периодического опроса.
+    С заголовком Last-Event-ID сначала отдаются все комментарии, пропущенные с момента обрыва.
+    """
+    post = await db.scalar(select(PostModel).where(PostModel.slug == slug, PostModel.status == "published"))
+
+    if post is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Пост не найден")
+
+    # Подписываемся до чтения пропущенных, чтобы не потерять комментарии между ними.
+    # Отписывает ответ: генератор потока мог так и не запуститься
+    subscription = comment_broker.subscribe(post.id)
+    return ClosingStreamingResponse(_comment_events(request, subscription, last_event_id),
+                                    on_close=partial(comment_broker.unsubscribe, subscription),
+                                    media_type="text/event-stream",
+                                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+def _path_segment(column):
+    return func.lpad(cast(column, String), PATH_SEGMENT_WIDTH, "0")
+
+
+def _thread_by_path(post_id: int, root: CommentModel | None, max_depth: int, limit: int):
+    """
+    Ветка по материализованному пути: один диапазон по индексу (post_id, path).
+    """
+    base_depth = root.depth if root is not None else 0
+    stmt = (select(CommentModel, (CommentModel.depth - base_depth).label("depth"))
+            .where(CommentModel.post_id == post_id, CommentModel.depth <= base_depth + max_depth))
+    if root is not None:
+        # потомки root — ровно пути в [root.path, root.path + "/"): "/" идёт сразу за разделителем "."
+        stmt = stmt.where(CommentModel.path >= root.path, CommentModel.path < root.path + "/")
+    return stmt.order_by(CommentModel.path).limit(limit)
+
+
+def _thread_by_cte(post_id: int, root: CommentModel | None, max_depth: int, limit: int):
+    """
+    Та же ветка рекурсивным CTE по parent_id — для комментариев, у которых ещё нет path.
+    """
+    anchor = select(CommentModel.id, _path_segment(CommentModel.id).label("path"), literal_column("0").label("depth"))
+    if root is not None:
+        anchor = anchor.where(CommentModel.id == root.id)
+    else:
+        anchor = anchor.where(CommentModel.post_id == post_id, CommentModel.parent_id.is_(None))
+    thread = anchor.cte("thread", recursive=True)
+    child = aliased(CommentModel)
+    thread = thread.union_all(
+        select(child.id, thread.c.path + PATH_SEPARATOR + _path_segment(child.id), thread.c.depth + 1)
+        .join(thread, child.parent_id == thread.c.id)
+        .where(thread.c.depth < max_depth)
+    )
+    return (select(CommentModel, thread.c.depth)
+            .join(thread, thread.c.id == CommentModel.id)
+            .order_by(thread.c.path.collate("C"))
+            .limit(limit))
+
+
+@router.get("/posts/{slug}/comments/thread", response_model=list[ThreadComment])
+async def get_comment_thread(
+    slug: str,
+    root_id: int | None = Query(None, description="ID корня ветки (без него — все ветки статьи)"),
+    max_depth: int = Query(10, ge=0, le=100, description="Максимальная глубина относительно корня"),
+    limit: int = Query(500, ge=1, le=1000),
     db: AsyncSession = Depends(get_session_db)
-):
+    ):
     """
-    Добавляет комментарий (только для авторизованных пользователей)
+    Возвращает ветку обсуждения (или все ветки статьи) плоским списком в порядке обхода дерева.
     """
     post = await db.scalar(select(PostModel).where(PostModel.slug == slug, PostModel.status == "published"))
-    
+
     if post is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Пост не найден")
 
-    if comment.parent_id is not None:
-        parent = await db.scalar(
-            select(CommentModel).where(
-                CommentModel.id == comment.parent_id,
-                CommentModel.post_id == post.id
-            )
-        )
-        if parent is None:
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Родительский комментарий не найден")
-        
+    root = None
+    if root_id is not None:
+        root = await db.scalar(select(CommentModel).where(CommentModel.id == root_id, CommentModel.post_id == post.id))
+        if root is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Комментарий не найден")
+
+    # Пока у части комментариев статьи нет path, дерево строится по parent_id
+    unpathed = await db.scalar(select(exists().where(CommentModel.post_id == post.id, CommentModel.path.is_(None))))
+    build = _thread_by_cte if unpathed else _thread_by_path
+    rows = (await db.execute(build(post.id, root, max_depth, limit)
+                             .options(selectinload(CommentModel.author)))).all()
+
+    return [ThreadComment(id=comment.id, post_id=comment.post_id, author=comment.author, text=comment.text,
+                          created_at=comment.created_at, parent_id=comment.parent_id, depth=depth)
+            for comment, depth in rows]
+
+
+@router.post("/posts/{slug}/comments", status_code=status.HTTP_201_CREATED, response_model=Comment)
+async def create_comment(
+    slug: str,
+    comment: CommentCreate,
+    current_user: UserModel = Depends(get_current_user),
+    db: AsyncSession = Depends(get_session_db)
+):
+    """
+    Добавляет комментарий (только для авторизованных пользователей).
+    Проверки статьи и родителя, вставка и обновление счётчиков — один INSERT ... SELECT ... RETURNING.
+    """
     safe_text = html.escape(comment.text)
 
-    db_comment = CommentModel(
-        post_id=post.id,
-        author_id=current_user.id,
-        text=safe_text,
-        parent_id=comment.parent_id
-    )
-    
-    db.add(db_comment)
+    parent = aliased(CommentModel)
+    target = (select(PostModel.id.label("post_id"), parent.id.label("parent_id"),
+                     parent.path.label("parent_path"), parent.depth.label("parent_depth"))
+              .outerjoin(parent, and_(parent.id == comment.parent_id, parent.post_id == PostModel.id))
+              .where(PostModel.slug == slug, PostModel.status == "published")
+              # Строка статьи блокируется до nextval: id комментариев статьи идут в порядке коммитов,
+              # и поток может продолжать с Last-Event-ID по id
+              .with_for_update(of=PostModel)
+              .cte("target"))
+    parent_found = true() if comment.parent_id is None else target.c.parent_id.is_not(None)
+
+    # id берём из последовательности заранее: из него строится path
+    new = (select(func.nextval(func.pg_get_serial_sequence("comments", "id")).label("id"), target.c.post_id,
+                  target.c.parent_id, target.c.parent_path, target.c.parent_depth)
+           .where(parent_found)
+           .cte("new"))
+    segment = _path_segment(new.c.id)
+    inserted = (insert(CommentModel)
+                .from_select(["id", "post_id", "author_id", "text", "parent_id", "path", "depth"],
+                             select(new.c.id, new.c.post_id, literal(current_user.id, Integer),
+                                    literal(safe_text, Text), new.c.parent_id,
+                                    # под родителем без path (ещё не заполнен) путь остаётся пустым, а глубина 0,
+                                    # как у всех незаполненных: их ставит дозаполнение, ветка строится по parent_id
+                                    case((new.c.parent_id.is_(None), segment),
+                                         else_=new.c.parent_path + PATH_SEPARATOR + segment),
+                                    case((new.c.parent_path.is_(None), 0), else_=new.c.parent_depth + 1)))
+                .returning(CommentModel.id, CommentModel.post_id, CommentModel.created_at)
+                .cte("inserted"))
+    # Счётчик меняется в той же транзакции, что и сам комментарий
+    counted = (update(PostModel).where(PostModel.id == inserted.c.post_id)
+               .values(comment_count=PostModel.comment_count + 1, updated_at=PostModel.updated_at)
+               .cte("counted"))
+    totals = bump_counter(COMMENTS, 1, source=inserted).cte("totals")
+
+    row = (await db.execute(
+        select(parent_found.label("parent_found"), inserted.c.id, inserted.c.post_id, inserted.c.created_at)
+        .select_from(target.outerjoin(inserted, true()))
+        .add_cte(counted, totals)
+    )).one_or_none()
+
+    if row is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Пост не найден")
+    if not row.parent_found:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Родительский комментарий не найден")
+
     await db.commit()
-    db_comment = await db.scalar(select(CommentModel).options(selectinload(CommentModel.author)).
-                                 where(CommentModel.id == db_comment.id))
-    
-    return db_comment
+
+    created = Comment(id=row.id, post_id=row.post_id, author=current_user, text=safe_text,
+                      created_at=row.created_at, parent_id=comment.parent_id)
+    await comment_broker.publish(row.post_id, row.id, created.model_dump_json())
+    trending.incr(row.post_id, COMMENT_WEIGHT)
+    # Тональность оценивается в фоне пакетом, ответ её не ждёт
+    comment_scorer.enqueue(row.id, comment.text)
+
+    return created
 
 
 @router.delete("/comments/{id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -88,20 +286,36 @@ async def delete_comment(
     db: AsyncSession = Depends(get_session_db)
 ):
     """
-    Удаляет комментарий по его id (автор комментария или автор статьи)
+    Удаляет комментарий по его id (автор комментария или автор статьи).
+    Проверка прав, удаление и обновление счётчиков — один DELETE с CTE.
     """
-    comment = await db.scalar(select(CommentModel).where(CommentModel.id == id))
-    
-    if comment is None:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Комментарий не найден")
-
-    post = await db.scalar(select(PostModel).where(PostModel.id == comment.post_id))
+    target = (select(CommentModel.id,
+                     or_(CommentModel.author_id == current_user.id,
+                         PostModel.author_id == current_user.id).label("allowed"))
+              .join(PostModel, PostModel.id == CommentModel.post_id)
+              .where(CommentModel.id == id)
+              .cte("target"))
+    # Ответы удалённого комментария остаются: parent_id обнуляет внешний ключ (ON DELETE SET NULL)
+    deleted = (delete(CommentModel).where(CommentModel.id == target.c.id, target.c.allowed)
+               .returning(CommentModel.post_id, CommentModel.sentiment_score)
+               .cte("deleted"))
+    # Оценённый комментарий уходит и из сводки тональности статьи
+    score = deleted.c.sentiment_score
+    counted = (update(PostModel).where(PostModel.id == deleted.c.post_id)
+               .values(comment_count=PostModel.comment_count - 1,
+                       sentiment_scored=PostModel.sentiment_scored - case((score.is_not(None), 1), else_=0),
+                       sentiment_positive=PostModel.sentiment_positive
+                       - case((score >= POSITIVE_THRESHOLD, 1), else_=0),
+                       sentiment_sum=PostModel.sentiment_sum - func.coalesce(score, 0),
+                       updated_at=PostModel.updated_at)
+               .cte("counted"))
+    totals = bump_counter(COMMENTS, -1, source=deleted).cte("totals")
 
-    is_comment_author = comment.author_id == current_user.id
-    is_post_author = post.author_id == current_user.id
+    allowed = (await db.execute(select(target.c.allowed).add_cte(counted, totals))).scalar_one_or_none()
 
-    if not (is_comment_author or is_post_author):
+    if allowed is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Комментарий не найден")
+    if not allowed:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Нет прав для удалеаия")
 
-    await db.delete(comment)
-    await db.commit()
\ No newline at end of file
+    await db.commit()
@@ -1,50 +1,206 @@
+import logging
+from typing import Literal
+
 from fastapi import APIRouter, Depends, HTTPException, status, Query
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, update
+from sqlalchemy import select, func, literal_column, bindparam, insert, delete, union_all, true, false, cast, or_, Integer
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.dialects.postgresql import aggregate_order_by, insert as pg_insert
+from sqlalchemy.types import JSON
 from slugify import slugify
-from sqlalchemy.orm import selectinload
-from fastapi_cache.decorator import cache
-from fastapi_cache import FastAPICache
+from sqlalchemy.orm import selectinload, aliased, defer
 
 from app.models.users import User as UserModel  
 from app.models.posts import Post as PostModel
-from app.models.tags import Tag
+from app.models.tags import Tag, post_tags
 from app.models.comments import Comment as CommentModel
 from app.core.db_depends import get_session_db
-from app.schemas import Post, PostCreate, PostUpdate, PostShort
+from app.schemas import Post, PostCreate, PostUpdate, PostShort, CursorPage, TrendingPost, PostSentiment
+from app.core.pagination import keyset_query, keyset_page
+from app.core.views import view_counter
+from app.core.trending import trending, VIEW_WEIGHT
+from app.core.cache import tagged_cache, invalidate_tags
+from app.core.stats import apply_post_change, bump_counter, COMMENTS
 from app.auth import get_current_user
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter(prefix="/api/posts", tags=["posts"])
 
 
-@router.get("/", response_model=list[PostShort])
-@cache(expire=300)
+def _user_json(user):
+    return func.json_build_object("id", user.id, "username", user.username, "email", user.email,
+                                  "date_joined", user.date_joined, "is_active", user.is_active,
+                                  "avatar", user.avatar, type_=JSON)
+
+
+_EMPTY_JSON_ARRAY = literal_column("'[]'::json", type_=JSON)
+_comment_author = aliased(UserModel)
+
+_tags_json = (select(func.coalesce(func.json_agg(aggregate_order_by(
+                  func.json_build_object("id", Tag.id, "name", Tag.name, "slug", Tag.slug), Tag.id)),
+                  _EMPTY_JSON_ARRAY, type_=JSON))
+              .select_from(post_tags).join(Tag, Tag.id == post_tags.c.tag_id)
+              .where(post_tags.c.post_id == PostModel.id)
+              .scalar_subquery())
+
+# Только первые comments_limit комментариев верхнего уровня, остальное — через /comments.
+# Верхний уровень — по depth, как в ветке: ответы удалённого комментария остаются на своём месте.
+# У комментариев без path глубина ещё 0, их, как и ветка, определяем по parent_id
+_top_comments = (select(func.json_build_object("id", CommentModel.id, "post_id", CommentModel.post_id,
+                                               "text", CommentModel.text, "created_at", CommentModel.created_at,
+                                               "parent_id", CommentModel.parent_id,
+                                               "author", _user_json(_comment_author)).label("comment"),
+                        CommentModel.created_at, CommentModel.id)
+                 .join(_comment_author, _comment_author.id == CommentModel.author_id)
+                 .where(CommentModel.post_id == PostModel.id, CommentModel.depth == 0,
+                        or_(CommentModel.path.is_not(None), CommentModel.parent_id.is_(None)))
+                 .order_by(CommentModel.created_at, CommentModel.id)
+                 .limit(bindparam("comments_limit"))
+                 .correlate(PostModel)
+                 .subquery("top_comments"))
+
+_comments_json = (select(func.coalesce(func.json_agg(aggregate_order_by(
+                      _top_comments.c.comment, _top_comments.c.created_at, _top_comments.c.id)),
+                      _EMPTY_JSON_ARRAY, type_=JSON))
+                  .scalar_subquery())
+
+# Статья целиком (автор, теги, первые комментарии с авторами) одним запросом: связи собираются в JSON на стороне БД
+POST_DETAIL = (select(PostModel.id, PostModel.title, PostModel.slug, PostModel.content, PostModel.created_at,
+                      PostModel.updated_at, PostModel.status, PostModel.view_count, PostModel.comment_count,
+                      _user_json(UserModel).label("author"), _tags_json.label("tags"),
+                      _comments_json.label("comments"))
+               .join(UserModel, UserModel.id == PostModel.author_id))
+
+COMMENTS_LIMIT = 20
+
+# Карточки статей для трендов одним запросом, как и детальная статья
+POST_CARDS = (select(PostModel.id, PostModel.title, PostModel.slug, PostModel.created_at, PostModel.status,
+                     PostModel.view_count, PostModel.preview, PostModel.word_count, PostModel.reading_time,
+                     PostModel.comment_count, _user_json(UserModel).label("author"), _tags_json.label("tags"))
+              .join(UserModel, UserModel.id == PostModel.author_id))
+
+
+# name -> (id, slug) закоммиченных тегов. Теги не удаляются, поэтому записи не устаревают
+tag_cache: dict[str, tuple[int, str]] = {}
+
+
+async def resolve_tags(db: AsyncSession, names: list[str]) -> list[tuple[int, str]]:
+    """
+    Возвращает (id, slug) тегов по именам, создавая недостающие.
+    Известные теги берутся из tag_cache, остальные — одним INSERT ... ON CONFLICT DO NOTHING,
+    совмещённым с SELECT уже существующих.
+    """
+    names = list(dict.fromkeys(names))
+    resolved = {name: tag_cache[name] for name in names if name in tag_cache}
+    # Вторая попытка нужна, если конкурент закоммитил тег уже после снимка нашего запроса
+    for _ in range(2):
+        missing = [name for name in names if name not in resolved]
+        if not missing:
+            break
+        inserted = (pg_insert(Tag).values([{"name": name, "slug": slugify(name)} for name in missing])
+                    .on_conflict_do_nothing(index_elements=[Tag.name])
+                    .returning(Tag.id, Tag.name, Tag.slug)
+                    .cte("inserted"))
+        rows = await db.execute(union_all(
+            select(inserted.c.id, inserted.c.name, inserted.c.slug, true().label("created")),
+            select(Tag.id, Tag.name, Tag.slug, false().label("created")).where(Tag.name.in_(missing))))
+        for row in rows:
+            resolved[row.name] = (row.id, row.slug)
+            # Свежесозданный тег может откатиться вместе с транзакцией, кешируем только существовавшие
+            if not row.created:
+                tag_cache[row.name] = (row.id, row.slug)
+    return [resolved[name] for name in names]
+
+
+SLUG_ATTEMPTS = 5
+
+
+async def allocate_slug(db: AsyncSession, base_slug: str) -> str:
+    """
+    Подбирает свободный slug одним запросом: base_slug, если он свободен,
+    иначе base_slug-N, где N на единицу больше максимального занятого суффикса.
+    Префиксный LIKE идёт по индексу ix_posts_slug_pattern.
+
+    Суффикс не отличить от числа в конце заголовка: при занятом weekly-update и статье
+    «Weekly update 2024» следующая «Weekly update» получит weekly-update-2025.
+    Slug остаётся уникальным, монотонность номеров не гарантируется.
+    """
+    # slugify оставляет только [a-z0-9-], экранировать base_slug для LIKE и регулярки не нужно
+    suffix = func.substring(PostModel.slug, f"^{base_slug}-([0-9]{{1,9}})$")
+    taken, max_suffix = (await db.execute(
+        select(func.bool_or(PostModel.slug == base_slug), func.max(cast(suffix, Integer)))
+        .where(or_(PostModel.slug == base_slug, PostModel.slug.like(f"{base_slug}-%"))))).one()
+    if not taken:
+        return base_slug
+    return f"{base_slug}-{(max_suffix or 0) + 1}"
+
+
+def list_cache_tags(tag: str | None = None, author: str | None = None, **_) -> list[str]:
+    """
+    Теги кеша страницы списка: фильтры, от которых она зависит.
+    В списках только опубликованные статьи, поэтому статус отдельным тегом не нужен.
+    """
+    tags = []
+    if author:
+        tags.append(f"author:{author}")
+    if tag:
+        tags.append(f"tag:{tag}")
+    return tags or ["posts"]
+
+
+def post_cache_tags(author: str, tag_slugs) -> list[str]:
+    """
+    Теги кеша, которые задевает изменение опубликованной статьи.
+    """
+    return ["posts", f"author:{author}", *(f"tag:{slug}" for slug in tag_slugs)]
+
+
+async def get_post_detail(db: AsyncSession, *where, comments_limit: int = COMMENTS_LIMIT) -> Post | None:
+    """
+    Загружает статью для схемы Post за один round trip.
+    """
+    row = (await db.execute(POST_DETAIL.where(*where), {"comments_limit": comments_limit})).one_or_none()
+    return Post.model_validate(row._asdict()) if row is not None else None
+
+
+@router.get("/", response_model=list[PostShort] | CursorPage[PostShort])
+@tagged_cache(expire=300, stale=60, tags=list_cache_tags)
 async def get_all_posts(
     page: int = Query(1, ge=1),
     page_size: int = Query(10, ge=1, le=100),
     tag: str | None = Query(None),
     author: str | None = Query(None),
+    cursor: str | None = Query(None, description="Курсор страницы (пустой — первая страница)"),
     db: AsyncSession = Depends(get_session_db)
 ):
     """
         Возвращает список всех опубликованных статей.
+        С параметром cursor включается keyset-пагинация по (created_at, id).
     """
     stmt = select(PostModel).where(PostModel.status == "published")
 
     if author:
         user = await db.scalar(select(UserModel).where(UserModel.username == author))
         if user is None:
-            return []
+            return [] if cursor is None else CursorPage[PostShort](items=[])
         stmt = stmt.where(PostModel.author_id == user.id)
 
     if tag:
         tag_obj = await db.scalar(select(Tag).where(Tag.slug == tag))
         if tag_obj is None:
-            return []
+            return [] if cursor is None else CursorPage[PostShort](items=[])
         stmt = stmt.where(PostModel.tags.any(Tag.id == tag_obj.id))
 
-    posts = await db.scalars(stmt.options(selectinload(PostModel.tags), selectinload(PostModel.author)).
-                             offset((page - 1) * page_size).limit(page_size))
+    stmt = stmt.options(defer(PostModel.content), selectinload(PostModel.tags), selectinload(PostModel.author))
+    if cursor is not None:
+        stmt = keyset_query(stmt, PostModel.created_at, PostModel.id, cursor, page_size)
+    else:
+        stmt = (stmt.order_by(PostModel.created_at.desc(), PostModel.id.desc())
+                .offset((page - 1) * page_size).limit(page_size))
+    posts = (await db.scalars(stmt)).all()
+    if cursor is not None:
+        posts, next_cursor, prev_cursor = keyset_page(posts, cursor, page_size)
     
     reslt = [PostShort(
             id=post.id,
@@ -55,31 +211,82 @@ async def get_all_posts(
             status=post.status,
             view_count=post.view_count,
             tags=post.tags,
-            preview=post.content[:200]
+            preview=post.preview,
+            word_count=post.word_count,
+            reading_time=post.reading_time,
+            comment_count=post.comment_count
         )
-        for post in posts.all()
+        for post in posts
     ]
+    if cursor is not None:
+        return CursorPage[PostShort](items=reslt, next_cursor=next_cursor, prev_cursor=prev_cursor)
     return reslt
     
 
+@router.get("/trending", response_model=list[TrendingPost])
+async def get_trending_posts(window: Literal["1h", "24h", "7d"] = Query("24h", description="Окно трендов"),
+                             limit: int = Query(10, ge=1, le=50),
+                             db: AsyncSession = Depends(get_session_db)):
+    """
+        Возвращает статьи с наибольшим затухающим счётом просмотров и комментариев за окно.
+        Топ читается из Redis, из БД — только карточки найденных статей одним запросом.
+    """
+    try:
+        # С запасом: в топе могут оказаться удалённые или снятые с публикации статьи
+        top = await trending.top(window, limit * 2)
+    except Exception as e:
+        logger.warning(f"Тренды недоступны: {e}")
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Тренды временно недоступны")
+    if not top:
+        return []
+
+    rows = await db.execute(POST_CARDS.where(PostModel.id.in_([post_id for post_id, _ in top]),
+                                             PostModel.status == "published"))
+    cards = {row.id: row._asdict() for row in rows}
+    return [TrendingPost.model_validate({**cards[post_id], "score": score})
+            for post_id, score in top if post_id in cards][:limit]
+
+
 @router.get("/{slug}", response_model=Post)
-async def get_post_by_slug(slug: str, db: AsyncSession = Depends(get_session_db)):
+async def get_post_by_slug(slug: str,
+                           comments_limit: int = Query(COMMENTS_LIMIT, ge=0, le=100,
+                                                       description="Сколько первых комментариев верхнего уровня вернуть"),
+                           db: AsyncSession = Depends(get_session_db)):
     """
-        Возвращает детальную информацию о статье по его slug.
+        Возвращает детальную информацию о статье по его slug
+        с первыми комментариями верхнего уровня и общим числом комментариев.
+        Просмотр засчитывается в памяти и пишется в БД фоновым сбросом,
+        в ответе — сохранённое значение плюс ещё не записанные просмотры.
     """
-    post = await db.scalar(select(PostModel).where(PostModel.slug == slug, PostModel.status == "published"))
+    post = await get_post_detail(db, PostModel.slug == slug, PostModel.status == "published",
+                                 comments_limit=comments_limit)
     
     if post is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Статья не найдена")
 
-    await db.execute(
-        update(PostModel).where(PostModel.id == post.id).values(view_count=PostModel.view_count + 1)
-    )
-    await db.commit()
-    post = await db.scalar(select(PostModel).options(selectinload(PostModel.tags), selectinload(PostModel.author), 
-                                                     selectinload(PostModel.comments).selectinload(CommentModel.author)).
-                           where(PostModel.slug == slug, PostModel.status == "published"))
-    return post
+    view_counter.incr(post.id)
+    trending.incr(post.id, VIEW_WEIGHT)
+    return post.model_copy(update={"view_count": post.view_count + view_counter.pending(post.id)})
+
+
+@router.get("/{slug}/sentiment", response_model=PostSentiment)
+async def get_post_sentiment(slug: str, db: AsyncSession = Depends(get_session_db)):
+    """
+        Сводка тональности комментариев статьи: сколько оценено, позитивных/негативных и средняя оценка.
+        Читается из счётчиков статьи, которые ведут фоновая оценка и удаление комментариев.
+    """
+    row = (await db.execute(
+        select(PostModel.comment_count, PostModel.sentiment_scored, PostModel.sentiment_positive,
+               PostModel.sentiment_sum)
+        .where(PostModel.slug == slug, PostModel.status == "published")
+    )).one_or_none()
+
+    if row is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Статья не найдена")
+
+    return PostSentiment(scored=row.sentiment_scored, pending=max(row.comment_count - row.sentiment_scored, 0),
+                         positive=row.sentiment_positive, negative=row.sentiment_scored - row.sentiment_positive,
+                         average=round(row.sentiment_sum / row.sentiment_scored, 4) if row.sentiment_scored else None)
 
 
 @router.post("/", response_model=Post, status_code=status.HTTP_201_CREATED) 
@@ -91,38 +298,35 @@ async def create_post(
     """
     Создаёт новую статью, привязанный к текущему пользователю (только для авторизованных пользователей)
     """
+    tags = await resolve_tags(db, post.tags)
+
     base_slug = slugify(post.title)
-    slug_post = base_slug
-    counter = 1
-    while await db.scalar(select(PostModel).where(PostModel.slug == slug_post)):
-        slug_post = f"{base_slug}-{counter}"
-        counter += 1
+    for attempt in range(SLUG_ATTEMPTS):
+        db_post = PostModel(
+            title=post.title,
+            slug=await allocate_slug(db, base_slug),
+            content=post.content,
+            status=post.status,
+            author_id=current_user.id
+        )
+        try:
+            # Slug мог занять параллельный запрос: откатываем только savepoint и подбираем заново
+            async with db.begin_nested():
+                db.add(db_post)
+            break
+        except IntegrityError as e:
+            if "posts_slug_key" not in str(e.orig):
+                raise
+    else:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Не удалось подобрать свободный slug")
 
-    tags = []
-    for tag_name in post.tags:
-        tag = await db.scalar(select(Tag).where(Tag.name == tag_name))
-        if tag is None:
-            tag = Tag(name=tag_name, slug=slugify(tag_name))
-            db.add(tag)
-            await db.flush()
-        tags.append(tag)
-
-    db_post = PostModel(
-        title=post.title,
-        slug=slug_post,
-        content=post.content,
-        status=post.status,
-        author_id=current_user.id,
-        tags=tags
-    )
-    db.add(db_post)
+    if tags:
+        await db.execute(insert(post_tags), [{"post_id": db_post.id, "tag_id": tag_id} for tag_id, _ in tags])
+    await apply_post_change(db, False, set(), db_post.status == "published", {tag_id for tag_id, _ in tags})
     await db.commit()
-    await FastAPICache.clear(namespace="blog-cache")
-    post = await db.scalar(select(PostModel).
-                           options(selectinload(PostModel.tags),selectinload(PostModel.author),selectinload(PostModel.comments).
-                                   selectinload(CommentModel.author)).
-                           where(PostModel.id == db_post.id))
-    return post
+    if db_post.status == "published":
+        await invalidate_tags(*post_cache_tags(current_user.username, [tag_slug for _, tag_slug in tags]))
+    return await get_post_detail(db, PostModel.id == db_post.id)
 
 
 @router.put("/{slug}", response_model=Post)
@@ -135,13 +339,19 @@ async def update_post(
     """
     Обновляет статью по её slug (только автор)
     """
+    # Блокировка строки: статус, теги и счётчики ниже меняются относительно прочитанного состояния,
+    # параллельная правка той же статьи должна дождаться commit и прочитать уже новое
     post = await db.scalar(select(PostModel).options(selectinload(PostModel.tags), selectinload(PostModel.author))
-                           .where(PostModel.slug == slug))
+                           .where(PostModel.slug == slug)
+                           .with_for_update(of=PostModel))
     if post is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Пост не найден")
     if post.author_id != current_user.id:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Нет прав для редактирования")
 
+    was_published = post.status == "published"
+    old_tag_slugs = {tag.slug for tag in post.tags}
+    old_ids = new_ids = {tag.id for tag in post.tags}
     if post_data.title is not None:
         post.title = post_data.title
     if post_data.content is not None:
@@ -149,31 +359,24 @@ async def update_post(
     if post_data.status is not None:
         post.status = post_data.status
 
+    new_tag_slugs = old_tag_slugs
     if post_data.tags is not None:
-        tags = []
-        for tag_name in post_data.tags:
-            tag = await db.scalar(select(Tag).where(Tag.name == tag_name))
-            if tag is None:
-                tag = Tag(name=tag_name, slug=slugify(tag_name))
-                db.add(tag)
-                await db.flush()
-            tags.append(tag)
-        post.tags = tags
+        tags = await resolve_tags(db, post_data.tags)
+        new_tag_slugs = {tag_slug for _, tag_slug in tags}
+        new_ids = {tag_id for tag_id, _ in tags}
+        if old_ids - new_ids:
+            await db.execute(delete(post_tags).where(post_tags.c.post_id == post.id,
+                                                     post_tags.c.tag_id.in_(old_ids - new_ids)))
+        if new_ids - old_ids:
+            await db.execute(insert(post_tags), [{"post_id": post.id, "tag_id": tag_id} for tag_id in new_ids - old_ids])
+    await apply_post_change(db, was_published, old_ids, post.status == "published", new_ids)
 
     await db.commit()
-    await db.refresh(post)
-    post = await db.scalar( 
-    select(PostModel)
-    .options(
-        selectinload(PostModel.tags),
-        selectinload(PostModel.author),
-        selectinload(PostModel.comments).selectinload(CommentModel.author)
-    )
-    .where(PostModel.id == post.id)
-)
-    await FastAPICache.clear(namespace="blog-cache")
+    # Черновик, который не был и не стал опубликованным, в списках не виден
+    if was_published or post.status == "published":
+        await invalidate_tags(*post_cache_tags(current_user.username, old_tag_slugs | new_tag_slugs))
 
-    return post
+    return await get_post_detail(db, PostModel.id == post.id)
 
 
 @router.delete("/{slug}", status_code=status.HTTP_204_NO_CONTENT)
@@ -185,14 +388,22 @@ async def delete_post_by_slug(
     """
     Удаляет статью по её slug (только автор)
     """
-    post = await db.scalar(select(PostModel).where(PostModel.slug == slug))
+    # Под блокировкой comment_count не изменится до удаления: новый комментарий ждёт её на внешнем ключе
+    post = await db.scalar(select(PostModel).options(selectinload(PostModel.tags)).where(PostModel.slug == slug)
+                           .with_for_update(of=PostModel))
     if post is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Пост не найден")
     if post.author_id != current_user.id:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Нет прав для удаления")
 
+    tag_slugs = [tag.slug for tag in post.tags]
+    await apply_post_change(db, post.status == "published", {tag.id for tag in post.tags}, False, set())
+    # Комментарии уходят вместе со статьёй
+    if post.comment_count:
+        await db.execute(bump_counter(COMMENTS, -post.comment_count))
     await db.delete(post)
     await db.commit()
-    await FastAPICache.clear(namespace="blog-cache")
+    if post.status == "published":
+        await invalidate_tags(*post_cache_tags(current_user.username, tag_slugs))
     
 
@@ -1,35 +1,161 @@
+from typing import Literal
+
 from fastapi import APIRouter, Depends, Query
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, or_
-from sqlalchemy.orm import selectinload
+from sqlalchemy import select, func, or_, literal, distinct, tuple_
+from sqlalchemy.dialects.postgresql import websearch_to_tsquery
+from sqlalchemy.orm import selectinload, defer
 
 from app.core.db_depends import get_session_db
-from app.models.posts import Post as PostModel
-from app.schemas import PostShort
+from app.models.posts import Post as PostModel, SEARCH_CONFIG
+from app.models.tags import Tag as TagModel, post_tags
+from app.models.users import User as UserModel
+from app.schemas import PostShort, CursorPage, TitleSuggestion, SearchFacets, FacetCount, SearchPage
+from app.core.pagination import keyset_query, keyset_page
+from app.core.cache_backend import LRUCache
+from app.core.config import settings
 
 router = APIRouter(prefix="/api", tags=["search"])
 
-@router.get("/search")
+# Подсказки на каждое нажатие клавиши: короткий кеш воркера по нормализованному префиксу
+suggest_cache = LRUCache(max_items=10_000)
+# Фасеты не зависят от страницы: листание результатов их не пересчитывает
+facets_cache = LRUCache(max_items=1_000)
+
+FACET_LIMIT = 10
+
+
+def normalize_query(q: str) -> str:
+    return " ".join(q.lower().split())
+
+
+async def find_suggestions(db: AsyncSession, prefix: str, limit: int) -> list[TitleSuggestion]:
+    """
+    Заголовки опубликованных статей, начинающиеся с prefix или похожие на него по триграммам.
+    Оба условия обслуживает GIN-индекс ix_posts_title_trgm; совпадения по префиксу идут первыми.
+    """
+    escaped = prefix.replace("/", "//").replace("%", "/%").replace("_", "/_")
+    starts_with = PostModel.title.ilike(f"{escaped}%", escape="/")
+    similar = literal(prefix).bool_op("<%")(PostModel.title)
+    rows = await db.execute(
+        select(PostModel.title, PostModel.slug)
+        .where(PostModel.status == "published", or_(starts_with, similar))
+        .order_by(starts_with.desc(), func.word_similarity(prefix, PostModel.title).desc(), PostModel.title)
+        .limit(limit)
+    )
+    return [TitleSuggestion(title=title, slug=slug) for title, slug in rows]
+
+
+@router.get("/search/suggest", response_model=list[TitleSuggestion])
+async def suggest_titles(q: str = Query(..., min_length=2, max_length=100, description="Начало заголовка"),
+                         limit: int = Query(8, ge=1, le=20),
+                         db: AsyncSession = Depends(get_session_db)):
+    """
+    Подсказки заголовков для строки поиска: по префиксу и по триграммному сходству.
+    """
+    prefix = normalize_query(q)
+    if len(prefix) < 2:
+        return []
+    key = f"{limit}:{prefix}"
+    suggestions = suggest_cache.get(key)
+    if suggestions is None:
+        suggestions = await find_suggestions(db, prefix, limit)
+        suggest_cache.set(key, suggestions, settings.SUGGEST_CACHE_TTL)
+    return suggestions
+
+
+def search_filters(q: str | None, mode: str) -> tuple[list, object | None]:
+    """
+    Условия поиска и выражение релевантности (None, если сортировать по рангу нечего).
+    """
+    filters = [PostModel.status == "published"]
+    search_value = q.strip() if q is not None else ""
+    if search_value and mode == "fts":
+        query = websearch_to_tsquery(SEARCH_CONFIG, search_value)
+        filters.append(PostModel.search_vector.bool_op("@@")(query))
+        return filters, func.ts_rank(PostModel.search_vector, query)
+    if search_value:
+        filters.append(
+            or_(func.lower(PostModel.title).like(f"%{search_value.lower()}%"),
+                func.lower(PostModel.content).like(f"%{search_value.lower()}%")))
+    return filters, None
+
+
+# Биты grouping(tag_id, author_id, status) для каждого набора группировки
+_TAGS_SET, _AUTHORS_SET, _STATUS_SET, _TOTAL_SET = 0b011, 0b101, 0b110, 0b111
+
+
+async def search_facets(db: AsyncSession, filters: list) -> SearchFacets:
+    """
+    Счётчики по тегам, авторам и статусу для всех совпадений одним проходом GROUPING SETS.
+    Из каждого набора берутся FACET_LIMIT самых частых значений.
+    """
+    matches = select(PostModel.id, PostModel.author_id, PostModel.status).where(*filters).cte("matches")
+    grouped = (select(func.grouping(post_tags.c.tag_id, matches.c.author_id, matches.c.status).label("facet"),
+                      post_tags.c.tag_id, matches.c.author_id, matches.c.status,
+                      func.count(distinct(matches.c.id)).label("hits"))
+               .select_from(matches.outerjoin(post_tags, post_tags.c.post_id == matches.c.id))
+               .group_by(func.grouping_sets(post_tags.c.tag_id, matches.c.author_id, matches.c.status, tuple_()))
+               .subquery("grouped"))
+    ranked = (select(grouped, func.row_number().over(
+                  partition_by=grouped.c.facet,
+                  order_by=(grouped.c.hits.desc(), grouped.c.tag_id, grouped.c.author_id, grouped.c.status)
+              ).label("rank"))
+              # статьи без тегов попадают в набор тегов с tag_id NULL
+              .where(or_(grouped.c.facet != _TAGS_SET, grouped.c.tag_id.is_not(None)))
+              .subquery("ranked"))
+    rows = await db.execute(
+        select(ranked.c.facet, ranked.c.hits, ranked.c.status, TagModel.slug, TagModel.name, UserModel.username)
+        .outerjoin(TagModel, TagModel.id == ranked.c.tag_id)
+        .outerjoin(UserModel, UserModel.id == ranked.c.author_id)
+        .where(ranked.c.rank <= FACET_LIMIT)
+        .order_by(ranked.c.facet, ranked.c.rank)
+    )
+    facets = SearchFacets()
+    for facet, hits, status, tag_slug, tag_name, username in rows:
+        if facet == _TAGS_SET:
+            facets.tags.append(FacetCount(value=tag_slug, label=tag_name, count=hits))
+        elif facet == _AUTHORS_SET:
+            facets.authors.append(FacetCount(value=username, label=username, count=hits))
+        elif facet == _STATUS_SET:
+            facets.status.append(FacetCount(value=status, label=status, count=hits))
+        else:
+            facets.total = hits
+    return facets
+
+
+@router.get("/search", response_model=list[PostShort] | CursorPage[PostShort] | SearchPage)
 async def search_post(q: str | None = Query(None, description="Поиск по заголовку и содержанию"),
+                      mode: Literal["fts", "like"] = Query("fts", description="fts — полнотекстовый, like — по подстроке"),
+                      facets: bool = Query(False, description="Добавить счётчики по тегам, авторам и статусу"),
                       page: int = Query(1, ge=1),
                       page_size: int = Query(10, ge=1, le=100),
+                      cursor: str | None = Query(None, description="Курсор страницы (пустой — первая страница)"),
                       db: AsyncSession = Depends(get_session_db)):
     """
-    LIKE-поиск по заголовку и содержанию.
-    Возвращает список постов
+    Поиск по заголовку и содержанию.
+    В режиме fts запрос разбирается websearch_to_tsquery ("фразы в кавычках", -исключение, or),
+    совпадения ищутся по GIN-индексу и сортируются по ts_rank: заголовок весит больше текста.
+    Режим like — прежний поиск по подстроке, новые первыми.
+    С параметром cursor включается keyset-пагинация по (created_at, id), порядок — новые первыми.
+    С facets=true ответ — страница с фасетами по всем совпадениям, они кешируются по нормализованному запросу.
     """
-    filters = [PostModel.status == "published"]
-    if q is not None:
-        search_value = q.strip()
-        if search_value:
-            filters.append(
-                or_(func.lower(PostModel.title).like(f"%{search_value.lower()}%"),
-                    func.lower(PostModel.content).like(f"%{search_value.lower()}%")))                           
-                                    
-    posts = await db.scalars(select(PostModel).options(selectinload(PostModel.author), selectinload(PostModel.tags)).
-                             where(*filters).offset((page - 1) * page_size).limit(page_size))
+    filters, rank = search_filters(q, mode)
+
+    stmt = (select(PostModel).options(defer(PostModel.content), selectinload(PostModel.author), selectinload(PostModel.tags))
+            .where(*filters))
+    if cursor is not None:
+        stmt = keyset_query(stmt, PostModel.created_at, PostModel.id, cursor, page_size)
+    else:
+        order = [PostModel.created_at.desc(), PostModel.id.desc()]
+        if rank is not None:
+            order.insert(0, rank.desc())
+        stmt = stmt.order_by(*order).offset((page - 1) * page_size).limit(page_size)
+    posts = (await db.scalars(stmt)).all()
+    if cursor is not None:
+        posts, next_cursor, prev_cursor = keyset_page(posts, cursor, page_size)
     
-    return [PostShort(id=post.id,
+    results = [PostShort(id=post.id,
                       title=post.title,
                       slug=post.slug,
                       author=post.author,
@@ -37,6 +163,21 @@ async def search_post(q: str | None = Query(None, description="Поиск по 
                       status=post.status,
                       view_count=post.view_count
                       ,tags=post.tags,
-                      preview=post.content[:200])
-            for post in posts.all()
-            ]
\ No newline at end of file
+                      preview=post.preview,
+                      word_count=post.word_count,
+                      reading_time=post.reading_time,
+                      comment_count=post.comment_count)
+            for post in posts
+            ]
+    if facets:
+        key = f"{mode}:{normalize_query(q or '')}"
+        search_facet_counts = facets_cache.get(key)
+        if search_facet_counts is None:
+            search_facet_counts = await search_facets(db, filters)
+            facets_cache.set(key, search_facet_counts, settings.SEARCH_FACETS_TTL)
+        if cursor is None:
+            return SearchPage(items=results, facets=search_facet_counts)
+        return SearchPage(items=results, next_cursor=next_cursor, prev_cursor=prev_cursor, facets=search_facet_counts)
+    if cursor is not None:
+        return CursorPage[PostShort](items=results, next_cursor=next_cursor, prev_cursor=prev_cursor)
+    return results
\ No newline at end of file
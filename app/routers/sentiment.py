@@ -1,24 +1,140 @@
+import asyncio
+import hashlib
 import numpy as np
-import pickle
-from fastapi import APIRouter, HTTPException
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import APIRouter, HTTPException, Query
 from pydantic import BaseModel
-from tensorflow.keras.models import load_model
-from tensorflow.keras.preprocessing.sequence import pad_sequences
 
-from app.schemas import SentimentRequest, SentimentResponse
+from app.core.config import settings
+from app.core.cache_backend import LRUCache
+from app.core.redis import redis
+from app.core.responses import ClosingStreamingResponse
+from app.ml.batching import MicroBatcher
+from app.ml.cache import SentimentCache
+from app.ml.engine import NumpyModel
+from app.ml.scoring import CommentScorer
+from app.ml.tokenizer import Tokenizer
+from app.schemas import (SentimentRequest, SentimentResponse, SentimentBatchRequest, SentimentBatchItem,
+                         SentimentBatchResponse)
 
 router = APIRouter(prefix="/api", tags=["sentiment"])
 
-# Загружает модельку
+max_text_len = 100
+
+# Загружает модельку: веса, экспортированные из model/sentiment_model.keras (python -m app.ml.export)
 try:
-    model = load_model('model/sentiment_model.keras')
-    with open('model/tokenizer.pkl', 'rb') as f:
-        tokenizer = pickle.load(f)
-    max_text_len = 100
+    model = NumpyModel.load('model/sentiment_numpy')
+    tokenizer = Tokenizer.load('model/sentiment_tokenizer')
+    # Меняется при повторном экспорте новой модели или словаря — вместе с ней и ключи кеша результатов
+    model_version = hashlib.sha256(f"{model.version}:{tokenizer.version}".encode()).hexdigest()[:16]
 except Exception as e:
     print(f"Ошибка загрузки модели - {e}")
     model = None
     tokenizer = None
+    model_version = None
+
+
+SENTIMENT_RETRY_AFTER = 1
+# Сколько строк пакетной ручки уходит в модель за один вызов
+BATCH_CHUNK_SIZE = 256
+
+
+def encode(texts: list[str]) -> np.ndarray:
+    """
+    Токенизирует тексты за один проход и выравнивает их в одну матрицу (len(texts), max_text_len)
+    """
+    return tokenizer.encode([text.lower() for text in texts], max_text_len)
+
+
+def predict_padded(pad: np.ndarray) -> np.ndarray:
+    return model.predict(pad)[:, 0]
+
+
+def predict_batch(texts: list[str]) -> np.ndarray:
+    """
+    Вероятность позитивного тона для пакета текстов одним проходом модели
+    """
+    return predict_padded(encode(texts))
+
+
+# Токенизация и predict идут в отдельном потоке, цикл событий в это время обслуживает остальные запросы
+sentiment_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sentiment")
+sentiment_batcher = MicroBatcher(predict_batch, max_batch_size=settings.SENTIMENT_MAX_BATCH,
+                                 max_wait=settings.SENTIMENT_MAX_WAIT_MS / 1000,
+                                 max_queue=settings.SENTIMENT_MAX_QUEUE, executor=sentiment_executor)
+sentiment_cache = SentimentCache(redis, LRUCache(max_items=settings.SENTIMENT_CACHE_ITEMS), model_version,
+                                 ttl=settings.SENTIMENT_CACHE_TTL)
+batch_jobs = 0
+
+
+def to_response(prediction: float) -> SentimentResponse:
+    sentiment = "positive" if prediction >= 0.5 else "negative"
+    confidence = prediction if prediction >= 0.5 else 1 - prediction
+    return SentimentResponse(sentiment=sentiment, confidence=round(confidence, 2))
+
+
+async def score_texts(texts: list[str]):
+    """
+    Отдаёт (номер первого текста, вероятности) по порядку текстов, по мере готовности.
+    Найденные в кеше тексты в модель не идут, остальные оцениваются кусками по BATCH_CHUNK_SIZE.
+    Куски идут в тот же поток модели по очереди, поэтому одиночные запросы не ждут конца всего пакета.
+    """
+    keys = [sentiment_cache.key(text) for text in texts]
+    cached = await sentiment_cache.get_many(keys)
+    predictions = np.array([np.nan if value is None else value for value in cached], dtype=np.float32)
+    misses = [i for i, value in enumerate(cached) if value is None]
+    ready = 0
+    loop = asyncio.get_running_loop()
+    if misses:
+        pad = await loop.run_in_executor(sentiment_executor, encode, [texts[i] for i in misses])
+    for start in range(0, len(misses), BATCH_CHUNK_SIZE):
+        chunk = misses[start:start + BATCH_CHUNK_SIZE]
+        scored = await loop.run_in_executor(sentiment_executor, predict_padded, pad[start:start + BATCH_CHUNK_SIZE])
+        predictions[chunk] = scored
+        await sentiment_cache.set_many({keys[i]: p for i, p in zip(chunk, scored)})
+        # Готовы все тексты до первого промаха следующего куска
+        end = misses[start + BATCH_CHUNK_SIZE] if start + BATCH_CHUNK_SIZE < len(misses) else len(texts)
+        yield ready, predictions[ready:end]
+        ready = end
+    if ready < len(texts):
+        yield ready, predictions[ready:]
+
+
+def _release_batch_job() -> None:
+    global batch_jobs
+    batch_jobs -= 1
+
+
+async def score_comments(texts: list[str]) -> np.ndarray:
+    """
+    Вероятности для фоновой оценки комментариев: тот же кеш и поток модели, что у ручек,
+    но без слотов пакетной ручки — фоновая задача не должна отнимать их у клиентов.
+    """
+    keys = [sentiment_cache.key(text) for text in texts]
+    cached = await sentiment_cache.get_many(keys)
+    predictions = np.array([np.nan if value is None else value for value in cached], dtype=np.float32)
+    misses = [i for i, value in enumerate(cached) if value is None]
+    if not misses:
+        return predictions
+    loop = asyncio.get_running_loop()
+    pad = await loop.run_in_executor(sentiment_executor, encode, [texts[i] for i in misses])
+    for start in range(0, len(misses), BATCH_CHUNK_SIZE):
+        chunk = misses[start:start + BATCH_CHUNK_SIZE]
+        predictions[chunk] = await loop.run_in_executor(sentiment_executor, predict_padded,
+                                                        pad[start:start + BATCH_CHUNK_SIZE])
+    await sentiment_cache.set_many({keys[i]: predictions[i] for i in misses})
+    return predictions
+
+
+comment_scorer = CommentScorer(score_comments, enabled=model is not None and tokenizer is not None,
+                               interval=settings.SENTIMENT_SCORE_INTERVAL,
+                               max_pending=settings.SENTIMENT_SCORE_MAX_PENDING)
+
+
+async def _batch_lines(texts: list[str]):
+    async for start, predictions in score_texts(texts):
+        yield "".join(SentimentBatchItem(index=start + i, **to_response(float(p)).model_dump()).model_dump_json()
+                      + "\n" for i, p in enumerate(predictions))
 
 
 @router.post("/sentiment", response_model=SentimentResponse)
@@ -26,6 +142,7 @@ async def analyze_sentiment(request: SentimentRequest):
     """
     Ручка для анализа отзыва на позитивный/негативный
     Возвращает positive/negative и % уверенности модели
+    Повторные тексты отдаются из кеша, остальные уходят в модель общим пакетом, при переполненной очереди - 503
     """
     if model is None or tokenizer is None:
         raise HTTPException(status_code=500, detail="Модель не загружена")
@@ -33,15 +150,56 @@ async def analyze_sentiment(request: SentimentRequest):
     if not request.text.strip():
         raise HTTPException(status_code=400, detail="Текст не может быть пустым")
     
-    seq = tokenizer.texts_to_sequences([request.text.lower()])
-    pad = pad_sequences(seq, maxlen=max_text_len)
-    
-    prediction = float(model.predict(pad, verbose=0)[0][0])
-    
-    sentiment = "positive" if prediction >= 0.5 else "negative"
-    confidence = prediction if prediction >= 0.5 else 1 - prediction
+    key = sentiment_cache.key(request.text)
+    prediction, = await sentiment_cache.get_many([key])
+    if prediction is None:
+        try:
+            prediction = float(await sentiment_batcher.submit(request.text))
+        except asyncio.QueueFull:
+            raise HTTPException(status_code=503, detail="Модель перегружена, повторите запрос позже",
+                                headers={"Retry-After": str(SENTIMENT_RETRY_AFTER)})
+        await sentiment_cache.set_many({key: prediction})
     
-    return SentimentResponse(
-        sentiment=sentiment,
-        confidence=round(confidence, 2)
-    )
\ No newline at end of file
+    return to_response(prediction)
+
+
+@router.post("/sentiment/batch", response_model=SentimentBatchResponse)
+async def analyze_sentiment_batch(
+    request: SentimentBatchRequest,
+    stream: bool = Query(False, description="Отдавать результаты построчно в NDJSON по мере готовности")
+    ):
+    """
+    Пакетный анализ тональности: до 5000 текстов за запрос, результаты в порядке текстов.
+    Тексты токенизируются разом и проходят через модель кусками по BATCH_CHUNK_SIZE.
+    С stream=true ответ - NDJSON, по строке {"index", "sentiment", "confidence"} на текст.
+    """
+    if model is None or tokenizer is None:
+        raise HTTPException(status_code=500, detail="Модель не загружена")
+
+    global batch_jobs
+    if batch_jobs >= settings.SENTIMENT_BATCH_JOBS:
+        raise HTTPException(status_code=503, detail="Модель перегружена, повторите запрос позже",
+                            headers={"Retry-After": str(SENTIMENT_RETRY_AFTER)})
+    # Слот занимается до return: поток NDJSON начнёт считать уже после ответа, освободит слот сам ответ,
+    # даже если поток так и не начался
+    batch_jobs += 1
+
+    if stream:
+        return ClosingStreamingResponse(_batch_lines(request.texts), on_close=_release_batch_job,
+                                        media_type="application/x-ndjson")
+
+    try:
+        results = []
+        async for _, predictions in score_texts(request.texts):
+            results.extend(to_response(float(p)) for p in predictions)
+    finally:
+        _release_batch_job()
+    return SentimentBatchResponse(results=results)
+
+
+@router.get("/sentiment/metrics")
+async def get_sentiment_metrics():
+    """
+    Размеры пакетов, задержка в очереди модели, число пакетных задач и попадания в кеш для текущего воркера
+    """
+    return sentiment_batcher.metrics() | {"batch_jobs": batch_jobs, "cache": sentiment_cache.metrics()}
@@ -1,11 +1,11 @@
 from fastapi import APIRouter, Depends
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func
+from sqlalchemy import select
 
 from app.core.db_depends import get_session_db
-from app.models.posts import Post as PostModel
-from app.models.comments import Comment as CommentModel
-from app.models.tags import Tag, post_tags
+from app.core.cache import cache_stats
+from app.core.stats import read_counters, PUBLISHED_POSTS, COMMENTS
+from app.models.tags import Tag
 
 router = APIRouter(prefix="/api", tags=["stats"])
 
@@ -17,19 +17,15 @@ async def get_stats(db: AsyncSession = Depends(get_session_db)):
         общее количество статей
         общее количество комментариев;
         самые популярные теги.
+    Все значения — готовые счётчики, которые обновляются при записи статей и комментариев.
     """
-    all_posts = await db.scalar(select(func.count(PostModel.id)).where(PostModel.status == "published"))
+    counters = await read_counters(db, PUBLISHED_POSTS, COMMENTS)
     
-    all_comments = await db.scalar(select(func.count(CommentModel.id)))
+    populars_tags = await db.execute(select(Tag.name, Tag.slug, Tag.published_count.label("count"))
+                                     .where(Tag.published_count > 0)
+                                     .order_by(Tag.published_count.desc()).limit(10))
     
-    populars_tags = await db.execute(select(Tag.name, Tag.slug, func.count(post_tags.c.post_id)
-                                            .label("count"))
-                                     .join(post_tags, Tag.id == post_tags.c.tag_id)
-                                     .join(PostModel, PostModel.id == post_tags.c.post_id)
-                                     .where(PostModel.status == "published").group_by(Tag.id)
-                                     .order_by(func.count(post_tags.c.post_id).desc()).limit(10))
-    
-    return {"total_posts": all_posts, "total_comments": all_comments, 
+    return {"total_posts": counters[PUBLISHED_POSTS], "total_comments": counters[COMMENTS], 
             "popular_tags":[{"name":row.name, "slug":row.slug, "count":row.count} for row in populars_tags]}
 
 
@@ -39,11 +35,16 @@ async def get_tag_cload(db: AsyncSession = Depends(get_session_db)):
     """
     Возвращает все теги "published" статей
     """
-    tags = await db.execute(select(Tag.name, Tag.slug, func.count(post_tags.c.post_id).label("count"))
-                            .join(post_tags, Tag.id == post_tags.c.tag_id).join(PostModel, PostModel.id == post_tags.c.post_id)
-                            .where(PostModel.status == "published")
-                            .group_by(Tag.id)
-                            .order_by(func.count(post_tags.c.post_id).desc()))
+    tags = await db.execute(select(Tag.name, Tag.slug, Tag.published_count.label("count"))
+                            .where(Tag.published_count > 0)
+                            .order_by(Tag.published_count.desc()))
     
     return {"tags":[{"name":row.name, "slug":row.slug, "count":row.count} for row in tags]}
 
+
+@router.get("/stats/cache")
+async def get_cache_stats():
+    """
+    Возвращает попадания/промахи кеша по тегам (author:*, tag:*, posts) для текущего воркера
+    """
+    return {"tags": cache_stats()}
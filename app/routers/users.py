@@ -1,46 +1,81 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
+from sqlalchemy.orm import selectinload, defer
 
 from app.models.users import User as UserModel
 from app.models.posts import Post as PostModel
 from app.core.db_depends import get_session_db
-from app.schemas import User
+from app.schemas import User, PostShort, CursorPage
+from app.core.pagination import keyset_query, keyset_page
 
 router = APIRouter(prefix="/api/users", tags=["users"])
 
 
-@router.get("/", response_model=list[User])
+@router.get("/", response_model=list[User] | CursorPage[User])
 async def get_all_users(page: int = Query(1, ge=1),
                         page_size: int = Query(10, ge=1, le=100),
+                        cursor: str | None = Query(None, description="Курсор страницы (пустой — первая страница)"),
                         db: AsyncSession = Depends(get_session_db)):
     """
-    Возвращает список всех профилей пользователей 
+    Возвращает список всех профилей пользователей в порядке регистрации.
+    С параметром cursor включается keyset-пагинация по (date_joined, id).
     """
-    all_users = await db.scalars(select(UserModel).where(UserModel.is_active == True).
+    stmt = select(UserModel).where(UserModel.is_active == True)
+    if cursor is not None:
+        stmt = keyset_query(stmt, UserModel.date_joined, UserModel.id, cursor, page_size, descending=False)
+        users = (await db.scalars(stmt)).all()
+        items, next_cursor, prev_cursor = keyset_page(users, cursor, page_size, created_attr="date_joined")
+        return CursorPage[User](items=items, next_cursor=next_cursor, prev_cursor=prev_cursor)
+
+    all_users = await db.scalars(stmt.order_by(UserModel.date_joined, UserModel.id).
                                  offset((page - 1) * page_size)
                                  .limit(page_size))
     return all_users.all()
 
 
-@router.get("/{username}/posts")
+@router.get("/{username}/posts", response_model=list[PostShort] | CursorPage[PostShort])
 async def get_user_posts_by_username(username: str, 
                                      page: int = Query(1, ge=1),
                                      page_size: int = Query(10, ge=1, le=100),
+                                     cursor: str | None = Query(None, description="Курсор страницы (пустой — первая страница)"),
                                      db: AsyncSession = Depends(get_session_db)):
     """
-    Возвращает список статей пользователя по его username
+    Возвращает список статей пользователя по его username, новые первыми.
+    С параметром cursor включается keyset-пагинация по (created_at, id).
     """
     user = await db.scalar(select(UserModel).where(UserModel.username == username, UserModel.is_active == True))
     
     if user is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Пользователь не найден")
 
-    posts_user = await db.scalars(select(PostModel).where(user.id == PostModel.author_id, PostModel.status == "published")
-                                    .offset((page - 1) * page_size).limit(page_size))
-    
-    
-    return posts_user.all()
+    stmt = (select(PostModel).options(defer(PostModel.content), selectinload(PostModel.tags))
+            .where(user.id == PostModel.author_id, PostModel.status == "published"))
+    if cursor is not None:
+        stmt = keyset_query(stmt, PostModel.created_at, PostModel.id, cursor, page_size)
+    else:
+        stmt = (stmt.order_by(PostModel.created_at.desc(), PostModel.id.desc())
+                .offset((page - 1) * page_size).limit(page_size))
+    posts_user = (await db.scalars(stmt)).all()
+    if cursor is not None:
+        posts_user, next_cursor, prev_cursor = keyset_page(posts_user, cursor, page_size)
+
+    results = [PostShort(id=post.id,
+                         title=post.title,
+                         slug=post.slug,
+                         author=user,
+                         created_at=post.created_at,
+                         status=post.status,
+                         view_count=post.view_count,
+                         tags=post.tags,
+                         preview=post.preview,
+                         word_count=post.word_count,
+                         reading_time=post.reading_time,
+                         comment_count=post.comment_count)
+               for post in posts_user]
+    if cursor is not None:
+        return CursorPage[PostShort](items=results, next_cursor=next_cursor, prev_cursor=prev_cursor)
+    return results
 
 @router.get("/{username}", response_model=User)
 async def get_user_by_username(username: str, db: AsyncSession = Depends(get_session_db)):
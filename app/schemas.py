@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field, EmailStr, ConfigDict, field_validator
-from typing import Annotated
+from typing import Annotated, Generic, TypeVar
 from datetime import datetime
 from fastapi import Form
 
@@ -89,6 +89,15 @@ class Comment(BaseModel):
     parent_id: Annotated[int | None, Field(description="ID комментария родителя")] = None
     
     model_config = ConfigDict(from_attributes=True)
+
+
+class ThreadComment(Comment):
+    """
+    Комментарий в ветке обсуждения.
+
+    Ветка отдаётся плоским списком в порядке обхода дерева, depth — глубина относительно корня ветки.
+    """
+    depth: Annotated[int, Field(description="Глубина относительно корня ветки")]
     
 class PostCreate(BaseModel):
     """
@@ -140,9 +149,20 @@ class PostShort(BaseModel):
     view_count: Annotated[int, Field(description="Кол-во просмотров")]
     tags: Annotated[list[Tag], Field(default_factory=list, description="Список имён тегов")]
     preview: Annotated[str, Field(max_length=200, description="Первые 200 символов текста")]
+    word_count: Annotated[int, Field(description="Кол-во слов")] = 0
+    reading_time: Annotated[int, Field(description="Время чтения в минутах")] = 1
+    comment_count: Annotated[int, Field(description="Кол-во комментариев")] = 0
     
     model_config = ConfigDict(from_attributes=True)
     
+class TrendingPost(PostShort):
+    """
+    Статья в трендах.
+    
+    Используется в GET-запросах.
+    """
+    score: Annotated[float, Field(description="Затухающий счёт просмотров и комментариев в окне")]
+    
 class Post(BaseModel):
     """
     Полная модель статьи с комментариями.
@@ -159,10 +179,69 @@ class Post(BaseModel):
     status: Annotated[str, Field(default="draft", pattern="^(draft|published)$")]
     view_count: Annotated[int, Field(description="Кол-во просмотров")]
     tags: Annotated[list[Tag], Field(default_factory=list, description="Список имён тегов")]
-    comments: Annotated[list[Comment], Field(default_factory=list)]
+    comment_count: Annotated[int, Field(description="Кол-во комментариев")] = 0
+    comments: Annotated[list[Comment], Field(default_factory=list, description="Первые комментарии верхнего уровня")]
     
     model_config = ConfigDict(from_attributes=True)
     
+class PostSentiment(BaseModel):
+    """
+    Сводка тональности комментариев статьи.
+    
+    Используется в GET-запросах.
+    """
+    scored: Annotated[int, Field(description="Кол-во оценённых комментариев")]
+    pending: Annotated[int, Field(description="Кол-во комментариев, ещё не оценённых моделью")]
+    positive: Annotated[int, Field(description="Кол-во позитивных комментариев")]
+    negative: Annotated[int, Field(description="Кол-во негативных комментариев")]
+    average: Annotated[float | None, Field(description="Средняя вероятность позитивного тона")] = None
+    
+class TitleSuggestion(BaseModel):
+    """
+    Подсказка заголовка для строки поиска.
+    
+    Используется в GET-запросах.
+    """
+    title: Annotated[str, Field(description="Название поста")]
+    slug: Annotated[str, Field(description="URL поста")]
+    
+T = TypeVar("T")
+
+class CursorPage(BaseModel, Generic[T]):
+    """
+    Страница списка в режиме курсорной (keyset) пагинации.
+    
+    Используется в GET-запросах с параметром cursor.
+    """
+    items: Annotated[list[T], Field(description="Элементы страницы")]
+    next_cursor: Annotated[str | None, Field(description="Курсор следующей страницы")] = None
+    prev_cursor: Annotated[str | None, Field(description="Курсор предыдущей страницы")] = None
+    
+class FacetCount(BaseModel):
+    """
+    Значение фасета поиска и число совпавших статей с ним.
+    """
+    value: Annotated[str, Field(description="Значение фильтра (slug тега, имя автора, статус)")]
+    label: Annotated[str, Field(description="Подпись для интерфейса")]
+    count: Annotated[int, Field(description="Кол-во статей")]
+    
+class SearchFacets(BaseModel):
+    """
+    Счётчики по всем результатам поиска, а не только по текущей странице.
+    """
+    total: Annotated[int, Field(description="Всего совпадений")] = 0
+    tags: Annotated[list[FacetCount], Field(default_factory=list, description="Самые частые теги")]
+    authors: Annotated[list[FacetCount], Field(default_factory=list, description="Самые частые авторы")]
+    status: Annotated[list[FacetCount], Field(default_factory=list, description="Статусы")]
+    
+class SearchPage(CursorPage[PostShort]):
+    """
+    Страница результатов поиска с фасетами.
+    
+    Используется в GET-запросах с параметром facets.
+    """
+    facets: Annotated[SearchFacets, Field(description="Фасеты по всем совпадениям")]
+    
 class SentimentRequest(BaseModel):
     """
     Модель для передачи текста на анализ тональности.
@@ -184,3 +263,24 @@ class SentimentResponse(BaseModel):
     
 
     
+
+class SentimentBatchRequest(BaseModel):
+    """
+    Модель для пакетного анализа тональности.
+    
+    Используется в POST-запросах.
+    """
+    texts: Annotated[list[Annotated[str, Field(min_length=1)]],
+                     Field(min_length=1, max_length=5000, description="Тексты отзывов, до 5000 за запрос")]
+
+class SentimentBatchItem(SentimentResponse):
+    """
+    Строка NDJSON-ответа пакетного анализа: результат с номером текста в запросе.
+    """
+    index: Annotated[int, Field(description="Номер текста в запросе")]
+
+class SentimentBatchResponse(BaseModel):
+    """
+    Модель ответа пакетного анализа тональности, результаты в порядке текстов запроса.
+    """
+    results: list[SentimentResponse]
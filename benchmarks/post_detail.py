@@ -0,0 +1,84 @@
+"""
+Сравнение загрузки статьи для схемы Post: selectinload (4 запроса) против одного запроса с JSON-агрегацией.
+
+Запуск (БД из .env, должна быть с применёнными миграциями):
+    python -m benchmarks.post_detail --comments 500 --runs 200
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+
+from sqlalchemy import delete, insert, select
+from sqlalchemy.orm import selectinload
+
+from app.core.database import async_engine, async_session_maker
+from app.models import Comment as CommentModel, Post as PostModel, User as UserModel
+from app.routers.posts import get_post_detail
+from app.schemas import Post
+
+
+async def seed(comments: int) -> tuple[int, int]:
+    async with async_session_maker() as db:
+        user = UserModel(username=f"bench-{uuid.uuid4().hex[:8]}", email=f"{uuid.uuid4().hex[:8]}@bench.local",
+                         hashed_password="-")
+        db.add(user)
+        await db.flush()
+        post = PostModel(title="Benchmark post", slug=f"bench-{uuid.uuid4().hex}", content="a" * 2000,
+                         status="published", author_id=user.id)
+        db.add(post)
+        await db.flush()
+        await db.execute(insert(CommentModel), [{"post_id": post.id, "author_id": user.id, "text": f"comment {i}"}
+                                                for i in range(comments)])
+        await db.commit()
+        return user.id, post.id
+
+
+async def load_selectin(post_id: int) -> Post:
+    async with async_session_maker() as db:
+        post = await db.scalar(select(PostModel).options(selectinload(PostModel.tags), selectinload(PostModel.author),
+                                                         selectinload(PostModel.comments).selectinload(CommentModel.author))
+                               .where(PostModel.id == post_id))
+        return Post.model_validate(post)
+
+
+async def load_single(post_id: int) -> Post:
+    async with async_session_maker() as db:
+        return await get_post_detail(db, PostModel.id == post_id)
+
+
+async def measure(loader, post_id: int, runs: int) -> list[float]:
+    await loader(post_id)
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        await loader(post_id)
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+def report(name: str, timings: list[float]) -> None:
+    q = statistics.quantiles(timings, n=100)
+    print(f"{name:<12} p50={q[49]:.2f}ms p99={q[98]:.2f}ms max={max(timings):.2f}ms")
+
+
+async def main(comments: int, runs: int) -> None:
+    async_engine.echo = False
+    user_id, post_id = await seed(comments)
+    try:
+        report("selectinload", await measure(load_selectin, post_id, runs))
+        report("json_agg", await measure(load_single, post_id, runs))
+    finally:
+        async with async_session_maker() as db:
+            await db.execute(delete(UserModel).where(UserModel.id == user_id))
+            await db.commit()
+        await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--comments", type=int, default=500)
+    parser.add_argument("--runs", type=int, default=200)
+    args = parser.parse_args()
+    asyncio.run(main(args.comments, args.runs))
@@ -0,0 +1,100 @@
+"""
+Сравнение режимов /api/search: LIKE по подстроке против полнотекстового поиска по GIN-индексу с ts_rank,
+и задержка подсказок /api/search/suggest по триграммному индексу без кеша (цель — p99 < 10ms).
+
+Запуск (БД из .env, должна быть с применёнными миграциями; сид на 1M статей занимает несколько минут):
+    python -m benchmarks.search --posts 1000000 --runs 50
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+
+from sqlalchemy import delete, text
+
+from app.core.database import async_engine, async_session_maker
+from app.models import User as UserModel
+from app.routers.search import search_post, find_suggestions
+
+WORDS = ("вулкан камчатка маршрут поход рецепт борщ капуста город музей выставка кофе утро дорога поезд море "
+         "горы озеро лес python fastapi postgres индекс запрос кеш очередь сервер релиз тест ошибка отчёт").split()
+
+QUERIES = ("вулкан", "рецепт борщ", '"горы озеро"', "поезд -море", "postgres or fastapi")
+
+PREFIXES = ("ву", "вулк", "рецепт б", "postgr", "кофе ут", "поезд море")
+
+
+async def seed(posts: int) -> int:
+    async with async_session_maker() as db:
+        user = UserModel(username=f"bench-{uuid.uuid4().hex[:8]}", email=f"{uuid.uuid4().hex[:8]}@bench.local",
+                         hashed_password="-")
+        db.add(user)
+        await db.flush()
+        # Тексты собираются из случайных слов словаря на стороне БД, чтобы не гонять 1M строк через драйвер
+        await db.execute(text("""
+            WITH dict AS (SELECT CAST(:words AS text[]) AS words)
+            INSERT INTO posts (title, slug, content, status, author_id, created_at, updated_at, view_count)
+            SELECT (SELECT string_agg(words[1 + floor(random() * cardinality(words))::int], ' ')
+                    FROM generate_series(1, 4 + g % 3)),
+                   'bench-' || :tag || '-' || g,
+                   (SELECT string_agg(words[1 + floor(random() * cardinality(words))::int], ' ')
+                    FROM generate_series(1, 150 + g % 100)),
+                   'published', :author_id, now() - g * interval '1 second', now(), 0
+            FROM generate_series(1, :posts) AS g, dict
+        """), {"words": list(WORDS), "tag": uuid.uuid4().hex[:8], "author_id": user.id, "posts": posts})
+        await db.commit()
+    async with async_engine.connect() as conn:
+        await conn.execute(text("ANALYZE posts"))
+    return user.id
+
+
+async def run_search(q: str, mode: str) -> int:
+    async with async_session_maker() as db:
+        return len(await search_post(q=q, mode=mode, facets=False, page=1, page_size=10, cursor=None, db=db))
+
+
+async def run_suggest(prefix: str, _mode: str) -> int:
+    async with async_session_maker() as db:
+        return len(await find_suggestions(db, prefix, 8))
+
+
+async def measure(run, q: str, mode: str, runs: int) -> list[float]:
+    await run(q, mode)
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        await run(q, mode)
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+def report(name: str, timings: list[float]) -> None:
+    q = statistics.quantiles(timings, n=100)
+    print(f"{name:<32} p50={q[49]:.2f}ms p99={q[98]:.2f}ms max={max(timings):.2f}ms")
+
+
+async def main(posts: int, runs: int) -> None:
+    async_engine.echo = False
+    started = time.perf_counter()
+    user_id = await seed(posts)
+    print(f"seeded {posts} posts in {time.perf_counter() - started:.1f}s")
+    try:
+        for q in QUERIES:
+            for mode in ("like", "fts"):
+                report(f"{mode} {q}", await measure(run_search, q, mode, runs))
+        for prefix in PREFIXES:
+            report(f"suggest {prefix}", await measure(run_suggest, prefix, "trgm", runs))
+    finally:
+        async with async_session_maker() as db:
+            await db.execute(delete(UserModel).where(UserModel.id == user_id))
+            await db.commit()
+        await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--posts", type=int, default=1_000_000)
+    parser.add_argument("--runs", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(main(args.posts, args.runs))
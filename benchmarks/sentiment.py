@@ -0,0 +1,87 @@
+"""
+Сравнение инференса модели тональности: Keras (TensorFlow) против NumpyModel на весах из app.ml.export.
+Каждый движок меряется в отдельном свежем процессе: время старта (импорт + загрузка модели), RSS после загрузки
+и задержка одного пакета разного размера.
+
+Запуск (нужны model/sentiment_model.keras, экспорт в model/sentiment_numpy и pip install -r requirements-export.txt):
+    python -m benchmarks.sentiment --runs 50
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+
+BATCH_SIZES = (1, 32, 256)
+MAX_LEN = 100
+
+
+def rss_mb() -> float:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def load(engine: str, keras_path: str, numpy_path: str):
+    if engine == "keras":
+        from tensorflow.keras.models import load_model
+
+        model = load_model(keras_path)
+        return model.predict_on_batch, model.layers[0].get_config()["input_dim"]
+
+    from app.ml.engine import NumpyModel
+
+    model = NumpyModel.load(numpy_path)
+    return model.predict, model.layers[0].embeddings.shape[0]
+
+
+def child(engine: str, keras_path: str, numpy_path: str, runs: int) -> None:
+    started = time.perf_counter()
+    predict, vocab = load(engine, keras_path, numpy_path)
+    import numpy as np
+
+    x = np.random.default_rng(0).integers(1, vocab, size=(1, MAX_LEN)).astype(np.int32)
+    predict(x)
+    result = {"startup": time.perf_counter() - started, "rss": rss_mb(), "batches": {}}
+    for size in BATCH_SIZES:
+        x = np.random.default_rng(size).integers(1, vocab, size=(size, MAX_LEN)).astype(np.int32)
+        predict(x)
+        timings = []
+        for _ in range(runs):
+            started = time.perf_counter()
+            predict(x)
+            timings.append((time.perf_counter() - started) * 1000)
+        result["batches"][size] = timings
+    print(json.dumps(result))
+
+
+def report(name: str, timings: list[float]) -> None:
+    q = statistics.quantiles(timings, n=100)
+    print(f"{name:<24} p50={q[49]:.2f}ms p99={q[98]:.2f}ms max={max(timings):.2f}ms")
+
+
+def main(keras_path: str, numpy_path: str, runs: int) -> None:
+    for engine in ("keras", "numpy"):
+        output = subprocess.run([sys.executable, "-m", "benchmarks.sentiment", "--child", engine,
+                                 "--keras", keras_path, "--numpy", numpy_path, "--runs", str(runs)],
+                                check=True, capture_output=True, text=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        print(f"{engine}: startup={result['startup']:.2f}s rss={result['rss']:.0f}MB")
+        for size, timings in result["batches"].items():
+            report(f"{engine} batch={size}", timings)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--keras", default="model/sentiment_model.keras")
+    parser.add_argument("--numpy", default="model/sentiment_numpy")
+    parser.add_argument("--runs", type=int, default=50)
+    parser.add_argument("--child", choices=("keras", "numpy"))
+    args = parser.parse_args()
+    if args.child:
+        child(args.child, args.keras, args.numpy, args.runs)
+    else:
+        main(args.keras, args.numpy, args.runs)
@@ -0,0 +1,198 @@
+import asyncio
+import time
+
+import pytest
+import pytest_asyncio
+from fakeredis import FakeAsyncRedis
+from fastapi_cache import FastAPICache
+from fastapi_cache.backends.inmemory import InMemoryBackend
+
+from app.core import cache, cache_backend
+from app.core.cache import tagged_cache
+from app.core.cache_backend import LayeredBackend, LRUCache
+
+
+def counted_endpoint(**cache_options):
+    calls = []
+    release = asyncio.Event()
+
+    @tagged_cache(tags=lambda page: ["posts"], **cache_options)
+    async def endpoint(page: int):
+        calls.append(page)
+        await release.wait()
+        return {"page": page, "call": len(calls)}
+
+    return endpoint, calls, release
+
+
+@pytest_asyncio.fixture
+async def init_cache():
+    async def init(backend):
+        FastAPICache.reset()
+        FastAPICache.init(backend, prefix="test-cache")
+        await FastAPICache.clear()
+
+    yield init
+    FastAPICache.reset()
+
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_run_endpoint_once(init_cache):
+    await init_cache(InMemoryBackend())
+    endpoint, calls, release = counted_endpoint(expire=60)
+
+    requests = asyncio.gather(*(endpoint(page=1) for _ in range(10)))
+    await asyncio.sleep(0.01)
+    release.set()
+
+    assert await requests == [{"page": 1, "call": 1}] * 10
+    assert calls == [1]
+    assert await endpoint(page=1) == {"page": 1, "call": 1}
+
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_across_workers_wait_for_lock(init_cache, fake_redis):
+    await init_cache(LayeredBackend(fake_redis, LRUCache()))
+    endpoint, calls, release = counted_endpoint(expire=60)
+
+    first = asyncio.create_task(endpoint(page=1))
+    await asyncio.sleep(0.01)
+    assert len(await fake_redis.keys("test-cache:*:lock")) == 1
+    # Другой воркер не видит локальный future и упирается в блокировку в Redis
+    cache._inflight.clear()
+    second = asyncio.create_task(endpoint(page=1))
+    await asyncio.sleep(0.01)
+    release.set()
+
+    assert await first == await second == {"page": 1, "call": 1}
+    assert calls == [1]
+    assert await fake_redis.keys("test-cache:*:lock") == []
+
+
+@pytest.mark.asyncio
+async def test_cancelled_leader_hands_recompute_to_waiters(init_cache, fake_redis):
+    await init_cache(LayeredBackend(fake_redis, LRUCache()))
+    endpoint, calls, release = counted_endpoint(expire=60)
+
+    leader = asyncio.create_task(endpoint(page=1))
+    await asyncio.sleep(0.01)
+    waiters = asyncio.gather(*(endpoint(page=1) for _ in range(3)))
+    await asyncio.sleep(0.01)
+    leader.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await leader
+    release.set()
+
+    # Ждущие не отменяются вместе с ведущим, пересчёт — один и без ожидания блокировки отменённого
+    async with asyncio.timeout(1):
+        assert await waiters == [{"page": 1, "call": 2}] * 3
+    assert calls == [1, 1]
+    assert await fake_redis.keys("test-cache:*:lock") == []
+
+
+@pytest.mark.asyncio
+async def test_stale_entry_is_served_while_one_request_refreshes(init_cache, monkeypatch):
+    await init_cache(InMemoryBackend())
+    endpoint, calls, release = counted_endpoint(expire=10, stale=60)
+    release.set()
+    assert await endpoint(page=1) == {"page": 1, "call": 1}
+
+    now = time.time() + 15
+    monkeypatch.setattr(cache.time, "time", lambda: now)
+    release.clear()
+    refresh = asyncio.create_task(endpoint(page=1))
+    await asyncio.sleep(0.01)
+
+    assert [await endpoint(page=1) for _ in range(3)] == [{"page": 1, "call": 1}] * 3
+    assert calls == [1, 1]
+
+    release.set()
+    assert await refresh == {"page": 1, "call": 2}
+    assert await endpoint(page=1) == {"page": 1, "call": 2}
+    assert calls == [1, 1]
+
+
+def test_lru_evicts_least_recently_used_by_count():
+    l1 = LRUCache(max_items=2)
+    l1.set("a", b"1", 60)
+    l1.set("b", b"2", 60)
+    assert l1.get("a") == b"1"
+    l1.set("c", b"3", 60)
+
+    assert len(l1) == 2
+    assert (l1.get("a"), l1.get("b"), l1.get("c")) == (b"1", None, b"3")
+
+
+def test_lru_evicts_by_size_and_skips_oversized_values():
+    l1 = LRUCache(max_bytes=10)
+    l1.set("a", b"x" * 4, 60)
+    l1.set("b", b"x" * 4, 60)
+    l1.set("c", b"x" * 4, 60)
+    assert (l1.get("a"), len(l1)) == (None, 2)
+
+    l1.set("big", b"x" * 11, 60)
+    assert (l1.get("big"), len(l1)) == (None, 2)
+    # Перезапись ключа не считает его размер дважды
+    l1.set("b", b"x" * 6, 60)
+    assert (l1.get("b"), l1.get("c")) == (b"x" * 6, b"x" * 4)
+
+
+def test_lru_expires_entries(monkeypatch):
+    now = time.monotonic()
+    monkeypatch.setattr(cache_backend.time, "monotonic", lambda: now)
+    l1 = LRUCache()
+    l1.set("a", b"1", 10)
+    assert l1.get_with_ttl("a") == (10, b"1")
+
+    now += 10
+    assert l1.get_with_ttl("a") == (0, None)
+    assert len(l1) == 0
+
+
+@pytest.mark.asyncio
+async def test_layered_backend_falls_back_to_memory_when_redis_fails():
+    backend = LayeredBackend(FakeAsyncRedis(connected=False), LRUCache(), retry_after=60)
+
+    await backend.set("key", b"value", 300)
+    assert backend.redis is None
+    assert await backend.get("key") == b"value"
+    assert await backend.get("missing") is None
+    assert await backend.clear(key="key") == 1
+
+    # После retry_after бэкенд снова пробует Redis
+    backend.retry_after = 0
+    backend.mark_down()
+    assert backend.redis is not None
+
+
+@pytest.mark.asyncio
+async def test_layered_backend_reads_through_to_redis(fake_redis):
+    backend = LayeredBackend(fake_redis, LRUCache(), l1_ttl=30)
+    await fake_redis.set("key", b"value", ex=300)
+
+    assert await backend.get_with_ttl("key") == (300, b"value")
+    assert backend.l1.get_with_ttl("key")[0] <= 30
+
+
+@pytest.mark.asyncio
+async def test_layered_backend_invalidates_other_workers(redis_server, fake_redis):
+    writer = LayeredBackend(fake_redis, LRUCache())
+    reader = LayeredBackend(FakeAsyncRedis(server=redis_server), LRUCache())
+    listener = asyncio.create_task(reader.listen())
+    try:
+        while not (await fake_redis.pubsub_numsub(LayeredBackend.channel))[0][1]:
+            await asyncio.sleep(0.01)
+        await writer.set("blog:key", b"old", 300)
+        assert await reader.get("blog:key") == b"old"
+        reader.l1.set("blog:other", b"x", 300)
+
+        await writer.set("blog:key", b"new", 300)
+        await writer.clear(namespace="blog")
+        async with asyncio.timeout(2):
+            while len(reader.l1):
+                await asyncio.sleep(0.01)
+        assert await reader.get("blog:key") is None
+    finally:
+        listener.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await listener
@@ -1,4 +1,18 @@
+import asyncio
+import json
+
+import numpy as np
 import pytest
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app.main import app
+from app.core.db_depends import get_session_db
+from app.core.events import comment_broker
+from app.ml import backfill, scoring
+from app.ml.scoring import CommentScorer, store_scores
+from app.models.comments import Comment as CommentModel
+from app.routers import comments as comments_router
 
 
 async def create_post(auth_client):
@@ -55,4 +69,360 @@ async def test_delete_comment_unauthorized(auth_client):
     reponse_delete = await auth_client.delete(f"/api/comments/{id_comment_from_reponse}", headers = {"Authorization": ""})
     
     assert reponse_delete.status_code == 401
-    assert reponse_delete.json()["detail"] == "Not authenticated"
\ No newline at end of file
+    assert reponse_delete.json()["detail"] == "Not authenticated"
+
+@pytest.mark.asyncio
+async def test_comment_count_and_top_level_comments(auth_client):
+    slug_from_created_post = await create_post(auth_client=auth_client)
+
+    first = await auth_client.post(f"/api/posts/{slug_from_created_post}/comments", json={"text": "a"*30, "parent_id": None})
+    reply = await auth_client.post(f"/api/posts/{slug_from_created_post}/comments", json={"text": "b"*30, "parent_id": first.json()["id"]})
+    await auth_client.post(f"/api/posts/{slug_from_created_post}/comments", json={"text": "c"*30, "parent_id": None})
+
+    post_response = await auth_client.get(f"/api/posts/{slug_from_created_post}", params={"comments_limit": 1})
+
+    assert post_response.json()["comment_count"] == 3
+    assert [c["text"] for c in post_response.json()["comments"]] == ["a"*30]
+
+    await auth_client.delete(f"/api/comments/{reply.json()['id']}")
+    post_response = await auth_client.get(f"/api/posts/{slug_from_created_post}")
+
+    assert post_response.json()["comment_count"] == 2
+    assert [c["text"] for c in post_response.json()["comments"]] == ["a"*30, "c"*30]
+
+
+@pytest.mark.asyncio
+async def test_comment_thread(auth_client):
+    slug_from_created_post = await create_post(auth_client=auth_client)
+    url = f"/api/posts/{slug_from_created_post}/comments"
+
+    root = (await auth_client.post(url, json={"text": "root", "parent_id": None})).json()
+    other = (await auth_client.post(url, json={"text": "other", "parent_id": None})).json()
+    reply = (await auth_client.post(url, json={"text": "reply", "parent_id": root["id"]})).json()
+    await auth_client.post(url, json={"text": "nested", "parent_id": reply["id"]})
+    await auth_client.post(url, json={"text": "other reply", "parent_id": other["id"]})
+
+    thread_response = await auth_client.get(f"{url}/thread")
+
+    assert thread_response.status_code == 200
+    assert [(c["text"], c["depth"]) for c in thread_response.json()] == [
+        ("root", 0), ("reply", 1), ("nested", 2), ("other", 0), ("other reply", 1)]
+
+    subtree_response = await auth_client.get(f"{url}/thread", params={"root_id": root["id"], "max_depth": 1})
+
+    assert [(c["text"], c["depth"]) for c in subtree_response.json()] == [("root", 0), ("reply", 1)]
+
+
+@pytest.mark.asyncio
+async def test_replies_of_deleted_comment_stay_nested(auth_client):
+    slug_from_created_post = await create_post(auth_client=auth_client)
+    url = f"/api/posts/{slug_from_created_post}/comments"
+
+    root = (await auth_client.post(url, json={"text": "root", "parent_id": None})).json()
+    await auth_client.post(url, json={"text": "reply", "parent_id": root["id"]})
+    await auth_client.post(url, json={"text": "other", "parent_id": None})
+    await auth_client.delete(f"/api/comments/{root['id']}")
+
+    post_response = await auth_client.get(f"/api/posts/{slug_from_created_post}")
+    thread_response = await auth_client.get(f"{url}/thread")
+
+    assert [c["text"] for c in post_response.json()["comments"]] == ["other"]
+    assert [(c["text"], c["depth"]) for c in thread_response.json()] == [("reply", 1), ("other", 0)]
+
+
+@pytest.mark.asyncio
+async def test_reply_under_unpathed_parent(auth_client, db_session):
+    slug_from_created_post = await create_post(auth_client=auth_client)
+    url = f"/api/posts/{slug_from_created_post}/comments"
+
+    root = (await auth_client.post(url, json={"text": "root", "parent_id": None})).json()
+    reply = (await auth_client.post(url, json={"text": "reply", "parent_id": root["id"]})).json()
+    # Родитель, до которого ещё не дошло дозаполнение путей
+    await db_session.execute(update(CommentModel).where(CommentModel.id == reply["id"]).values(path=None, depth=0))
+    await db_session.commit()
+    nested = (await auth_client.post(url, json={"text": "nested", "parent_id": reply["id"]})).json()
+
+    row = (await db_session.execute(select(CommentModel.path, CommentModel.depth)
+                                    .where(CommentModel.id == nested["id"]))).one()
+    assert (row.path, row.depth) == (None, 0)
+
+    thread_response = await auth_client.get(f"{url}/thread")
+    post_response = await auth_client.get(f"/api/posts/{slug_from_created_post}")
+
+    assert [(c["text"], c["depth"]) for c in thread_response.json()] == [("root", 0), ("reply", 1), ("nested", 2)]
+    assert [c["text"] for c in post_response.json()["comments"]] == ["root"]
+
+
+@pytest.mark.asyncio
+async def test_comment_write_errors(auth_client):
+    slug_from_created_post = await create_post(auth_client=auth_client)
+    url = f"/api/posts/{slug_from_created_post}/comments"
+
+    missing_post = await auth_client.post("/api/posts/no-such-post/comments", json={"text": "a"*30})
+    missing_parent = await auth_client.post(url, json={"text": "a"*30, "parent_id": 999999})
+    missing_comment = await auth_client.delete("/api/comments/999999")
+
+    assert missing_post.status_code == 404
+    assert missing_parent.status_code == 400
+    assert missing_comment.status_code == 404
+
+    comment_id = (await auth_client.post(url, json={"text": "a"*30})).json()["id"]
+    await auth_client.post("/api/register", data={"username": "stranger", "email": "stranger@example.com",
+                                                  "password": "qwerty"})
+    token = (await auth_client.post("/api/login", data={"username": "stranger", "password": "qwerty"})).json()["access_token"]
+
+    forbidden = await auth_client.delete(f"/api/comments/{comment_id}", headers={"Authorization": f"Bearer {token}"})
+
+    assert forbidden.status_code == 403
+    assert (await auth_client.get(f"/api/posts/{slug_from_created_post}")).json()["comment_count"] == 1
+
+
+@pytest.mark.asyncio
+async def test_created_comment_is_pushed_to_stream(auth_client):
+    slug_from_created_post = await create_post(auth_client=auth_client)
+    post_id = (await auth_client.get(f"/api/posts/{slug_from_created_post}")).json()["id"]
+    subscription = comment_broker.subscribe(post_id)
+
+    try:
+        comment_response = await auth_client.post(f"/api/posts/{slug_from_created_post}/comments", json={"text": "a"*30})
+        event_id, data = subscription.queue.get_nowait()
+    finally:
+        comment_broker.unsubscribe(subscription)
+
+    assert event_id == comment_response.json()["id"]
+    assert json.loads(data)["text"] == "a"*30
+
+
+@pytest.mark.asyncio
+async def test_post_sentiment_aggregates(auth_client, db_session):
+    slug_from_created_post = await create_post(auth_client=auth_client)
+    ids = []
+    for _ in range(3):
+        response = await auth_client.post(f"/api/posts/{slug_from_created_post}/comments", json={"text": "a"*30})
+        ids.append(response.json()["id"])
+
+    await db_session.execute(store_scores({ids[0]: 0.9, ids[1]: 0.2}))
+    await db_session.commit()
+    # Повторная оценка уже оценённого комментария сводку не меняет
+    await db_session.execute(store_scores({ids[0]: 0.1}))
+    await db_session.commit()
+
+    sentiment = (await auth_client.get(f"/api/posts/{slug_from_created_post}/sentiment")).json()
+    assert sentiment == {"scored": 2, "pending": 1, "positive": 1, "negative": 1, "average": 0.55}
+
+    await auth_client.delete(f"/api/comments/{ids[0]}")
+    sentiment = (await auth_client.get(f"/api/posts/{slug_from_created_post}/sentiment")).json()
+    assert sentiment == {"scored": 1, "pending": 1, "positive": 0, "negative": 1, "average": 0.2}
+
+
+def stream_scope(slug, headers=()):
+    """
+    Запрос к потоку комментариев напрямую в ASGI: httpx ждёт конца ответа, а поток бесконечный
+    """
+    path = f"/api/posts/{slug}/comments/stream"
+    return {"type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+            "path": path, "raw_path": path.encode(), "root_path": "", "query_string": b"",
+            "headers": [(b"host", b"test"), *headers], "client": ("127.0.0.1", 1), "server": ("test", 80)}
+
+
+@pytest.mark.asyncio
+async def test_stream_releases_session_before_streaming(auth_client, db_session):
+    slug_from_created_post = await create_post(auth_client=auth_client)
+    session_closed = asyncio.Event()
+
+    async def override_db():
+        try:
+            yield db_session
+        finally:
+            session_closed.set()
+
+    app.dependency_overrides[get_session_db] = override_db
+    started = asyncio.Event()
+    closed_before_body = []
+
+    async def receive():
+        await asyncio.Event().wait()
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            assert message["status"] == 200
+        elif message["type"] == "http.response.body" and not started.is_set():
+            closed_before_body.append(session_closed.is_set())
+            started.set()
+
+    stream = asyncio.create_task(app(stream_scope(slug_from_created_post), receive, send))
+    try:
+        await asyncio.wait_for(started.wait(), 5)
+    finally:
+        stream.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await stream
+
+    assert closed_before_body == [True]
+
+
+@pytest.mark.asyncio
+async def test_stream_unsubscribes_when_client_leaves_before_start(auth_client):
+    slug_from_created_post = await create_post(auth_client=auth_client)
+    post_id = (await auth_client.get(f"/api/posts/{slug_from_created_post}")).json()["id"]
+
+    async def receive():
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        await asyncio.Event().wait()  # клиент не читает ответ
+
+    async with asyncio.timeout(5):
+        await app(stream_scope(slug_from_created_post), receive, send)
+
+    assert post_id not in comment_broker._subscriptions
+
+
+@pytest.mark.asyncio
+async def test_stream_resumes_whole_backlog(auth_client, db_session, monkeypatch):
+    monkeypatch.setattr(comments_router, "STREAM_RESUME_LIMIT", 3)
+    monkeypatch.setattr(comments_router, "async_session_maker", async_sessionmaker(db_session.bind))
+    slug_from_created_post = await create_post(auth_client=auth_client)
+    comments = [(await auth_client.post(f"/api/posts/{slug_from_created_post}/comments",
+                                        json={"text": f"comment {i}"})).json() for i in range(8)]
+    post_id = comments[0]["post_id"]
+    received = []
+    got = asyncio.Event()
+
+    async def receive():
+        await asyncio.Event().wait()
+
+    async def send(message):
+        if message["type"] == "http.response.body":
+            received.extend(int(line[4:]) for line in message["body"].decode().splitlines() if line.startswith("id: "))
+            got.set()
+
+    headers = [(b"last-event-id", str(comments[0]["id"]).encode())]
+    stream = asyncio.create_task(app(stream_scope(slug_from_created_post, headers), receive, send))
+    try:
+        # Пропущенных больше, чем STREAM_RESUME_LIMIT: отдаются все, страницами
+        async with asyncio.timeout(5):
+            while len(received) < 7:
+                await got.wait()
+                got.clear()
+        # Живое событие, уже отданное из БД, отсекается; остальные проходят, даже с меньшим id
+        comment_broker.dispatch(post_id, comments[3]["id"], "{}")
+        comment_broker.dispatch(post_id, comments[0]["id"], "{}")
+        async with asyncio.timeout(5):
+            while len(received) < 8:
+                await got.wait()
+                got.clear()
+    finally:
+        stream.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await stream
+
+    assert received == [comment["id"] for comment in comments[1:]] + [comments[0]["id"]]
+
+
+@pytest.fixture
+def scoring_sessions(db_session, monkeypatch):
+    """
+    Фоновая оценка и дозаполнение открывают свои сессии: направляем их в тестовую БД
+    """
+    sessions = async_sessionmaker(db_session.bind, expire_on_commit=False)
+    monkeypatch.setattr(scoring, "async_session_maker", sessions)
+    monkeypatch.setattr(backfill, "async_session_maker", sessions)
+
+
+def fake_scores(texts):
+    return np.array([0.9 if "good" in text else 0.1 for text in texts], dtype=np.float32)
+
+
+@pytest.mark.asyncio
+async def test_comment_scorer_requeues_failed_batch(auth_client, scoring_sessions):
+    slug_from_created_post = await create_post(auth_client=auth_client)
+    comments = []
+    for text in ("good comment here", "bad comment here", "another good one"):
+        response = await auth_client.post(f"/api/posts/{slug_from_created_post}/comments", json={"text": text})
+        comments.append(response.json())
+
+    available = False
+
+    async def score(texts):
+        if not available:
+            raise RuntimeError("model is busy")
+        return fake_scores(texts)
+
+    scorer = CommentScorer(score)
+    for comment in comments[:2]:
+        scorer.enqueue(comment["id"], comment["text"])
+    with pytest.raises(RuntimeError):
+        await scorer.flush()
+
+    available = True
+    scorer.enqueue(comments[2]["id"], comments[2]["text"])
+    assert await scorer.flush() == 3
+    assert await scorer.flush() == 0
+
+    sentiment = (await auth_client.get(f"/api/posts/{slug_from_created_post}/sentiment")).json()
+    assert sentiment == {"scored": 3, "pending": 0, "positive": 2, "negative": 1, "average": 0.6333}
+
+
+@pytest.mark.asyncio
+async def test_comment_scorer_drops_overflow(auth_client, scoring_sessions, caplog):
+    slug_from_created_post = await create_post(auth_client=auth_client)
+    comments = []
+    for text in ("good comment here", "bad comment here", "another good one", "one more good"):
+        response = await auth_client.post(f"/api/posts/{slug_from_created_post}/comments", json={"text": text})
+        comments.append(response.json())
+
+    available = False
+
+    async def score(texts):
+        if not available:
+            # Пока модель считала, пришёл ещё один комментарий
+            scorer.enqueue(comments[3]["id"], comments[3]["text"])
+            raise RuntimeError("model is busy")
+        return fake_scores(texts)
+
+    scorer = CommentScorer(score, max_pending=2)
+    for comment in comments[:3]:
+        scorer.enqueue(comment["id"], comment["text"])
+    # Возвращённый после ошибки пакет тоже не раздувает очередь: лишние — самые новые
+    with pytest.raises(RuntimeError):
+        await scorer.flush()
+
+    available = True
+    assert await scorer.flush() == 2
+    messages = [record.message for record in caplog.records if record.name == "app.ml.scoring"]
+    assert len(messages) == 2
+    assert messages[0].startswith("Очередь оценки тональности переполнена (2)")
+    assert messages[1].endswith(": 2")
+
+    # Отброшенные оценит дозаполнение
+    sentiment = (await auth_client.get(f"/api/posts/{slug_from_created_post}/sentiment")).json()
+    assert sentiment == {"scored": 2, "pending": 2, "positive": 1, "negative": 1, "average": 0.5}
+
+
+@pytest.mark.asyncio
+async def test_backfill_scores_only_missing_comments(auth_client, db_session, scoring_sessions, monkeypatch):
+    slug_from_created_post = await create_post(auth_client=auth_client)
+    ids = []
+    for text in ("good & fine", "bad one here", "so good", "meh, bad", "not bad, good"):
+        response = await auth_client.post(f"/api/posts/{slug_from_created_post}/comments", json={"text": text})
+        ids.append(response.json()["id"])
+    await db_session.execute(store_scores({ids[1]: 0.5}))
+    await db_session.commit()
+
+    seen = []
+
+    def predict_batch(texts):
+        seen.append(texts)
+        return fake_scores(texts)
+
+    monkeypatch.setattr(backfill, "model", object())
+    monkeypatch.setattr(backfill, "predict_batch", predict_batch)
+
+    assert await backfill.backfill(batch_size=2) == 4
+    # Модель получает исходный текст, а не экранированный для HTML
+    assert seen == [["good & fine", "so good"], ["meh, bad", "not bad, good"]]
+    assert await backfill.backfill(batch_size=2) == 0
+
+    sentiment = (await auth_client.get(f"/api/posts/{slug_from_created_post}/sentiment")).json()
+    assert sentiment == {"scored": 5, "pending": 0, "positive": 4, "negative": 1, "average": 0.66}
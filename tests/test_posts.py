@@ -1,5 +1,8 @@
 import pytest
 
+from app.routers import posts as posts_router
+from app.routers.posts import allocate_slug
+
 
 @pytest.mark.asyncio()
 async def test_create_post_authorized(auth_client):
@@ -75,4 +78,87 @@ async def test_delete_post_unauthorized(auth_client, client):
         headers={"Authorization": ""}
     )
     assert response.status_code == 401
-    assert response.json()["detail"] == "Not authenticated"
\ No newline at end of file
+    assert response.json()["detail"] == "Not authenticated"
+
+@pytest.mark.asyncio()
+async def test_get_post_by_slug_counts_views(auth_client):
+    created_post = await auth_client.post("/api/posts/", json={
+    "title":"BOO ISPUGALSYA? DONT BE AFRAID:)",
+    "content": "a" * 100,
+    "status": "published",
+    "tags": []
+    })
+    slug = created_post.json()["slug"]
+
+    await auth_client.get(f"/api/posts/{slug}")
+    response = await auth_client.get(f"/api/posts/{slug}")
+
+    assert response.status_code == 200
+    assert response.json()["view_count"] == 2
+    
+@pytest.mark.asyncio()
+async def test_posts_list_cache_invalidated_on_publish(auth_client):
+    assert (await auth_client.get("/api/posts/")).json() == []
+
+    await auth_client.post("/api/posts/", json={
+    "title":"BOO ISPUGALSYA? DONT BE AFRAID:)",
+    "content": "a" * 100,
+    "status": "published",
+    "tags": []
+    })
+    posts_responese = await auth_client.get("/api/posts/")
+
+    assert len(posts_responese.json()) == 1
+
+
+@pytest.mark.asyncio()
+async def test_create_and_update_post_tags(auth_client):
+    first_post = await auth_client.post("/api/posts/", json={
+        "title": "BOO ISPUGALSYA? DONT BE AFRAID:)",
+        "content": "a" * 100,
+        "status": "published",
+        "tags": ["python", "fastapi", "python"]
+    })
+    second_post = await auth_client.post("/api/posts/", json={
+        "title": "BOO ISPUGALSYA? DONT BE AFRAID:)",
+        "content": "a" * 100,
+        "status": "published",
+        "tags": ["python"]
+    })
+
+    assert sorted(tag["name"] for tag in first_post.json()["tags"]) == ["fastapi", "python"]
+    assert second_post.json()["tags"][0]["id"] == next(tag["id"] for tag in first_post.json()["tags"]
+                                                      if tag["name"] == "python")
+
+    updated_post = await auth_client.put(f'/api/posts/{first_post.json()["slug"]}', json={"tags": ["fastapi", "docker"]})
+
+    assert updated_post.status_code == 200
+    assert sorted(tag["name"] for tag in updated_post.json()["tags"]) == ["docker", "fastapi"]
+
+
+@pytest.mark.asyncio()
+async def test_create_post_allocates_free_slug(auth_client, monkeypatch):
+    async def create(title):
+        response = await auth_client.post("/api/posts/", json={
+            "title": title, "content": "a" * 100, "status": "published", "tags": []
+        })
+        assert response.status_code == 201
+        return response.json()["slug"]
+
+    assert await create("Weekly update") == "weekly-update"
+    assert await create("Weekly update") == "weekly-update-1"
+    # Число в конце заголовка неотличимо от суффикса: следующий номер берётся после него
+    assert await create("Weekly update 7") == "weekly-update-7"
+    assert await create("Weekly update") == "weekly-update-8"
+
+    # Slug, занятый между подбором и INSERT, откатывает только savepoint и подбирается заново
+    allocated = []
+
+    async def racing_allocate_slug(db, base_slug):
+        slug = base_slug if not allocated else await allocate_slug(db, base_slug)
+        allocated.append(slug)
+        return slug
+
+    monkeypatch.setattr(posts_router, "allocate_slug", racing_allocate_slug)
+    assert await create("Weekly update") == "weekly-update-9"
+    assert allocated == ["weekly-update", "weekly-update-9"]
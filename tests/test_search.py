@@ -0,0 +1,62 @@
+import pytest
+
+
+async def create_post(auth_client, title, content, tags=()):
+    response = await auth_client.post("/api/posts/", json={
+        "title": title,
+        "content": content,
+        "status": "published",
+        "tags": list(tags)
+    })
+    return response.json()["slug"]
+
+
+@pytest.mark.asyncio
+async def test_search_ranks_title_above_content(auth_client):
+    in_content = await create_post(auth_client, "Заметки о поездке", "Весь день смотрели на вулканы " * 5)
+    in_title = await create_post(auth_client, "Вулканы Камчатки", "Фотографии и маршрут похода " * 5)
+    await create_post(auth_client, "Рецепт борща", "Свекла, капуста и картофель " * 5)
+
+    search_response = await auth_client.get("/api/search", params={"q": "вулкан"})
+
+    assert search_response.status_code == 200
+    assert [post["slug"] for post in search_response.json()] == [in_title, in_content]
+
+
+@pytest.mark.asyncio
+async def test_search_like_mode(auth_client):
+    slug = await create_post(auth_client, "Вулканы Камчатки", "Фотографии и маршрут похода " * 5)
+
+    fts_response = await auth_client.get("/api/search", params={"q": "улкан"})
+    like_response = await auth_client.get("/api/search", params={"q": "улкан", "mode": "like"})
+
+    assert fts_response.json() == []
+    assert [post["slug"] for post in like_response.json()] == [slug]
+
+
+@pytest.mark.asyncio
+async def test_suggest_titles(auth_client):
+    by_prefix = await create_post(auth_client, "Вулканы Камчатки", "Фотографии и маршрут похода " * 5)
+    by_similarity = await create_post(auth_client, "Путешествие к вулканам", "Фотографии и маршрут похода " * 5)
+    await create_post(auth_client, "Рецепт борща", "Свекла, капуста и картофель " * 5)
+
+    suggest_response = await auth_client.get("/api/search/suggest", params={"q": "  ВУЛКАН "})
+
+    assert suggest_response.status_code == 200
+    assert [item["slug"] for item in suggest_response.json()] == [by_prefix, by_similarity]
+
+
+@pytest.mark.asyncio
+async def test_search_facets(auth_client):
+    await create_post(auth_client, "Вулканы Камчатки", "Фотографии и маршрут похода " * 5, tags=["Камчатка", "Горы"])
+    await create_post(auth_client, "Вулканы и гейзеры", "Фотографии и маршрут похода " * 5, tags=["Горы"])
+    await create_post(auth_client, "Рецепт борща", "Свекла, капуста и картофель " * 5, tags=["Еда"])
+
+    search_response = await auth_client.get("/api/search", params={"q": "вулкан", "facets": True, "page_size": 1})
+    facets = search_response.json()["facets"]
+
+    assert len(search_response.json()["items"]) == 1
+    assert facets["total"] == 2
+    assert [(tag["label"], tag["count"]) for tag in facets["tags"]] == [("Горы", 2), ("Камчатка", 1)]
+    assert [(author["value"], author["count"]) for author in facets["authors"]] == [("testuser", 2)]
+    assert [(status["value"], status["count"]) for status in facets["status"]] == [("published", 2)]
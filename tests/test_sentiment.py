@@ -0,0 +1,347 @@
+import asyncio
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pytest
+from fastapi import HTTPException
+
+from app.core.cache_backend import LRUCache
+from app.core.config import settings
+from app.ml.batching import MicroBatcher
+from app.ml.cache import SentimentCache
+from app.ml.engine import MANIFEST, NumpyModel, pad_sequences
+from app.ml.tokenizer import Tokenizer
+from app.routers import sentiment as sentiment_router
+from app.schemas import SentimentBatchRequest
+
+
+@pytest.mark.asyncio
+async def test_batcher_groups_concurrent_requests():
+    calls = []
+
+    def predict(items):
+        calls.append(list(items))
+        return [item * 2 for item in items]
+
+    batcher = MicroBatcher(predict, max_batch_size=4, max_wait=0.05)
+    try:
+        results = await asyncio.gather(*(batcher.submit(i) for i in range(10)))
+    finally:
+        await batcher.stop()
+
+    assert results == [i * 2 for i in range(10)]
+    assert [len(call) for call in calls] == [4, 4, 2]
+    metrics = batcher.metrics()
+    assert metrics["batches"] == 3
+    assert metrics["items"] == 10
+    assert metrics["batch_sizes"] == {2: 1, 4: 2}
+    assert metrics["queue_delay_ms"]["max"] is not None
+
+
+@pytest.mark.asyncio
+async def test_batcher_propagates_errors():
+    def predict(items):
+        raise ValueError("broken model")
+
+    batcher = MicroBatcher(predict, max_batch_size=8, max_wait=0.001)
+    try:
+        with pytest.raises(ValueError):
+            await batcher.submit("text")
+        # Ошибка пакета не останавливает обработку следующих
+        batcher._predict = lambda items: [len(item) for item in items]
+        assert await batcher.submit("text") == 4
+    finally:
+        await batcher.stop()
+
+
+@pytest.mark.asyncio
+async def test_batcher_rejects_when_queue_is_full():
+    release = threading.Event()
+
+    def predict(items):
+        release.wait(5)
+        return items
+
+    executor = ThreadPoolExecutor(max_workers=1)
+    batcher = MicroBatcher(predict, max_batch_size=1, max_wait=0, max_queue=2, executor=executor)
+    try:
+        running = asyncio.create_task(batcher.submit("running"))
+        # Первый запрос уходит в модель, следующие два занимают очередь
+        while not batcher.batch_sizes:
+            await asyncio.sleep(0.001)
+        queued = [asyncio.create_task(batcher.submit(i)) for i in range(2)]
+        await asyncio.sleep(0.01)
+        with pytest.raises(asyncio.QueueFull):
+            await batcher.submit("rejected")
+        assert batcher.metrics()["rejected"] == 1
+
+        release.set()
+        assert await running == "running"
+        assert await asyncio.gather(*queued) == [0, 1]
+    finally:
+        release.set()
+        await batcher.stop()
+        executor.shutdown()
+
+
+def save_model(path, layers):
+    """
+    Пишет модель в формате app.ml.export из списка (класс, настройки, веса)
+    """
+    specs = []
+    for i, (name, config, weights) in enumerate(layers):
+        files = []
+        for j, w in enumerate(weights):
+            files.append(f"{i:02d}_{j}.npy")
+            np.save(path / files[-1], np.asarray(w, dtype=np.float32))
+        specs.append({"class": name, "name": name.lower(), "config": config, "weights": files})
+    (path / MANIFEST).write_text(json.dumps({"format": 1, "source_sha256": "test", "layers": specs}))
+    return NumpyModel.load(path)
+
+
+def test_pad_sequences_matches_keras_defaults():
+    assert pad_sequences([[1, 2], [], [1, 2, 3, 4, 5]], maxlen=3).tolist() == [[0, 1, 2], [0, 0, 0], [3, 4, 5]]
+
+
+def test_numpy_model_ignores_masked_padding(tmp_path):
+    rng = np.random.default_rng(0)
+    vocab, dim, units = 50, 8, 6
+    model = save_model(tmp_path, [
+        ("Embedding", {"mask_zero": True}, [rng.normal(size=(vocab, dim))]),
+        ("Bidirectional", {
+            "merge_mode": "concat",
+            "forward": {"class": "LSTM", "config": {"units": units, "return_sequences": True}},
+            "backward": {"class": "LSTM", "config": {"units": units, "return_sequences": True,
+                                                     "go_backwards": True}},
+        }, [rng.normal(size=(dim, 4 * units)), rng.normal(size=(units, 4 * units)), rng.normal(size=4 * units)] * 2),
+        ("GRU", {"units": units}, [rng.normal(size=(2 * units, 3 * units)), rng.normal(size=(units, 3 * units)),
+                                   rng.normal(size=(2, 3 * units))]),
+        ("Dense", {"activation": "sigmoid"}, [rng.normal(size=(units, 1)), rng.normal(size=1)]),
+    ])
+    seqs = [[5, 7, 9], [1, 2, 3, 4, 5, 6], [42]]
+
+    short, long = model.predict(pad_sequences(seqs, 6)), model.predict(pad_sequences(seqs, 20))
+
+    assert short.shape == (3, 1)
+    assert np.all((short > 0) & (short < 1))
+    np.testing.assert_allclose(short, long, rtol=1e-5)
+
+
+def assert_matches_keras(keras_model, model_path, out):
+    from app.ml.export import export
+
+    export(model_path, out)
+    model = NumpyModel.load(out)
+    vocab = keras_model.layers[0].get_config()["input_dim"]
+    rng = np.random.default_rng(1)
+    seqs = [rng.integers(1, vocab, size=length).tolist() for length in (1, 5, 40, 100, 300)]
+    x = pad_sequences(seqs, 100)
+
+    np.testing.assert_allclose(model.predict(x), keras_model.predict(x, verbose=0), atol=1e-4)
+
+
+def test_numpy_model_matches_keras(tmp_path):
+    keras = pytest.importorskip("tensorflow").keras
+    keras_model = keras.Sequential([
+        keras.Input(shape=(100,)),
+        keras.layers.Embedding(500, 16, mask_zero=True),
+        keras.layers.Bidirectional(keras.layers.LSTM(8, return_sequences=True)),
+        keras.layers.GRU(8),
+        keras.layers.Dropout(0.5),
+        keras.layers.Dense(1, activation="sigmoid"),
+    ])
+    keras_model.save(tmp_path / "model.keras")
+
+    assert_matches_keras(keras_model, tmp_path / "model.keras", tmp_path / "numpy")
+
+
+def test_exported_sentiment_model_matches_keras(tmp_path):
+    keras = pytest.importorskip("tensorflow").keras
+    model_path = Path("model/sentiment_model.keras")
+    if not model_path.exists():
+        pytest.skip("model/sentiment_model.keras не найден")
+
+    assert_matches_keras(keras.models.load_model(model_path), model_path, tmp_path)
+
+
+TOKENIZER_CORPUS = [
+    "This movie was GREAT!!! Great, great acting.",
+    "«Отличный» фильм — смотреть всем",
+    "don't\tstop\nme now... (please)",
+    "non\xa0breaking space stays inside a word",
+    "rare words beyond num_words are dropped",
+    "",
+    "   ...   ",
+]
+
+
+def test_tokenizer_export(tmp_path):
+    from app.ml.export import write_tokenizer
+
+    word_index = {"great": 1, "movie": 2, "фильм": 3, "don't": 4, "me": 5, "breaking": 6, "rare": 7}
+    write_tokenizer({"word_index": word_index, "num_words": 7, "filters": '!"#$%&()*+,-./:;<=>?@[\\]^_`{|}~\t\n«»—',
+                     "split": " ", "lower": True, "char_level": False, "oov_token": None}, tmp_path, "test")
+    tokenizer = Tokenizer.load(tmp_path)
+
+    assert tokenizer.texts_to_sequences(TOKENIZER_CORPUS) == [[2, 1, 1, 1], [3], [4, 5], [], [], [], []]
+    assert tokenizer.encode(TOKENIZER_CORPUS[:3], 3).tolist() == [[1, 1, 1], [0, 0, 3], [0, 4, 5]]
+
+
+def test_tokenizer_matches_keras(tmp_path):
+    pytest.importorskip("tensorflow")
+    import pickle
+    from app.ml.export import export_tokenizer
+
+    with open("model/tokenizer.pkl", "rb") as f:
+        keras_tokenizer = pickle.load(f)
+    export_tokenizer("model/tokenizer.pkl", tmp_path)
+    tokenizer = Tokenizer.load(tmp_path)
+    words = sorted(keras_tokenizer.word_index, key=keras_tokenizer.word_index.get)[:20_000]
+    rng = np.random.default_rng(2)
+    separators = [" ", "  ", ", ", "!", "...", "\t", "\xa0", " — ", "«", "» "]
+    corpus = TOKENIZER_CORPUS + [
+        "".join(str(word).upper() if i % 7 == 0 else str(word) + str(rng.choice(separators))
+                for i, word in enumerate(rng.choice(words, size=length)))
+        for length in rng.integers(0, 300, size=500)
+    ]
+
+    expected = keras_tokenizer.texts_to_sequences(corpus)
+    assert tokenizer.texts_to_sequences(corpus) == expected
+    assert np.array_equal(tokenizer.encode(corpus, 100), pad_sequences(expected, 100))
+
+
+@pytest.mark.asyncio
+async def test_sentiment_cache_keys_and_hit_ratio():
+    cache = SentimentCache(None, LRUCache(max_items=10), "v1", ttl=60)
+    key = cache.key("Great  POST!")
+
+    assert key == cache.key("great post!")
+    assert key != cache.key("great\xa0post!")
+    assert key != SentimentCache(None, LRUCache(), "v2", ttl=60).key("great post!")
+
+    assert await cache.get_many([key]) == [None]
+    await cache.set_many({key: np.float32(0.75)})
+    assert await cache.get_many([key, cache.key("other")]) == [0.75, None]
+    assert cache.metrics() == {"l1_hits": 1, "l2_hits": 0, "misses": 2, "hit_ratio": 0.3333, "version": "v1"}
+
+
+@pytest.fixture
+def stub_model(monkeypatch):
+    """
+    Модель-заглушка: вероятность — число известных словарю слов текста, делённое на 10
+    """
+    calls = []
+
+    def predict_padded(pad):
+        calls.append(len(pad))
+        return (pad != 0).sum(axis=1).astype(np.float32) / 10
+
+    monkeypatch.setattr(sentiment_router, "model", object())
+    monkeypatch.setattr(sentiment_router, "tokenizer", Tokenizer.load("model/sentiment_tokenizer"))
+    monkeypatch.setattr(sentiment_router, "predict_padded", predict_padded)
+    monkeypatch.setattr(sentiment_router, "sentiment_cache", SentimentCache(None, LRUCache(), "test", ttl=60))
+    monkeypatch.setattr(sentiment_router, "BATCH_CHUNK_SIZE", 2)
+    return calls
+
+
+BATCH_TEXTS = ["good", "good good good good good good", "good good", "good good good good good good good",
+               "good good good"]
+BATCH_RESULTS = [{"sentiment": "negative", "confidence": 0.9}, {"sentiment": "positive", "confidence": 0.6},
+                 {"sentiment": "negative", "confidence": 0.8}, {"sentiment": "positive", "confidence": 0.7},
+                 {"sentiment": "negative", "confidence": 0.7}]
+
+
+@pytest.mark.asyncio
+async def test_sentiment_batch_keeps_order_across_chunks(client, stub_model):
+    await sentiment_router.sentiment_cache.set_many({sentiment_router.sentiment_cache.key("good good"): 0.2})
+
+    response = await client.post("/api/sentiment/batch", json={"texts": BATCH_TEXTS})
+
+    assert response.status_code == 200
+    assert response.json()["results"] == BATCH_RESULTS
+    # Текст из кеша в модель не идёт, остальные — кусками по BATCH_CHUNK_SIZE
+    assert stub_model == [2, 2]
+    assert sentiment_router.batch_jobs == 0
+
+
+@pytest.mark.asyncio
+async def test_sentiment_batch_stream(client, stub_model):
+    response = await client.post("/api/sentiment/batch", params={"stream": True}, json={"texts": BATCH_TEXTS})
+
+    assert response.headers["content-type"] == "application/x-ndjson"
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert lines == [{**result, "index": i} for i, result in enumerate(BATCH_RESULTS)]
+    assert stub_model == [2, 2, 1]
+    assert sentiment_router.batch_jobs == 0
+
+
+async def send_response(response, receive=None, send=None) -> str:
+    """
+    Отдаёт ответ так, как его отдаёт сервер, и возвращает отправленное тело
+    """
+    body = []
+
+    async def wait_forever():
+        await asyncio.Event().wait()
+
+    async def collect(message):
+        if message["type"] == "http.response.body":
+            body.append(message.get("body", b""))
+
+    scope = {"type": "http", "asgi": {"version": "3.0", "spec_version": "2.0"}, "method": "POST"}
+    await response(scope, receive or wait_forever, send or collect)
+    return b"".join(body).decode()
+
+
+@pytest.mark.asyncio
+async def test_sentiment_batch_jobs_limit_includes_streams(stub_model, monkeypatch):
+    monkeypatch.setattr(sentiment_router, "batch_jobs", 0)
+    request = SentimentBatchRequest(texts=BATCH_TEXTS)
+    # Поток ещё не начат, но слот уже занят
+    streams = [await sentiment_router.analyze_sentiment_batch(request, stream=True)
+               for _ in range(settings.SENTIMENT_BATCH_JOBS)]
+
+    with pytest.raises(HTTPException) as rejected:
+        await sentiment_router.analyze_sentiment_batch(request, stream=True)
+    assert rejected.value.status_code == 503
+    assert rejected.value.headers == {"Retry-After": str(sentiment_router.SENTIMENT_RETRY_AFTER)}
+
+    for response in streams:
+        assert (await send_response(response)).count("\n") == len(BATCH_TEXTS)
+    assert sentiment_router.batch_jobs == 0
+    assert len((await sentiment_router.analyze_sentiment_batch(request, stream=False)).results) == len(BATCH_TEXTS)
+
+
+@pytest.mark.asyncio
+async def test_unconsumed_batch_stream_releases_slot(stub_model, monkeypatch):
+    monkeypatch.setattr(sentiment_router, "batch_jobs", 0)
+    response = await sentiment_router.analyze_sentiment_batch(SentimentBatchRequest(texts=BATCH_TEXTS), stream=True)
+    assert sentiment_router.batch_jobs == 1
+
+    async def disconnect():
+        return {"type": "http.disconnect"}
+
+    async def stalled_send(message):
+        await asyncio.Event().wait()
+
+    # Клиент ушёл, не дождавшись ни строки: генератор тела так и не запускается
+    await send_response(response, receive=disconnect, send=stalled_send)
+    del response
+
+    assert stub_model == []
+    assert sentiment_router.batch_jobs == 0
+
+
+@pytest.mark.asyncio
+async def test_score_comments_does_not_take_batch_slots(stub_model, monkeypatch):
+    monkeypatch.setattr(sentiment_router, "batch_jobs", settings.SENTIMENT_BATCH_JOBS)
+    await sentiment_router.sentiment_cache.set_many({sentiment_router.sentiment_cache.key("good good"): 0.2})
+
+    scores = await sentiment_router.score_comments(BATCH_TEXTS)
+
+    assert scores.tolist() == pytest.approx([0.1, 0.6, 0.2, 0.7, 0.3])
+    assert stub_model == [2, 2]
+    assert sentiment_router.batch_jobs == settings.SENTIMENT_BATCH_JOBS
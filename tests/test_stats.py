@@ -0,0 +1,63 @@
+import asyncio
+
+import pytest
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app.main import app
+from app.core.db_depends import get_session_db
+
+
+async def create_post(auth_client, title, status, tags):
+    response = await auth_client.post("/api/posts/", json={
+        "title": title,
+        "content": "a" * 100,
+        "status": status,
+        "tags": tags
+    })
+    return response.json()["slug"]
+
+
+@pytest.mark.asyncio
+async def test_stats_follow_writes(auth_client):
+    published = await create_post(auth_client, "Published post", "published", ["python", "fastapi"])
+    draft = await create_post(auth_client, "Draft post", "draft", ["python"])
+    await auth_client.post(f"/api/posts/{published}/comments", json={"text": "a"*30})
+
+    stats = (await auth_client.get("/api/stats")).json()
+    cloud = (await auth_client.get("/api/tags/cloud/")).json()
+
+    assert stats["total_posts"] == 1
+    assert stats["total_comments"] == 1
+    assert sorted((tag["name"], tag["count"]) for tag in cloud["tags"]) == [("fastapi", 1), ("python", 1)]
+
+    await auth_client.put(f"/api/posts/{draft}", json={"status": "published", "tags": ["python", "sql"]})
+    await auth_client.delete(f"/api/posts/{published}")
+
+    stats = (await auth_client.get("/api/stats")).json()
+    cloud = (await auth_client.get("/api/tags/cloud/")).json()
+
+    assert stats["total_posts"] == 1
+    assert stats["total_comments"] == 0
+    assert sorted((tag["name"], tag["count"]) for tag in cloud["tags"]) == [("python", 1), ("sql", 1)]
+
+
+@pytest.mark.asyncio
+async def test_concurrent_publish_is_counted_once(auth_client, db_session):
+    draft = await create_post(auth_client, "Draft post", "draft", ["python"])
+
+    # Каждому запросу своя сессия и соединение, как в приложении
+    sessions = async_sessionmaker(db_session.bind, expire_on_commit=False)
+
+    async def override_db():
+        async with sessions() as session:
+            yield session
+
+    app.dependency_overrides[get_session_db] = override_db
+    responses = await asyncio.gather(*(auth_client.put(f"/api/posts/{draft}", json={"status": "published"})
+                                       for _ in range(2)))
+
+    assert [response.status_code for response in responses] == [200, 200]
+    stats = (await auth_client.get("/api/stats")).json()
+    cloud = (await auth_client.get("/api/tags/cloud/")).json()
+    assert stats["total_posts"] == 1
+    assert [(tag["name"], tag["count"]) for tag in cloud["tags"]] == [("python", 1)]
@@ -0,0 +1,125 @@
+import math
+
+import pytest
+from fakeredis import FakeAsyncRedis
+
+from app.core import trending as trending_module
+from app.core.trending import BUCKET_SECONDS, DECAY, TrendingScores
+from app.routers import posts as posts_router
+
+# Начало корзины: счёт события считается от начала его корзины
+START = BUCKET_SECONDS * 6_000_000
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [float(START)]
+    monkeypatch.setattr(trending_module.time, "time", lambda: now[0])
+    return now
+
+
+async def record(scores: TrendingScores, events: dict[int, float]) -> None:
+    for post_id, weight in events.items():
+        scores.incr(post_id, weight)
+    await scores.flush()
+
+
+async def expired(fake_redis, window: str) -> int:
+    return int(await fake_redis.get(f"trending:{window}:expired"))
+
+
+@pytest.mark.asyncio
+async def test_trending_scores_decay(fake_redis, clock):
+    scores = TrendingScores(fake_redis)
+    await record(scores, {1: 3.0})
+    clock[0] += 2 * 3600
+    await record(scores, {2: 2.0})
+
+    # За сутки старые просмотры весят больше свежих, в часовом окне уже нет
+    assert await scores.top("24h", 10) == [(1, pytest.approx(3 * math.exp(-2 * 3600 / DECAY["24h"]))),
+                                           (2, pytest.approx(2.0))]
+    assert await scores.top("1h", 10) == [(2, pytest.approx(2.0)),
+                                          (1, pytest.approx(3 * math.exp(-2 * 3600 / DECAY["1h"])))]
+    assert await scores.top("24h", 1) == [(1, pytest.approx(3 * math.exp(-2 * 3600 / DECAY["24h"])))]
+
+
+@pytest.mark.asyncio
+async def test_trending_compaction_subtracts_expired_buckets(fake_redis, clock):
+    scores = TrendingScores(fake_redis)
+    first = START // BUCKET_SECONDS
+    await record(scores, {1: 5.0})
+    clock[0] += 6 * BUCKET_SECONDS
+    await record(scores, {2: 1.0})
+
+    # Часовое окно — 12 корзин: первая корзина вышла из него целиком
+    clock[0] = (first + 13) * BUCKET_SECONDS
+    await scores.compact()
+    age = clock[0] - (START + 6 * BUCKET_SECONDS)
+    assert await scores.top("1h", 10) == [(2, pytest.approx(math.exp(-age / DECAY["1h"])))]
+    assert await expired(fake_redis, "1h") == first
+    assert [post_id for post_id, _ in await scores.top("24h", 10)] == [1, 2]
+
+    # Корзина поста 2 ещё в окне: уплотнение проходит пустые корзины и двигает маркер
+    clock[0] = (first + 18) * BUCKET_SECONDS
+    await scores.compact()
+    assert [post_id for post_id, _ in await scores.top("1h", 10)] == [2]
+    assert await expired(fake_redis, "1h") == first + 5
+
+    # Следующая корзина выходит из окна: уплотнение в ней же, когда блокировка прошлого уже истекла
+    clock[0] = (first + 19) * BUCKET_SECONDS + 1
+    await scores.compact()
+    assert await scores.top("1h", 10) == []
+    assert await expired(fake_redis, "1h") == first + 6
+    assert [post_id for post_id, _ in await scores.top("24h", 10)] == [1, 2]
+
+
+@pytest.mark.asyncio
+async def test_trending_compaction_runs_once_per_lock(fake_redis, clock):
+    scores = TrendingScores(fake_redis)
+    first = START // BUCKET_SECONDS
+    await record(scores, {1: 5.0})
+
+    clock[0] = (first + 13) * BUCKET_SECONDS
+    await fake_redis.set("trending:compaction:lock", 1)
+    await scores.compact()
+    assert [post_id for post_id, _ in await scores.top("1h", 10)] == [1]
+    assert await fake_redis.get("trending:1h:expired") is None
+
+
+async def create_post(auth_client, title):
+    response = await auth_client.post("/api/posts/", json={
+        "title": title,
+        "content": "a" * 100,
+        "status": "published",
+        "tags": []
+    })
+    return response.json()["slug"]
+
+
+@pytest.mark.asyncio
+async def test_trending_endpoint(auth_client, fake_redis, monkeypatch):
+    scores = TrendingScores(fake_redis)
+    monkeypatch.setattr(posts_router, "trending", scores)
+    popular = await create_post(auth_client, "Popular post title")
+    deleted = await create_post(auth_client, "Deleted post title")
+    quiet = await create_post(auth_client, "Quiet post title here")
+    for slug in (popular, popular, popular, deleted, deleted, quiet):
+        await auth_client.get(f"/api/posts/{slug}")
+    await scores.flush()
+    await auth_client.delete(f"/api/posts/{deleted}")
+
+    response = await auth_client.get("/api/posts/trending", params={"window": "24h", "limit": 5})
+
+    assert response.status_code == 200
+    # Счёт затухает от начала корзины, отношение весов сохраняется
+    assert [post["slug"] for post in response.json()] == [popular, quiet]
+    assert response.json()[0]["score"] == pytest.approx(3 * response.json()[1]["score"])
+
+
+@pytest.mark.asyncio
+async def test_trending_endpoint_without_redis(client, monkeypatch):
+    monkeypatch.setattr(posts_router, "trending", TrendingScores(FakeAsyncRedis(connected=False)))
+
+    response = await client.get("/api/posts/trending")
+
+    assert response.status_code == 503
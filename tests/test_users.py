@@ -25,4 +25,49 @@ async def test_get_user_posts(auth_client):
     
     get_reponse = await auth_client.get("/api/users/testuser/posts")
     assert get_reponse.status_code == 200
-    assert type(get_reponse.json()) is list
\ No newline at end of file
+    assert type(get_reponse.json()) is list
+
+@pytest.mark.asyncio
+async def test_get_users_cursor_pagination(auth_client):
+    for i in range(2):
+        await auth_client.post("/api/register", data={
+            "username": f"testuser{i}",
+            "email": f"test{i}@example.com",
+            "password": "qwerty"
+        })
+
+    first_page = await auth_client.get("/api/users/", params={"cursor": "", "page_size": 2})
+    assert first_page.status_code == 200
+    assert [user["username"] for user in first_page.json()["items"]] == ["testuser", "testuser0"]
+    assert first_page.json()["prev_cursor"] is None
+
+    second_page = await auth_client.get("/api/users/", params={"cursor": first_page.json()["next_cursor"], "page_size": 2})
+    assert [user["username"] for user in second_page.json()["items"]] == ["testuser1"]
+    assert second_page.json()["next_cursor"] is None
+
+    back_page = await auth_client.get("/api/users/", params={"cursor": second_page.json()["prev_cursor"], "page_size": 2})
+    assert back_page.json()["items"] == first_page.json()["items"]
+    
+@pytest.mark.asyncio
+async def test_get_users_bad_cursor(client):
+    response = await client.get("/api/users/", params={"cursor": "not-a-cursor"})
+
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Некорректный курсор"
+
+
+@pytest.mark.asyncio
+async def test_get_user_posts_preview(auth_client):
+    await auth_client.post("/api/posts/", json={
+    "title":"BOO ISPUGALSYA? DONT BE AFRAID:)",
+    "content": "word " * 250,
+    "status": "published",
+    "tags": []})
+
+    get_reponse = await auth_client.get("/api/users/testuser/posts")
+    post = get_reponse.json()[0]
+
+    assert post["preview"] == ("word " * 250)[:200]
+    assert post["word_count"] == 250
+    assert post["reading_time"] == 2
+    assert "content" not in post